@@ -0,0 +1,8 @@
+"""
+Benchmarks of Mela's own per-message overhead and cold start. Run them with
+
+    python -m benchmarks [--url memory://] [--filter processor]
+
+Every run is appended to the history file, and the results are compared
+with the previous run there, so regressions can be seen between versions.
+"""
@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import os
+from typing import List
+
+from mela.factories.core.connection import close_all_connections
+
+from . import bench_components  # noqa: F401
+from . import bench_import  # noqa: F401
+from . import bench_processor  # noqa: F401
+from . import bench_rpc  # noqa: F401
+from .harness import Options
+from .harness import Result
+from .harness import benchmarks
+from .harness import load_previous
+from .harness import max_iterations
+from .harness import measure
+from .harness import report
+from .harness import save
+
+
+HISTORY = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--url', default='memory://benchmarks', help="Broker URL")
+    parser.add_argument('--filter', default='', help="Run benchmarks which names contain it")
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--warmup', type=int, default=500)
+    parser.add_argument('--history', default=HISTORY, help="File with results of all runs")
+    parser.add_argument('--no-save', action='store_true', help="Don't write results to history")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> List[Result]:
+    options = Options(args.url)
+    results = []
+    try:
+        for name, setup in benchmarks.items():
+            if args.filter not in name:
+                continue
+            operation = await setup(options)
+            iterations = min(args.iterations, max_iterations.get(name, args.iterations))
+            warmup = min(args.warmup, iterations // 10)
+            results.append(await measure(name, operation, iterations, warmup))
+    finally:
+        await close_all_connections()
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    results = asyncio.run(run(args))
+    print(report(results, load_previous(args.history)))  # noqa: T201
+    if not args.no_save:
+        save(args.history, Options(args.url), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Publisher encoding and full callback paths of Consumer, Service and RPC
+"""
+import asyncio
+
+from mela.components import Consumer
+from mela.components import Publisher
+from mela.components import Service
+from mela.components.rpc import RPC
+from mela.factories import consumer
+from mela.factories import publisher
+from mela.processor import Processor
+from mela.settings import ConsumerParams
+from mela.settings import ExchangeParams
+from mela.settings import PublisherParams
+from mela.settings import QueueParams
+
+from .fakes import FakeChannel
+from .fakes import FakeExchange
+from .fakes import FakeIncomingMessage
+from .harness import Options
+from .harness import benchmark
+
+
+BODY = b'{"value": 1}'
+
+
+async def handler(value: int):
+    return {'value': value}
+
+
+def fake_publisher(name: str) -> Publisher:
+    return Publisher(name, 'bench', exchange=FakeExchange(), channel=FakeChannel())
+
+
+@benchmark('publisher.encode')
+async def publisher_encode(options: Options):
+    publisher_ = fake_publisher('bench_encode_publisher')
+
+    async def operation():
+        await publisher_.publish({'value': 1})
+    return operation
+
+
+@benchmark('transport.publish_consume')
+async def publish_consume(options: Options):
+    """
+    One message at a time from publisher to processor through the transport
+    """
+    exchange = ExchangeParams(name='bench-x', durable=False)
+    queue = QueueParams(name='bench-q', durable=False, auto_delete=True)
+    publisher_ = await publisher(PublisherParams(
+        name='bench_transport_publisher',
+        connection=options.connection,
+        exchange=exchange,
+        routing_key='bench',
+        queue=queue,
+    ))
+    consumer_ = await consumer(ConsumerParams(
+        name='bench_transport_consumer',
+        connection=options.connection,
+        exchange=exchange,
+        routing_key='bench',
+        queue=queue,
+    ))
+    received = asyncio.Event()
+
+    async def on_message(value: int):
+        received.set()
+
+    consumer_.set_processor(Processor(on_message))
+    await consumer_.consume()
+
+    async def operation():
+        received.clear()
+        await publisher_.publish({'value': 1})
+        await received.wait()
+    return operation
+
+
+@benchmark('consumer.callback')
+async def consumer_callback(options: Options):
+    consumer_ = Consumer('bench_consumer')
+    consumer_.set_processor(Processor(handler))
+    message = FakeIncomingMessage(BODY)
+
+    async def operation():
+        await consumer_._callback(message)
+    return operation
+
+
+@benchmark('service.callback')
+async def service_callback(options: Options):
+    service_ = Service(
+        'bench_service',
+        consumer=Consumer('bench_service_consumer'),
+        publisher=fake_publisher('bench_service_publisher'),
+    )
+    service_.set_processor(Processor(handler))
+    message = FakeIncomingMessage(BODY)
+
+    async def operation():
+        await service_.consumer._callback(message)
+    return operation
+
+
+@benchmark('rpc.callback')
+async def rpc_callback(options: Options):
+    worker = Consumer('bench_rpc_worker')
+    rpc = RPC(
+        'bench_rpc',
+        worker=worker,
+        response_publisher=fake_publisher('bench_rpc_response_publisher'),
+    )
+    rpc.set_processor(Processor(handler))
+    message = FakeIncomingMessage(BODY, reply_to='bench', correlation_id='1')
+
+    async def operation():
+        await worker._callback(message)
+    return operation
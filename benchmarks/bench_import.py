@@ -0,0 +1,45 @@
+"""
+Cold start: time of fresh interpreter which imports a module of Mela.
+`import:python` is the interpreter startup alone, to subtract it.
+"""
+import asyncio
+import sys
+
+from .harness import Operation
+from .harness import Options
+from .harness import benchmark
+
+
+MODULES = ('mela', 'mela.settings', 'mela.cli', 'mela.app')
+
+
+def importing(module: str) -> Operation:
+    code = f'import {module}' if module else 'pass'
+
+    async def operation() -> None:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            '-c',
+            code,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        if await process.wait():
+            raise RuntimeError(f"Import of `{module}` failed")
+    return operation
+
+
+@benchmark('import:python', iterations=20)
+async def interpreter(options: Options) -> Operation:
+    return importing('')
+
+
+def register(module: str) -> None:
+
+    @benchmark(f'import:{module}', iterations=20)
+    async def setup(options: Options) -> Operation:
+        return importing(module)
+
+
+for module_ in MODULES:
+    register(module_)
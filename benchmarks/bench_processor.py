@@ -0,0 +1,72 @@
+"""
+`Processor.process` under every dependency solver
+"""
+from logging import Logger
+
+from pydantic import BaseModel
+
+from mela import IncomingMessage
+from mela.components import Consumer
+from mela.processor import Processor
+
+from .fakes import FakeIncomingMessage
+from .harness import Options
+from .harness import benchmark
+
+
+BODY = b'{"value": 1, "name": "benchmark"}'
+
+
+class Item(BaseModel):
+    value: int
+    name: str
+
+
+async def oldstyle(body, message: IncomingMessage):
+    return body
+
+
+async def raw_json(value: int, name: str):
+    return {'value': value, 'name': name}
+
+
+async def data_class(item: Item):
+    return item
+
+
+async def static_params(value: int, name: str, log: Logger):
+    return {'value': value, 'name': name}
+
+
+def sync_raw_json(value: int, name: str):
+    return {'value': value, 'name': name}
+
+
+async def prepare(handler) -> Processor:
+    processor = Processor(handler)
+    processor.cache_static_params(Consumer('bench_processor'), None)
+    await processor.solve_requirements(None)
+    return processor
+
+
+def register(name, handler):
+
+    @benchmark(f'processor.{name}')
+    async def setup(options: Options):
+        processor = await prepare(handler)
+        message = FakeIncomingMessage(BODY)
+
+        async def operation():
+            await processor.process(message)
+        return operation
+
+
+for name_, handler_ in [
+    ('oldstyle', oldstyle),
+    ('raw_json', raw_json),
+    ('data_class', data_class),
+    ('static_params', static_params),
+    # Sync handlers are called in worker thread
+    ('sync_raw_json', sync_raw_json),
+]:
+    register(name_, handler_)
@@ -0,0 +1,67 @@
+"""
+RPC round trip through the transport
+"""
+from mela.components.rpc import RPC
+from mela.components.rpc import RPCClient
+from mela.factories import consumer
+from mela.factories import publisher
+from mela.factories.consumer import anonymous_consumer
+from mela.processor import Processor
+from mela.settings import ConsumerParams
+from mela.settings import ExchangeParams
+from mela.settings import PublisherParams
+from mela.settings import QueueParams
+
+from .harness import Options
+from .harness import benchmark
+
+
+async def echo(value: int):
+    return {'value': value}
+
+
+@benchmark('rpc.round_trip')
+async def round_trip(options: Options):
+    exchange = ExchangeParams(name='bench-rpc-x', durable=False)
+    response_exchange = ExchangeParams(name='bench-rpc-response-x', durable=False)
+    worker = await consumer(ConsumerParams(
+        name='bench_rpc_service',
+        connection=options.connection,
+        exchange=exchange,
+        routing_key='bench-rpc',
+        queue=QueueParams(name='bench-rpc-q', durable=False, auto_delete=True),
+    ))
+    rpc = RPC(
+        'bench_rpc_round_trip',
+        worker=worker,
+        response_publisher=await publisher(PublisherParams(
+            name='bench_rpc_response_publisher',
+            connection=options.connection,
+            exchange=response_exchange,
+            routing_key='',
+        )),
+    )
+    rpc.set_processor(Processor(echo))
+    await rpc.consume()
+    client = RPCClient(
+        'bench_rpc_round_trip',
+        request_publisher=await publisher(PublisherParams(
+            name='bench_rpc_request_publisher',
+            connection=options.connection,
+            exchange=exchange,
+            routing_key='bench-rpc',
+            skip_unroutables=True,
+        )),
+        response_consumer=await anonymous_consumer(ConsumerParams(
+            name='bench_rpc_client',
+            connection=options.connection,
+            exchange=response_exchange,
+            routing_key='',
+            queue='',
+        )),
+    )
+    await client.consume()
+
+    async def operation():
+        await client.call({'value': 1}, timeout=5)
+    return operation
@@ -0,0 +1,33 @@
+"""
+Broker-free stand-ins, so callback paths measure Mela and nothing else
+"""
+from pamqp.commands import Basic
+
+
+class FakeIncomingMessage:
+
+    def __init__(self, body: bytes, reply_to: str = '', correlation_id: str = ''):
+        self.body = body
+        self.headers = {}
+        self.content_encoding = None
+        self.priority = None
+        self.reply_to = reply_to
+        self.correlation_id = correlation_id
+
+    async def ack(self):
+        pass
+
+    async def nack(self, requeue=True):
+        pass
+
+
+class FakeExchange:
+
+    name = 'fake'
+
+    async def publish(self, message, routing_key, timeout=None):
+        return Basic.Ack()
+
+
+class FakeChannel:
+    is_closed = False
@@ -0,0 +1,138 @@
+import json
+import platform
+import subprocess
+from time import perf_counter
+from time import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from mela.settings import URLConnectionParams
+
+
+Operation = Callable[[], Awaitable[Any]]
+Setup = Callable[['Options'], Awaitable[Operation]]
+
+
+class Options:
+
+    def __init__(self, url: str = 'memory://benchmarks'):
+        self.url: str = url
+
+    @property
+    def connection(self) -> URLConnectionParams:
+        return URLConnectionParams(url=self.url)
+
+
+benchmarks: Dict[str, Setup] = {}
+# Slow operations are measured fewer times than `--iterations`
+max_iterations: Dict[str, int] = {}
+
+
+def benchmark(name: str, iterations: Optional[int] = None) -> Callable[[Setup], Setup]:
+    """
+    Register coroutine which prepares components and returns operation
+    to be measured
+    """
+    def decorator(setup: Setup) -> Setup:
+        benchmarks[name] = setup
+        if iterations is not None:
+            max_iterations[name] = iterations
+        return setup
+    return decorator
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Result:
+
+    def __init__(self, name: str, latencies: List[float], elapsed: float):
+        self.name: str = name
+        self.iterations: int = len(latencies)
+        self.elapsed: float = elapsed
+        self._latencies: List[float] = sorted(latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.iterations / self.elapsed if self.elapsed else 0.0
+
+    def latency(self, q: float) -> float:
+        return percentile(self._latencies, q)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'iterations': self.iterations,
+            'throughput': round(self.throughput, 1),
+            'p50_us': round(self.latency(50) * 1e6, 2),
+            'p90_us': round(self.latency(90) * 1e6, 2),
+            'p99_us': round(self.latency(99) * 1e6, 2),
+        }
+
+
+async def measure(name: str, operation: Operation, iterations: int, warmup: int) -> Result:
+    for _ in range(warmup):
+        await operation()
+    latencies = []
+    started = perf_counter()
+    for _ in range(iterations):
+        operation_started = perf_counter()
+        await operation()
+        latencies.append(perf_counter() - operation_started)
+    return Result(name, latencies, perf_counter() - started)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(  # noqa: S603, S607
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(history: str) -> Dict[str, Dict[str, float]]:
+    try:
+        with open(history) as history_file:
+            lines = history_file.read().splitlines()
+    except FileNotFoundError:
+        return {}
+    return json.loads(lines[-1])['results'] if lines else {}
+
+
+def save(history: str, options: Options, results: List[Result]) -> None:
+    entry = {
+        'time': time(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'transport': options.url.split(':', 1)[0],
+        'results': {result.name: result.as_dict() for result in results},
+    }
+    with open(history, 'a') as history_file:
+        history_file.write(json.dumps(entry) + '\n')
+
+
+def report(results: List[Result], previous: Dict[str, Dict[str, float]]) -> str:
+    lines = [
+        f"{'benchmark':<32}{'msg/s':>12}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'change':>10}",
+    ]
+    for result in results:
+        row = result.as_dict()
+        change = ''
+        if result.name in previous and previous[result.name]['throughput']:
+            ratio = row['throughput'] / previous[result.name]['throughput'] - 1
+            change = f'{ratio:+.1%}'
+        lines.append(
+            f"{result.name:<32}{row['throughput']:>12.1f}{row['p50_us']:>10.2f}"
+            f"{row['p90_us']:>10.2f}{row['p99_us']:>10.2f}{change:>10}",
+        )
+    return '\n'.join(lines)
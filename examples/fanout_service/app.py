@@ -0,0 +1,19 @@
+from typing import List
+
+from mela import Mela
+
+app = Mela(__name__)
+
+
+@app.service("splitter")
+async def splitter(document_id: str, pages: List[str]):
+    # Every yielded item is published as a separate message as soon as it is produced.
+    # Incoming message is acked only when all the pages are confirmed by broker.
+    for number, page in enumerate(pages):
+        yield {'document_id': document_id, 'number': number, 'text': page}
+    # Item can be yielded together with its own routing key
+    yield {'document_id': document_id, 'pages': len(pages)}, 'document-split-done'
+
+
+if __name__ == '__main__':
+    app.run()
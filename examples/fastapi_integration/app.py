@@ -1,16 +1,22 @@
 from datetime import datetime
 from uuid import uuid4
 
+from fastapi import Depends
 from fastapi import FastAPI
 from mela import Mela
+from mela.asgi import MelaLifespan
+from mela.components import Publisher
 from mela.settings import Settings
 from pydantic import BaseModel
 
-app = FastAPI()
-
 mela_app = Mela(__name__)
 mela_app.settings = Settings()
 
+# Publisher is connected at startup and drained on shutdown
+mela_lifespan = MelaLifespan(mela_app, publishers=['report-generator'])
+
+app = FastAPI(lifespan=mela_lifespan)
+
 
 class ReportRequest(BaseModel):
     start_date: datetime
@@ -20,10 +26,12 @@ class ReportRequest(BaseModel):
 
 
 @app.post("/report")
-async def read_root(report_request: ReportRequest):
+async def read_root(
+        report_request: ReportRequest,
+        publisher: Publisher = Depends(mela_lifespan.publisher('report-generator')),
+):
     if report_request.report_id is None:
         report_request.report_id = str(uuid4())
     # some DB writing
-    publisher = await mela_app.publisher_instance('report-generator')
     await publisher.publish(report_request)
     return report_request
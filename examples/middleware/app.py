@@ -0,0 +1,38 @@
+from time import perf_counter
+
+from mela import Mela
+from mela.components import NackMessageError
+from mela.middleware import Middleware
+
+app = Mela(__name__)
+
+
+class Timing(Middleware):
+
+    async def around_handler(self, call_next, params):
+        started = perf_counter()
+        try:
+            return await call_next(params)
+        finally:
+            print(f"Handled in {perf_counter() - started:.6f}s")
+
+
+class Auth(Middleware):
+
+    async def before_decode(self, message):
+        if message.headers.get('token') != 'secret':
+            raise NackMessageError("Unauthorized", requeue=False)
+
+
+# Scheme-level middlewares wrap every component of the app
+app.middleware(Timing())
+
+
+@app.service("printer", middlewares=[Auth()])
+def printer(body, message):
+    print(body)
+    return body
+
+
+if __name__ == '__main__':
+    app.run()
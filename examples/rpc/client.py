@@ -12,7 +12,8 @@ async def main():
 
     bot_manager = await app.rpc_client_instance("bot_manager")
 
-    res = await fetcher.call({'url': "test"})
+    # Server skips the request if the response is not awaited anymore
+    res = await fetcher.call({'url': "test"}, timeout=5)
     print(res)
 
     # we can even gather call results!
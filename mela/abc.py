@@ -28,6 +28,8 @@ class AbstractPublisher(abc.ABC):
             self,
             message: Union[Dict, BaseModel, Message],
             routing_key: Optional[str] = None,
+            priority: Optional[int] = None,
+            deadline: Optional[float] = None,
     ) -> Optional[ConfirmationFrameType]:
         raise NotImplementedError
 
@@ -35,7 +37,12 @@ class AbstractPublisher(abc.ABC):
 class AbstractRPCClient(abc.ABC):
 
     @abc.abstractmethod
-    async def call(self, body: Union[AbstractMessage, BaseModel, dict]) -> Union[BaseModel, dict]:
+    async def call(
+            self,
+            body: Union[AbstractMessage, BaseModel, dict],
+            headers: Optional[Dict] = None,
+            timeout: Optional[float] = None,
+    ) -> Union[BaseModel, dict]:
         raise NotImplementedError
 
 
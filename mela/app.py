@@ -0,0 +1,229 @@
+import asyncio
+import signal
+import threading
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from .components.base import Component
+from .components.base import ConsumingComponent
+from .dependencies import shutdown_dependencies
+from .factories.core.connection import close_all_connections
+from .factories.core.connection import close_connections
+from .factories.publisher import close_all_publishers
+from .factories.publisher import publisher
+from .factories.publisher import publishers
+from .factories.rpc import client as rpc_client
+from .log import configure_logging
+from .log import stop_logging
+from .metrics import MetricsServer
+from .metrics import registry
+from .processor import Processor
+from .profiling import dump_all
+from .profiling import profilers
+from .profiling import render_all
+from .reload import Reloader
+from .scheme import MelaScheme
+from .scheme.requirement import SchemeRequirement
+from .settings import Requirement
+from .settings import Settings
+from .settings.snapshot import load_settings
+from .threadsafe import LoopThread
+from .threadsafe import ThreadSafePublisher
+from .watchdog import Watchdog
+
+
+class Mela(MelaScheme):
+
+    def __init__(
+            self,
+            name: str,
+            settings_: Optional[Settings] = None,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+            required_only: bool = False,
+            lazy_components: bool = False,
+    ):
+        """
+        With `required_only`, settings of components which are not required
+        by the app are not validated and solved on run. With `lazy_components`,
+        publishers and RPC clients are resolved on first use instead of start.
+        """
+        super().__init__(name)
+        self.required_only: bool = required_only
+        self.lazy_components: bool = lazy_components
+        self._settings: Optional[Settings] = None
+        if settings_:
+            self.settings = settings_
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._loop: Optional[asyncio.AbstractEventLoop] = loop
+        self._metrics_server: Optional[MetricsServer] = None
+        self._watchdog: Optional[Watchdog] = None
+        self._reloader: Optional[Reloader] = None
+        # Consuming components with solved static params of processors
+        self._prepared: Set[str] = set()
+        self._loop_thread: Optional[LoopThread] = None
+        self._threadsafe_publishers: Dict[str, ThreadSafePublisher] = {}
+        self._threadsafe_lock: threading.Lock = threading.Lock()
+
+    def publisher_sync(self, name):
+        return self._loop.run_until_complete(self.publisher_instance(name))
+
+    def publisher_threadsafe(self, name: str) -> ThreadSafePublisher:
+        """
+        Publisher which can be used from any thread, even when event loop
+        of the app is running. It has own connection in event loop of
+        dedicated thread, which is shared by all the threads.
+        """
+        with self._threadsafe_lock:
+            if name not in self._threadsafe_publishers:
+                if self._loop_thread is None:
+                    self._loop_thread = LoopThread(f'{self.name}-publishers')
+                    self._loop_thread.start()
+                assert not self._loop_thread.is_current, "Use `publisher_instance` in loop thread"
+                # Publisher of app loop is not usable in another loop, so it is another component
+                settings = self.settings.publishers[name]
+                settings = settings.copy(update={'name': f'{settings.name}_threadsafe'})
+                instance = self._loop_thread.run(publisher(settings)).result()
+                self._threadsafe_publishers[name] = ThreadSafePublisher(
+                    instance,
+                    self._loop_thread.loop,
+                )
+        return self._threadsafe_publishers[name]
+
+    async def stop_loop_thread(self):
+        if self._loop_thread is None:
+            return
+        for threadsafe_publisher in self._threadsafe_publishers.values():
+            name = threadsafe_publisher.publisher.name
+            publishers.pop(name, None)
+            await asyncio.wrap_future(self._loop_thread.run(close_connections(name)))
+        self._threadsafe_publishers.clear()
+        self._loop_thread.stop()
+        self._loop_thread = None
+
+    async def publisher_instance(self, name):
+        return await publisher(self.settings.publishers[name])
+
+    async def rpc_client_instance(self, name):
+        return await rpc_client(self.settings.rpc_services[name])
+
+    @property
+    def settings(self):
+        assert self._settings, "Mela is not configured"
+        return self._settings
+
+    @settings.setter
+    def settings(self, value: Settings):
+        """
+        Set config of entire Mela app. It's possible only if app is not
+        running yet. In other case it will raise `RuntimeError`
+        """
+        self._settings = value
+
+    def run(self, coro=None, loop: Optional[asyncio.AbstractEventLoop] = None):
+        if self._settings is None:
+            self.settings = self.load_settings()
+        if loop is None:
+            loop = self._loop
+        assert loop
+        self._run_in_loop(coro, loop)
+
+    def load_settings(self) -> Settings:
+        requirements = self.required_components() if self.required_only else None
+        return load_settings(requirements)
+
+    def required_components(self) -> List[Requirement]:
+        required = []
+        for requirement in self.requirements.values():
+            if requirement.params is None:
+                required.append((requirement.type_, requirement.name))
+            if isinstance(requirement.processor, Processor):
+                # Components injected to handlers are registered only on start
+                required.extend(requirement.processor.static_requirements(self.dependencies))
+        return required
+
+    async def waiter(self):
+        try:
+            # Wait until terminate
+            await asyncio.Future()
+        finally:
+            await self.stop_loop_thread()
+            await close_all_publishers()
+            await close_all_connections()
+            await shutdown_dependencies(self.dependencies.values())
+            if self._metrics_server:
+                await self._metrics_server.stop()
+            if self._watchdog:
+                self._watchdog.stop()
+            if self._reloader:
+                await self._reloader.stop()
+            stop_logging()
+
+    async def start_metrics_server(self):
+        if self.settings.metrics and self._metrics_server is None:
+            self._metrics_server = MetricsServer(
+                self.settings.metrics.host,
+                self.settings.metrics.port,
+            )
+            self._metrics_server.routes['/profile'] = render_all
+            await self._metrics_server.start()
+
+    async def start_watchdog(self):
+        if self.settings.watchdog and self._watchdog is None:
+            self._watchdog = Watchdog(**self.settings.watchdog.dict())
+            self._watchdog.start()
+
+    async def start_reloader(self):
+        if self.settings.reload and self._reloader is None:
+            # Restarted consumers are drained by count of messages in flight
+            registry.enabled = True
+            self._reloader = Reloader(
+                self,
+                Settings.Config.yaml_file_path,  # type: ignore
+                **self.settings.reload.dict(),
+            )
+            self._reloader.start()
+
+    async def start_component(self, requirement: SchemeRequirement) -> Component:
+        instance: Component = await requirement.resolve(self.settings)
+        if isinstance(instance, ConsumingComponent):
+            # Restarted component gets processor with already solved params
+            if requirement.name not in self._prepared:
+                await instance.prepare_processor(self, self.settings)
+                self._prepared.add(requirement.name)
+            await instance.consume()
+        return instance
+
+    def _is_configured(self, requirement: SchemeRequirement) -> bool:
+        if requirement.type_ != 'consumer' or requirement.params is not None:
+            return True
+        return requirement.name in self.settings.consumers
+
+    def _run_in_loop(self, coro, loop: asyncio.AbstractEventLoop):
+        assert self._settings
+        if self._settings.logging:
+            configure_logging(**self._settings.logging.dict())
+        loop.run_until_complete(self.start_metrics_server())
+        loop.run_until_complete(self.start_watchdog())
+        loop.run_until_complete(self.start_reloader())
+        for requirement in list(self.requirements.values()):
+            if self._reloader is not None and not self._is_configured(requirement):
+                # Consumer is started when it's added to settings
+                continue
+            loop.run_until_complete(self.start_component(requirement))
+        if profilers:
+            # `kill -USR1 <pid>` writes stats of all the profilers to their outputs
+            loop.add_signal_handler(signal.SIGUSR1, dump_all)
+        if coro:
+            loop.run_until_complete(coro)
+        else:
+            loop.run_until_complete(self.waiter())
+
+    def register_component_requirement(self, requirement: SchemeRequirement):
+        super().register_component_requirement(requirement)
+        requirement.lazy = self.lazy_components
+
+    def register_scheme(self, scheme_: MelaScheme):
+        self.merge(scheme_)
@@ -0,0 +1,134 @@
+"""
+Lifespan of ASGI application, e.g. FastAPI or Starlette, which publishes
+messages or calls RPC services. Components are resolved at startup, so
+requests get ready handles without settings lookups and connecting.
+
+    mela_lifespan = MelaLifespan(mela_app, publishers=['report-generator'])
+    app = FastAPI(lifespan=mela_lifespan)
+
+    @app.post('/report')
+    async def report(
+            publisher: Publisher = Depends(mela_lifespan.publisher('report-generator')),
+    ):
+        ...
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from .app import Mela
+from .components import Publisher
+from .components.rpc import RPCClient
+from .factories.core.connection import connections
+from .factories.publisher import publishers
+
+
+class MelaLifespan:
+
+    """
+    All the publishers of settings are resolved if `publishers` are not
+    given. On shutdown, publishes and RPC calls in flight are awaited for
+    at most `drain_timeout` seconds. Then publishers and connections opened
+    by the lifespan are closed, ones shared with the rest of the process are
+    left open.
+    """
+
+    def __init__(
+            self,
+            app: Mela,
+            publishers: Optional[Iterable[str]] = None,
+            rpc_clients: Iterable[str] = (),
+            drain_timeout: float = 10.0,
+    ):
+        self.app: Mela = app
+        self._publisher_names: Optional[Iterable[str]] = publishers
+        self._rpc_client_names: Iterable[str] = rpc_clients
+        self.drain_timeout: float = drain_timeout
+        self.publishers: Dict[str, Publisher] = {}
+        self.rpc_clients: Dict[str, RPCClient] = {}
+        self._opened_publishers: List[str] = []
+        self._opened_connections: List[str] = []
+
+    @asynccontextmanager
+    async def __call__(self, asgi_app: Any) -> AsyncIterator[None]:
+        await self.startup()
+        try:
+            yield
+        finally:
+            await self.shutdown()
+
+    async def startup(self) -> None:
+        names = self._publisher_names
+        if names is None:
+            names = self.app.settings.publishers.keys()
+        publisher_names = list(names)
+        rpc_client_names = list(self._rpc_client_names)
+        known_publishers = set(publishers)
+        known_connections = set(connections)
+        # Connections and declarations of all the components go at once
+        instances = await asyncio.gather(
+            *(self.app.publisher_instance(name) for name in publisher_names),
+            *(self.app.rpc_client_instance(name) for name in rpc_client_names),
+        )
+        self.publishers = dict(zip(publisher_names, instances))
+        self.rpc_clients = dict(zip(rpc_client_names, instances[len(publisher_names):]))
+        self._opened_publishers = [name for name in publishers if name not in known_publishers]
+        self._opened_connections = [name for name in connections if name not in known_connections]
+
+    def _in_flight(self) -> int:
+        publishes = sum(
+            publisher.metrics.in_flight.get() for publisher in self.publishers.values()
+        )
+        return int(publishes) + sum(client.pending_calls for client in self.rpc_clients.values())
+
+    async def drain(self) -> None:
+        deadline = monotonic() + self.drain_timeout
+        while self._in_flight() and monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    async def shutdown(self) -> None:
+        await self.drain()
+        for client in self.rpc_clients.values():
+            await client.cancel()
+        # Closed components are dropped from factory caches, so they are not reused
+        for name in self._opened_publishers:
+            instance = publishers.pop(name, None)
+            if instance is not None:
+                await instance.close()
+        for name in self._opened_connections:
+            connection = connections.pop(name, None)
+            if connection is not None:
+                await connection.close()
+        self._opened_publishers = []
+        self._opened_connections = []
+        self.publishers = {}
+        self.rpc_clients = {}
+
+    def publisher(self, name: str) -> Callable[[], Publisher]:
+        """
+        Dependency which returns publisher resolved at startup
+        """
+
+        def dependency() -> Publisher:
+            if name not in self.publishers:
+                raise KeyError(f"Publisher `{name}` is not resolved by lifespan")
+            return self.publishers[name]
+        return dependency
+
+    def rpc_client(self, name: str) -> Callable[[], RPCClient]:
+        """
+        Dependency which returns RPC client resolved at startup
+        """
+
+        def dependency() -> RPCClient:
+            if name not in self.rpc_clients:
+                raise KeyError(f"RPC client `{name}` is not resolved by lifespan")
+            return self.rpc_clients[name]
+        return dependency
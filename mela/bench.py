@@ -0,0 +1,237 @@
+"""
+Load generator for publishers and RPC clients described in settings,
+and recorder of live traffic which can be replayed by the generator.
+
+Recording is a sequence of records: `>dII` header with time offset of
+the message, length of JSON encoded meta (routing key, headers, content
+type) and length of the body, followed by the meta and the body.
+"""
+import asyncio
+import json
+import struct
+from itertools import cycle
+from time import monotonic
+from time import perf_counter
+from typing import Any
+from typing import Awaitable
+from typing import BinaryIO
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from aio_pika import Message
+from aio_pika.abc import AbstractIncomingMessage
+
+from .components.rate_limit import RateLimiter
+from .factories.core.connection import connect
+from .factories.core.exchange import declare_exchange
+from .settings import ConsumerParams
+from .settings import ExchangeParams
+from .settings import Settings
+
+
+RECORD_HEADER = struct.Struct('>dII')
+
+
+class Record:
+
+    __slots__ = ('offset', 'routing_key', 'headers', 'content_type', 'body')
+
+    def __init__(
+            self,
+            body: bytes,
+            routing_key: Optional[str] = None,
+            headers: Optional[Dict[str, Any]] = None,
+            content_type: Optional[str] = None,
+            offset: float = 0.0,
+    ):
+        self.body: bytes = body
+        self.routing_key: Optional[str] = routing_key
+        self.headers: Dict[str, Any] = headers or {}
+        self.content_type: Optional[str] = content_type
+        self.offset: float = offset
+
+    def message(self) -> Message:
+        # Sent message is changed by publisher, so every send gets new one
+        return Message(self.body, headers=dict(self.headers), content_type=self.content_type)
+
+
+def write_record(stream: BinaryIO, record: Record) -> None:
+    meta = json.dumps(
+        {
+            'routing_key': record.routing_key,
+            'headers': record.headers,
+            'content_type': record.content_type,
+        },
+        separators=(',', ':'),
+        default=str,
+    ).encode()
+    stream.write(RECORD_HEADER.pack(record.offset, len(meta), len(record.body)))
+    stream.write(meta)
+    stream.write(record.body)
+
+
+def read_records(stream: BinaryIO) -> Iterator[Record]:
+    while True:
+        header = stream.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        offset, meta_size, body_size = RECORD_HEADER.unpack(header)
+        meta = json.loads(stream.read(meta_size))
+        yield Record(stream.read(body_size), offset=offset, **meta)
+
+
+class LatencyStats:
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: int = 0
+        self.started: float = perf_counter()
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def report(self) -> str:
+        percentiles = ', '.join(
+            f'p{q}={self.percentile(q) * 1000:.2f}ms' for q in (50, 90, 99, 99.9)
+        )
+        return (
+            f"{len(self.latencies)} sent, {self.errors} failed in {self.elapsed:.2f}s: "
+            f"{self.throughput:.1f} msg/s, {percentiles}"
+        )
+
+
+Send = Callable[[Record], Awaitable[Any]]
+
+
+class LoadGenerator:
+
+    """
+    Sends records with `concurrency` senders at once, optionally not faster
+    than `rate` per second, until `duration` seconds or `count` sends pass.
+    """
+
+    def __init__(
+            self,
+            send: Send,
+            records: Iterable[Record],
+            rate: Optional[float] = None,
+            concurrency: int = 1,
+            duration: Optional[float] = None,
+            count: Optional[int] = None,
+    ):
+        self._send: Send = send
+        self._records: Iterator[Record] = cycle(records)
+        self._rate_limiter: Optional[RateLimiter] = None
+        if rate:
+            self._rate_limiter = RateLimiter(rate, burst=concurrency)
+        self.concurrency: int = concurrency
+        self.duration: Optional[float] = duration
+        self._left: Optional[int] = count
+        self.stats: LatencyStats = LatencyStats()
+
+    async def run(self) -> LatencyStats:
+        self.stats = LatencyStats()
+        deadline = None if self.duration is None else monotonic() + self.duration
+        await asyncio.gather(*(self._sender(deadline) for _ in range(self.concurrency)))
+        self.stats.finished = perf_counter()
+        return self.stats
+
+    def _has_next(self, deadline: Optional[float]) -> bool:
+        if deadline is not None and monotonic() >= deadline:
+            return False
+        if self._left is None:
+            return True
+        self._left -= 1
+        return self._left >= 0
+
+    async def _sender(self, deadline: Optional[float]) -> None:
+        while self._has_next(deadline):
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire()
+            record = next(self._records)
+            started = perf_counter()
+            try:
+                await self._send(record)
+            except Exception:
+                self.stats.errors += 1
+            else:
+                self.stats.latencies.append(perf_counter() - started)
+
+
+def consumer_params(settings: Settings, name: str) -> ConsumerParams:
+    """
+    Consumer is looked up by its own name, then by name of service or RPC
+    service which it belongs to
+    """
+    if name in settings.consumers:
+        return settings.consumers[name]
+    if name in settings.services:
+        return settings.services[name].consumer  # type: ignore
+    if name in settings.rpc_services:
+        return settings.rpc_services[name].worker  # type: ignore
+    raise KeyError(f"Consumer `{name}` is not described in config")
+
+
+async def record(
+        settings: ConsumerParams,
+        stream: BinaryIO,
+        duration: Optional[float] = None,
+        count: Optional[int] = None,
+) -> int:
+    """
+    Copy messages routed to the consumer into the stream. Temporary queue is
+    bound next to consumer's one, so the consumer still gets all of them.
+    """
+    assert isinstance(settings.exchange, ExchangeParams)
+    connection = await connect('mela_recorder', settings.connection, 'r')  # type: ignore
+    channel = await connection.channel()
+    exchange = await declare_exchange(settings.exchange, channel)
+    queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+    await queue.bind(exchange, routing_key=settings.routing_key)
+    recorded = 0
+    started = monotonic()
+    done = asyncio.Event()
+
+    async def on_message(message: AbstractIncomingMessage) -> None:
+        nonlocal recorded
+        if done.is_set():
+            return
+        write_record(stream, Record(
+            message.body,
+            message.routing_key,
+            message.headers,
+            message.content_type,
+            monotonic() - started,
+        ))
+        recorded += 1
+        if count is not None and recorded >= count:
+            done.set()
+
+    await queue.consume(on_message, no_ack=True)
+    try:
+        await asyncio.wait_for(done.wait(), duration)
+    except asyncio.TimeoutError:
+        pass
+    await channel.close()
+    return recorded
+
+
+def synthetic_records(payload: str, routing_key: Optional[str] = None) -> Tuple[Record]:
+    return (Record(payload.encode(), routing_key, content_type='application/json'),)
@@ -0,0 +1,195 @@
+"""
+Claim check. Publisher puts bodies above threshold to blob store and sends
+the reference in message header instead. Consumer resolves the reference
+before the body is decoded, or lazily, when the handler asks for the body,
+and deletes the blob when the message is acked or rejected for good.
+"""
+import abc
+import json
+import mmap
+import os
+from contextvars import ContextVar
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Optional
+from typing import Union
+from uuid import uuid4
+
+from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.abc import AbstractMessage
+from anyio.to_thread import run_sync
+
+from .compression import decompress_body
+
+
+CLAIM_CHECK_HEADER = 'x-mela-claim-check'
+
+Callback = Callable[[AbstractIncomingMessage], Awaitable[Any]]
+
+
+class BlobStore(abc.ABC):
+
+    @abc.abstractmethod
+    def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Union[bytes, memoryview]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def read(self, key: str) -> bytes:
+        """
+        Blob copied to memory at once
+        """
+        return bytes(self.get(key))
+
+
+class FileBlobStore(BlobStore):
+
+    """
+    Blobs are files in local or shared directory. Reads are memory mapped,
+    so the blob is paged in only when it is accessed.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+
+    def _path(self, key: str) -> str:
+        # Blobs are spread over subdirectories to keep directories small
+        return os.path.join(self.path, key[:2], key)
+
+    def put(self, data: bytes) -> str:
+        key = uuid4().hex
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as blob_file:
+            blob_file.write(data)
+        # Readers on shared filesystem never see partially written blob
+        os.replace(temp_path, path)
+        return key
+
+    def get(self, key: str) -> Union[bytes, memoryview]:
+        with open(self._path(key), 'rb') as blob_file:
+            if not os.fstat(blob_file.fileno()).st_size:
+                return b''
+            mapped = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)
+
+    def read(self, key: str) -> bytes:
+        # Whole blob is needed, so it's read without mapping
+        with open(self._path(key), 'rb') as blob_file:
+            return blob_file.read()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+# Claim check of the consumer which processes current message
+current_claim_check: ContextVar[Optional['ClaimCheck']] = ContextVar(
+    'mela_claim_check',
+    default=None,
+)
+
+
+class ClaimCheck:
+
+    def __init__(
+            self,
+            store: BlobStore,
+            threshold: int = 1024 * 1024,
+            lazy: bool = False,
+            delete_acked: bool = True,
+            keep_rejected: bool = False,
+    ):
+        self.store: BlobStore = store
+        self.threshold: int = threshold
+        self.lazy: bool = lazy
+        self.delete_acked: bool = delete_acked
+        # Rejected messages are dead lettered, and consumer of them needs the blob
+        self.keep_rejected: bool = keep_rejected
+
+    async def offload(self, message: AbstractMessage) -> AbstractMessage:
+        """
+        Body is replaced by JSON with size of the original body, so handlers
+        which load body lazily still can be called by JSON solver
+        """
+        if len(message.body) <= self.threshold:
+            return message
+        key = await run_sync(self.store.put, message.body)
+        message.headers[CLAIM_CHECK_HEADER] = key
+        size = len(message.body)
+        message.body = json.dumps({'claim_check': key, 'size': size}).encode()
+        message.body_size = len(message.body)
+        return message
+
+    async def load(self, message: AbstractIncomingMessage) -> Union[bytes, memoryview]:
+        key = message.headers.get(CLAIM_CHECK_HEADER) if message.headers else None
+        if key is None:
+            return message.body
+        return await run_sync(self.store.get, key)
+
+    async def resolve(self, message: AbstractIncomingMessage) -> None:
+        # Decoders need bytes, so the blob is read instead of being mapped
+        key = message.headers.get(CLAIM_CHECK_HEADER) if message.headers else None
+        if key is not None:
+            message.body = await run_sync(self.store.read, key)
+
+    async def release(self, message: AbstractIncomingMessage) -> None:
+        """
+        Delete the blob of acked message, nobody else needs it
+        """
+        if not self.delete_acked or not message.headers:
+            return
+        key = message.headers.get(CLAIM_CHECK_HEADER)
+        if key is not None:
+            await run_sync(self.store.delete, key)
+
+    async def reject(self, message: AbstractIncomingMessage) -> None:
+        """
+        Delete the blob of message which is nacked without requeue, unless
+        it goes to dead letter exchange
+        """
+        if not self.keep_rejected:
+            await self.release(message)
+
+    def resolving(self, func: Callback) -> Callback:
+
+        async def wrapper(message: AbstractIncomingMessage) -> Any:
+            if not self.lazy:
+                await self.resolve(message)
+                return await func(message)
+            token = current_claim_check.set(self)
+            try:
+                return await func(message)
+            finally:
+                current_claim_check.reset(token)
+        return wrapper
+
+
+async def load_body(message: AbstractIncomingMessage) -> Union[bytes, memoryview]:
+    """
+    Body of the message which may be offloaded to blob store. It is used by
+    handlers of consumers with lazy claim check.
+    """
+    claim_check = current_claim_check.get()
+    if claim_check is None:
+        return message.body
+    return await decompress_body(message, await claim_check.load(message))
+
+
+def is_unresolved(message: AbstractIncomingMessage) -> bool:
+    """
+    Body of the message is a stub which is resolved by `load_body` call
+    """
+    if current_claim_check.get() is None or not message.headers:
+        return False
+    return CLAIM_CHECK_HEADER in message.headers
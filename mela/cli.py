@@ -0,0 +1,154 @@
+"""
+Command line tools of Mela applications. Components are taken from settings
+of the application, i.e. `application.yml` in current directory.
+
+    mela bench publisher <name> --rate 1000 --concurrency 10 --duration 60
+    mela bench rpc <name> --replay traffic.mela
+    mela record <consumer> traffic.mela --count 10000
+    mela dictionary traffic.mela messages.dict --codec zstd
+
+Commands import modules when they are called, so `mela --help` is fast.
+"""
+import argparse
+from typing import TYPE_CHECKING
+from typing import List
+from typing import Optional
+
+
+if TYPE_CHECKING:
+    from .bench import Record
+    from .settings import Settings
+
+
+def load_settings(config: str) -> 'Settings':
+    from .settings import Settings
+    Settings.Config.yaml_file_path = config  # type: ignore
+    return Settings()
+
+
+def load_records(args: argparse.Namespace) -> List['Record']:
+    from .bench import read_records
+    from .bench import synthetic_records
+    if args.replay:
+        with open(args.replay, 'rb') as stream:
+            records = list(read_records(stream))
+        if not records:
+            raise SystemExit(f"Recording `{args.replay}` is empty")
+        return records
+    return list(synthetic_records(args.payload, args.routing_key))
+
+
+async def bench(args: argparse.Namespace) -> None:
+    from .bench import LoadGenerator
+    from .bench import Record
+    from .factories.core.connection import close_all_connections
+    from .factories.publisher import publisher
+    from .factories.rpc import client as rpc_client
+    settings = load_settings(args.config)
+    records = load_records(args)
+    if args.component == 'publisher':
+        publisher_ = await publisher(settings.publishers[args.name])
+
+        async def send(record_: Record):
+            return await publisher_.publish_message(record_.message(), record_.routing_key)
+    else:
+        client = await rpc_client(settings.rpc_services[args.name])
+
+        async def send(record_: Record):
+            return await client.call(record_.message(), timeout=args.timeout)
+
+    generator = LoadGenerator(
+        send,
+        records,
+        rate=args.rate,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        count=args.count,
+    )
+    try:
+        stats = await generator.run()
+    finally:
+        await close_all_connections()
+    print(stats.report())  # noqa: T201
+
+
+async def record_traffic(args: argparse.Namespace) -> None:
+    from .bench import consumer_params
+    from .bench import record
+    from .factories.core.connection import close_all_connections
+    settings = load_settings(args.config)
+    with open(args.output, 'wb') as stream:
+        try:
+            recorded = await record(
+                consumer_params(settings, args.name),
+                stream,
+                duration=args.duration,
+                count=args.count,
+            )
+        finally:
+            await close_all_connections()
+    print(f"{recorded} messages are recorded to `{args.output}`")  # noqa: T201
+
+
+async def train(args: argparse.Namespace) -> None:
+    from .bench import read_records
+    from .compression import dictionary_id
+    from .compression import train_dictionary
+    with open(args.recording, 'rb') as stream:
+        samples = [record_.body for record_ in read_records(stream)]
+    dictionary = train_dictionary(samples, args.codec, args.size)
+    with open(args.output, 'wb') as stream:
+        stream.write(dictionary)
+    print(  # noqa: T201
+        f"Dictionary `{dictionary_id(dictionary)}` of {len(dictionary)} bytes "
+        f"is trained on {len(samples)} messages",
+    )
+
+
+def parser() -> argparse.ArgumentParser:
+    root = argparse.ArgumentParser(prog='mela', description=__doc__)
+    root.add_argument('--config', default='application.yml', help="Settings file")
+    commands = root.add_subparsers(dest='command', required=True)
+
+    bench_parser = commands.add_parser('bench', help="Drive publisher or RPC client with load")
+    bench_parser.add_argument('component', choices=['publisher', 'rpc'])
+    bench_parser.add_argument('name', help="Name of the component in settings")
+    bench_parser.add_argument('--rate', type=float, help="Target messages per second")
+    bench_parser.add_argument('--concurrency', type=int, default=1)
+    bench_parser.add_argument('--duration', type=float, help="Seconds to run")
+    bench_parser.add_argument('--count', type=int, help="Messages to send")
+    bench_parser.add_argument('--payload', default='{}', help="JSON body of synthetic messages")
+    bench_parser.add_argument('--routing-key', help="Routing key of synthetic messages")
+    bench_parser.add_argument('--replay', help="Send messages of the recording in cycle")
+    bench_parser.add_argument('--timeout', type=float, default=30, help="Timeout of RPC call")
+    bench_parser.set_defaults(handler=bench)
+
+    record_parser = commands.add_parser('record', help="Record traffic of consumer to file")
+    record_parser.add_argument('name', help="Name of consumer, service or RPC service")
+    record_parser.add_argument('output', help="Recording file")
+    record_parser.add_argument('--duration', type=float, help="Seconds to record")
+    record_parser.add_argument('--count', type=int, help="Messages to record")
+    record_parser.set_defaults(handler=record_traffic)
+
+    dictionary_parser = commands.add_parser(
+        'dictionary',
+        help="Train compression dictionary on recorded messages",
+    )
+    dictionary_parser.add_argument('recording', help="Recording file")
+    dictionary_parser.add_argument('output', help="Dictionary file")
+    dictionary_parser.add_argument('--codec', choices=['zstd', 'deflate'], default='zstd')
+    dictionary_parser.add_argument('--size', type=int, default=16 * 1024, help="Max size in bytes")
+    dictionary_parser.set_defaults(handler=train)
+    return root
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parser().parse_args(argv)
+    import asyncio
+    if args.command == 'bench' and args.duration is None and args.count is None:
+        args.count = 10000
+    asyncio.run(args.handler(args))
+
+
+if __name__ == '__main__':
+    main()
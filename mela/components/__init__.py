@@ -1,9 +1,34 @@
-from .consumer import Consumer
-from .exceptions import NackMessageError
-from .publisher import Publisher
-from .rpc import RPC
-from .rpc import RPCClient
-from .service import Service
+from typing import TYPE_CHECKING
 
+from ..lazy import lazy_attributes
 
-__all__ = ['Consumer', 'Publisher', 'Service', 'RPC', 'RPCClient', 'NackMessageError']
+
+if TYPE_CHECKING:
+    from .consumer import Consumer
+    from .exceptions import NackMessageError
+    from .publisher import Publisher
+    from .rate_limit import RateLimiter
+    from .rpc import RPC
+    from .rpc import RPCClient
+    from .service import Service
+
+
+__all__ = [
+    'Consumer',
+    'Publisher',
+    'Service',
+    'RPC',
+    'RPCClient',
+    'NackMessageError',
+    'RateLimiter',
+]
+
+__getattr__, __dir__ = lazy_attributes(__name__, globals(), {
+    'Consumer': '.consumer',
+    'Publisher': '.publisher',
+    'Service': '.service',
+    'RPC': '.rpc',
+    'RPCClient': '.rpc',
+    'NackMessageError': '.exceptions',
+    'RateLimiter': '.rate_limit',
+})
@@ -1,9 +1,11 @@
 import abc
 import asyncio
 import logging
+from typing import Iterable
 from typing import Optional
 
-from ..log import handler
+from .. import log  # noqa: F401 Sets up stdout handler of root logger
+from ..middleware import Middleware
 
 
 class Component(abc.ABC):
@@ -18,10 +20,15 @@ class Component(abc.ABC):
             self.config_logger(log_level)
 
     def config_logger(self, level: str):
+        # Records propagate to stdout handler of root logger
         self.log = logging.getLogger(self.name)
-        self.log.addHandler(handler)
         self.log.setLevel(level.upper())
 
+    def use_middlewares(self, middlewares: Iterable[Middleware]) -> None:
+        """
+        Apply publish hooks of middlewares to publishers of the component
+        """
+
 
 class ConsumingComponent(Component, abc.ABC):
 
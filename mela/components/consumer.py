@@ -1,15 +1,35 @@
 from json import JSONDecodeError
+from time import perf_counter
+from time import time
 from typing import Any
+from typing import Awaitable
 from typing import Callable
 from typing import Coroutine
 from typing import Optional
+from typing import TypeVar
 
+from aio_pika.abc import AbstractChannel
 from aio_pika.abc import AbstractIncomingMessage
 from aio_pika.abc import AbstractQueue
 
+from mela.claim_check import ClaimCheck
+from mela.claim_check import is_unresolved
 from mela.components.base import ConsumingComponent
 from mela.components.exceptions import NackMessageError
+from mela.components.load_shedding import LoadShedder
+from mela.components.rate_limit import RateLimiter
+from mela.components.scheduler import PriorityScheduler
+from mela.compression import decompress
+from mela.compression import is_compressed
+from mela.deadline import current_deadline
+from mela.deadline import get_deadline
+from mela.metrics import ConsumerMetrics
+from mela.metrics import registry
 from mela.processor import Processor
+from mela.profiling import SamplingProfiler
+
+
+T = TypeVar('T')
 
 
 class Consumer(ConsumingComponent):
@@ -24,8 +44,17 @@ class Consumer(ConsumingComponent):
             consumer_tag: Optional[str] = None,
             requeue_broken_messages: bool = True,
             log_level: str = 'info',
+            prioritize: bool = False,
+            concurrency: int = 1,
+            drop_expired: bool = False,
+            decompress: bool = False,
             *,
             queue: Optional[AbstractQueue] = None,
+            channel: Optional[AbstractChannel] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            load_shedder: Optional[LoadShedder] = None,
+            profiler: Optional[SamplingProfiler] = None,
+            claim_check: Optional[ClaimCheck] = None,
     ):
         super().__init__(name, log_level)
         self._prefetch_count: int = prefetch_count
@@ -34,7 +63,18 @@ class Consumer(ConsumingComponent):
         self._exclusive: bool = exclusive
         self._consumer_tag: Optional[str] = consumer_tag
         self._queue: Optional[AbstractQueue] = None
+        self._channel: Optional[AbstractChannel] = channel
         self.requeue_broken_messages = requeue_broken_messages
+        self._rate_limiter: Optional[RateLimiter] = rate_limiter
+        self._drop_expired: bool = drop_expired
+        self._decompress: bool = decompress
+        self.metrics: ConsumerMetrics = ConsumerMetrics(name)
+        self._load_shedder: Optional[LoadShedder] = load_shedder
+        self._scheduler: Optional[PriorityScheduler] = None
+        self._profiler: Optional[SamplingProfiler] = profiler
+        self._claim_check: Optional[ClaimCheck] = claim_check
+        if prioritize:
+            self._scheduler = PriorityScheduler(concurrency, log=self.log)
         if queue:
             self.set_queue(queue)
 
@@ -54,37 +94,171 @@ class Consumer(ConsumingComponent):
     def set_queue(self, queue: AbstractQueue):
         self._queue = queue
 
+    async def set_prefetch_count(self, prefetch_count: int) -> None:
+        assert self._channel, "Channel is not set"
+        await self._channel.set_qos(prefetch_count=prefetch_count)
+        self._prefetch_count = prefetch_count
+
+    def set_rate_limit(self, rate: float, burst: Optional[int] = None) -> None:
+        assert self._rate_limiter, "Consumer has no rate limiter"
+        self._rate_limiter.configure(rate, burst)
+
+    @property
+    def no_ack(self) -> bool:
+        return self._no_ack
+
     def get_queue_name(self) -> str:
         assert self._queue
         return self._queue.name
 
     def set_processor(self, processor: Processor):
         self._processor = processor
+        self.profile(processor)
+        process = self.timed(processor.process)
 
         async def wrapper(message: AbstractIncomingMessage):
             try:
-                await processor.process(message)
+                await process(message)
             except NackMessageError as e:
-                await message.nack(requeue=e.requeue)
+                await self.nack(message, requeue=e.requeue, reason='rejected')
                 self.log.exception("Message is Nacked:")
             except JSONDecodeError:
                 self.log.exception("Message cannot be serialized, so we "
                                    "Nack it with requeue=False")
-                await message.nack(requeue=False)
+                await self.nack(message, requeue=False, reason='undecodable')
             except Exception:
-                await message.nack(requeue=self.requeue_broken_messages)
+                await self.nack(message, requeue=self.requeue_broken_messages, reason='broken')
                 self.log.exception("Message is broken:")
             else:
-                await message.ack()
+                await self.ack(message)
 
         self.set_callback(wrapper)
 
+    def timed(self, func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        """
+        Processor call which observes handler duration, if metrics are enabled
+        """
+        if not registry.enabled:
+            return func
+        duration = self.metrics.handler_duration
+
+        async def wrapper(*args, **kwargs) -> T:
+            started = perf_counter()
+            result = await func(*args, **kwargs)
+            duration.observe(perf_counter() - started)
+            return result
+        return wrapper
+
+    def profile(self, processor: Processor) -> None:
+        """
+        Sample invocations of processor, which handles messages of this consumer,
+        with the profiler of the consumer if it has one. Processor of restarted
+        consumer stops using profiler of the previous one.
+        """
+        processor.use_profiler(self._profiler)
+
+    async def ack(self, message: AbstractIncomingMessage) -> None:
+        await message.ack()
+        self.metrics.acked.inc()
+        if self._claim_check is not None:
+            await self._claim_check.release(message)
+
+    async def nack(self, message: AbstractIncomingMessage, requeue: bool, reason: str) -> None:
+        await message.nack(requeue=requeue)
+        self.metrics.nacked(reason).inc()
+        if not requeue and self._claim_check is not None:
+            await self._claim_check.reject(message)
+
     def set_callback(self, func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]):
+        func = self._loading_body(func)
+        if self._rate_limiter is not None:
+            # Delivered messages wait for a token unacked, so broker doesn't send
+            # more than `prefetch_count` of them instead of buffering them here
+            func = self._rate_limiter.limit(func)
+        if self._drop_expired:
+            func = self._skip_expired(func)
+        if self._load_shedder is not None:
+            func = self._load_shedder.guard(func, self.log, self.nack)
+        if self._scheduler is not None:
+            func = self._scheduler.schedule(func)
+            if self._load_shedder is not None:
+                # Time spent in scheduler queue is the queueing delay to watch
+                func = self._load_shedder.stamp(func)
+        if registry.enabled:
+            func = self._count_received(func)
         self._callback = func
 
+    def _loading_body(
+            self,
+            func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]],
+    ) -> Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]:
+        if self._profiler is not None:
+            func = self._profiler.scope(func)
+        if self._decompress:
+            func = self._decompressing(func)
+        if self._claim_check is not None:
+            func = self._claim_check.resolving(func)
+        return func
+
+    def _count_received(
+            self,
+            func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]],
+    ) -> Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]:
+        received = self.metrics.received
+
+        async def wrapper(message: AbstractIncomingMessage) -> None:
+            received.inc()
+            await func(message)
+        return wrapper
+
+    def _decompressing(
+            self,
+            func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]],
+    ) -> Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]:
+
+        async def wrapper(message: AbstractIncomingMessage) -> None:
+            if not is_compressed(message) or is_unresolved(message):
+                return await func(message)
+            try:
+                await decompress(message)
+            except Exception:
+                await self.nack(message, requeue=False, reason='undecodable')
+                self.log.exception("Message cannot be decompressed, so we "
+                                   "Nack it with requeue=False")
+                return None
+            return await func(message)
+        return wrapper
+
+    def _skip_expired(
+            self,
+            func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]],
+    ) -> Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]:
+
+        async def wrapper(message: AbstractIncomingMessage) -> None:
+            deadline = get_deadline(message)
+            if deadline is None:
+                return await func(message)
+            if deadline <= time():
+                # Message goes to dead letter exchange if queue has one
+                await self.nack(message, requeue=False, reason='expired')
+                self.log.warning("Message is expired, so we Nack it with requeue=False")
+                return None
+            token = current_deadline.set(deadline)
+            try:
+                return await func(message)
+            finally:
+                current_deadline.reset(token)
+        return wrapper
+
     async def consume(self, **kwargs) -> str:
         assert self._callback is not None, "We can't start without a processor, dude"
         assert self._queue is not None, "Queue is not set"
+        if self._scheduler is not None:
+            self._scheduler.start()
+        if self._load_shedder is not None:
+            self._load_shedder.start()
+        if self._profiler is not None:
+            self._profiler.start()
         consumer_tag = await self._queue.consume(
             callback=self._callback,
             no_ack=self._no_ack,
@@ -99,4 +273,19 @@ class Consumer(ConsumingComponent):
     async def cancel(self, timeout: Optional[int] = None, nowait: bool = False):
         assert self._consumer_tag
         assert self._queue
-        return await self._queue.cancel(self._consumer_tag, timeout, nowait)
+        result = await self._queue.cancel(self._consumer_tag, timeout, nowait)
+        if self._scheduler is not None:
+            await self._scheduler.stop()
+        if self._load_shedder is not None:
+            self._load_shedder.stop()
+        if self._profiler is not None:
+            self._profiler.stop()
+        return result
+
+    async def close(self) -> None:
+        """
+        Close channel of cancelled consumer. Messages which are delivered
+        but not acked yet are redelivered by broker.
+        """
+        if self._channel is not None:
+            await self._channel.close()
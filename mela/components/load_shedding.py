@@ -0,0 +1,111 @@
+import asyncio
+from logging import Logger
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import Dict
+from typing import Optional
+from typing import Set
+
+from aio_pika.abc import AbstractIncomingMessage
+
+from ..loop_lag import LoopLagMonitor
+from ..loop_lag import loop_lag_monitor
+
+
+Callback = Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]
+Nack = Callable[[AbstractIncomingMessage, bool, str], Coroutine[Any, Any, None]]
+
+
+class LoadShedder:
+
+    """
+    Nacks deliveries instead of handling them while consumer is overloaded:
+    message was waiting for a handler longer than `max_queue_delay` or event loop
+    lag is higher than `max_loop_lag`. Messages with priority not less than
+    `protected_priority` are never shed.
+
+    Shed messages go to dead letter exchange of the queue, or back to the queue
+    after `requeue_pause` seconds if `requeue` is set. Handler is not held while
+    the message waits to be requeued.
+    """
+
+    def __init__(
+            self,
+            max_queue_delay: Optional[float] = None,
+            max_loop_lag: Optional[float] = None,
+            protected_priority: Optional[int] = None,
+            requeue: bool = False,
+            requeue_pause: float = 1.0,
+    ):
+        self._max_queue_delay = max_queue_delay
+        self._max_loop_lag = max_loop_lag
+        self._protected_priority = protected_priority
+        self._requeue = requeue
+        self._requeue_pause = requeue_pause
+        self._arrivals: Dict[int, float] = {}
+        self._monitor: Optional[LoopLagMonitor] = None
+        self._requeues: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        if self._max_loop_lag is not None:
+            self._monitor = loop_lag_monitor()
+            self._monitor.start()
+
+    def stop(self) -> None:
+        if self._monitor is not None:
+            self._monitor.stop()
+            self._monitor = None
+        # Paused messages are requeued at once
+        for task in self._requeues:
+            task.cancel()
+
+    def stamp(self, func: Callback) -> Callback:
+        """
+        Remember when the message was delivered. Should wrap everything
+        the message can wait in, like priority scheduler.
+        """
+
+        async def wrapper(message: AbstractIncomingMessage) -> None:
+            self._arrivals[id(message)] = asyncio.get_running_loop().time()
+            await func(message)
+        return wrapper
+
+    def guard(self, func: Callback, log: Logger, nack: Nack) -> Callback:
+
+        async def wrapper(message: AbstractIncomingMessage) -> None:
+            arrived_at = self._arrivals.pop(id(message), None)
+            if not self._is_overloaded(message, arrived_at):
+                return await func(message)
+            log.warning("Consumer is overloaded, so message is shed")
+            if not self._requeue or not self._requeue_pause:
+                return await nack(message, self._requeue, 'shed')
+            task = asyncio.get_running_loop().create_task(self._requeue_later(message, nack))
+            self._requeues.add(task)
+            task.add_done_callback(self._requeues.discard)
+            return None
+        return wrapper
+
+    async def _requeue_later(self, message: AbstractIncomingMessage, nack: Nack) -> None:
+        try:
+            await asyncio.sleep(self._requeue_pause)
+        finally:
+            await nack(message, True, 'shed')
+
+    def _is_overloaded(
+            self,
+            message: AbstractIncomingMessage,
+            arrived_at: Optional[float],
+    ) -> bool:
+        if (
+                self._protected_priority is not None
+                and (message.priority or 0) >= self._protected_priority
+        ):
+            return False
+        if self._max_queue_delay is not None and arrived_at is not None:
+            queue_delay = asyncio.get_running_loop().time() - arrived_at
+            if queue_delay > self._max_queue_delay:
+                return True
+        if self._monitor is not None and self._max_loop_lag is not None:
+            return self._monitor.lag > self._max_loop_lag
+        return False
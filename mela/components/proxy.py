@@ -0,0 +1,122 @@
+"""
+Publishers and RPC clients which are resolved on first use. Proxy is
+injected to handlers instead of component, so processes which never
+publish or call don't connect and declare topology for them.
+"""
+import asyncio
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Coroutine
+from typing import Dict
+from typing import Generic
+from typing import Optional
+from typing import Type
+from typing import TypeVar
+from typing import Union
+
+from aio_pika.abc import AbstractMessage
+from pydantic import BaseModel
+
+from ..abc import AbstractPublisher
+from ..abc import AbstractRPCClient
+
+
+T = TypeVar('T')
+
+
+class LazyComponent(Generic[T]):
+
+    """
+    Component is resolved by `resolver` once, even if it's requested
+    concurrently. Resolution and calls are done in event loop where proxy
+    is created, so proxy can be used from other threads and loops too.
+    """
+
+    def __init__(self, name: str, resolver: Callable[[], Awaitable[T]]):
+        self.name: str = name
+        self._resolver: Callable[[], Awaitable[T]] = resolver
+        self._instance: Optional[T] = None
+        self._resolving: Optional[asyncio.Future] = None
+        self._loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    @property
+    def is_resolved(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def instance(self) -> T:
+        if self._instance is None:
+            raise RuntimeError(f"Component `{self.name}` is not resolved yet")
+        return self._instance
+
+    async def resolve(self) -> T:
+        if self._instance is not None:
+            return self._instance
+        return await self._in_loop(self._resolve())
+
+    async def _resolve(self) -> T:
+        if self._resolving is None:
+            self._resolving = self._loop.create_task(self._create())
+        # Cancelled caller doesn't cancel resolution awaited by others
+        return await asyncio.shield(self._resolving)
+
+    async def _create(self) -> T:
+        try:
+            self._instance = await self._resolver()
+        finally:
+            # Failed resolution is retried by next call
+            self._resolving = None
+        return self._instance
+
+    async def _in_loop(self, coro: Coroutine) -> Any:
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    async def _call(self, method: str, *args, **kwargs) -> Any:
+        if self._instance is None or asyncio.get_running_loop() is not self._loop:
+            return await self._in_loop(self._resolve_and_call(method, *args, **kwargs))
+        return await getattr(self._instance, method)(*args, **kwargs)
+
+    async def _resolve_and_call(self, method: str, *args, **kwargs) -> Any:
+        instance = await self.resolve()
+        return await getattr(instance, method)(*args, **kwargs)
+
+
+class LazyPublisher(LazyComponent, AbstractPublisher):
+
+    async def publish_message(
+        self,
+        message: AbstractMessage,
+        routing_key: str = None,
+        timeout: int = None,
+    ):
+        return await self._call('publish_message', message, routing_key, timeout)
+
+    async def publish(
+            self,
+            message: Union[Dict, BaseModel, AbstractMessage],
+            routing_key: Optional[str] = None,
+            priority: Optional[int] = None,
+            deadline: Optional[float] = None,
+    ):
+        return await self._call('publish', message, routing_key, priority, deadline)
+
+
+class LazyRPCClient(LazyComponent, AbstractRPCClient):
+
+    async def call(
+            self,
+            body: Union[AbstractMessage, BaseModel, dict],
+            headers: Optional[Dict] = None,
+            timeout: Optional[float] = None,
+    ):
+        return await self._call('call', body, headers, timeout)
+
+
+# Proxies by types of components which can be resolved lazily
+proxies: Dict[str, Type[LazyComponent]] = {
+    'publisher': LazyPublisher,
+    'rpc_client': LazyRPCClient,
+}
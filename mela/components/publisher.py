@@ -1,5 +1,9 @@
 import asyncio
+from functools import partial
+from time import perf_counter
 from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Union
 
@@ -7,11 +11,27 @@ from aio_pika.abc import AbstractChannel
 from aio_pika.abc import AbstractExchange
 from aio_pika.abc import AbstractMessage
 from aiormq.abc import ConfirmationFrameType
+from aiormq.exceptions import ChannelInvalidStateError
+from aiormq.exceptions import DeliveryError
+from anyio.to_thread import run_sync
 from pydantic import BaseModel
 
 from ..abc import AbstractPublisher
+from ..claim_check import ClaimCheck
 from ..components.base import Component
+from ..compression import Compressor
+from ..deadline import stamp_deadline
+from ..metrics import PublisherMetrics
+from ..middleware import Middleware
+from ..middleware import merge_middlewares
+from ..middleware import overridden_hooks
+from ..outbox import Outbox
 from ..processor import Processor
+from .rate_limit import RateLimiter
+
+
+# Errors after which message is kept in outbox to be published later
+UNREACHABLE_ERRORS = (ConnectionError, ChannelInvalidStateError)
 
 
 class Publisher(Component, AbstractPublisher):
@@ -22,22 +42,59 @@ class Publisher(Component, AbstractPublisher):
             default_routing_key: str = '',
             default_timeout: int = None,
             log_level: str = 'info',
+            inherit_deadline: bool = False,
             *,
             exchange: Optional[AbstractExchange] = None,
             channel: Optional[AbstractChannel] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            claim_check: Optional[ClaimCheck] = None,
+            compressor: Optional[Compressor] = None,
+            outbox: Optional[Outbox] = None,
     ):
         super().__init__(name, log_level)
         self._default_routing_key = default_routing_key
         self._default_timeout = default_timeout
+        self._inherit_deadline = inherit_deadline
         self._exchange: Optional[AbstractExchange] = None
         if exchange:
             self.set_exchange(exchange)
         self._channel = channel
+        self._rate_limiter: Optional[RateLimiter] = rate_limiter
+        self._claim_check: Optional[ClaimCheck] = claim_check
+        self._compressor: Optional[Compressor] = compressor
+        self._outbox: Optional[Outbox] = outbox
+        self._draining: Optional[asyncio.Task] = None
+        self.metrics: PublisherMetrics = PublisherMetrics(name)
+        self._middlewares: List[Middleware] = []
 
     def set_exchange(self, exchange: AbstractExchange):
         assert self._exchange is None, "Exchange already is set"
         self._exchange = exchange
 
+    def use_middlewares(self, middlewares: Iterable[Middleware]) -> None:
+        """
+        Publisher can be shared by several components, so middlewares
+        of all of them are applied once.
+        """
+        self._middlewares = merge_middlewares(self._middlewares, middlewares)
+        around_publish = overridden_hooks(self._middlewares, 'around_publish')
+        if not around_publish:
+            self.__dict__.pop('publish_message', None)
+            return
+        publish = partial(type(self).publish_message, self)
+
+        async def publish_message(
+                message: AbstractMessage,
+                routing_key: str = None,
+                timeout: int = None,
+        ) -> Optional[ConfirmationFrameType]:
+            call = partial(publish, timeout=timeout)
+            for hook in reversed(around_publish):
+                call = partial(hook, call)
+            return await call(message, routing_key)
+
+        self.publish_message = publish_message  # type: ignore
+
     async def publish_message(
         self,
         message: AbstractMessage,
@@ -49,16 +106,127 @@ class Publisher(Component, AbstractPublisher):
             routing_key = self._default_routing_key
         if timeout is None:
             timeout = self._default_timeout
+        message = await self._prepare(message)
+        if self._outbox is not None:
+            return await self._publish_or_store(message, routing_key, timeout)
         while self._channel.is_closed:
             # Hacky way to avoid ChannelInvalidStateError
             # See https://github.com/mosquito/aio-pika/issues/508
             await asyncio.sleep(0.001)
-        return await self._exchange.publish(message, routing_key, timeout=timeout)
+        return await self._publish(message, routing_key, timeout)
+
+    async def _publish(
+            self,
+            message: AbstractMessage,
+            routing_key: str,
+            timeout: Optional[int],
+    ) -> Optional[ConfirmationFrameType]:
+        self.metrics.in_flight.inc()
+        started = perf_counter()
+        try:
+            confirmation = await self._exchange.publish(message, routing_key, timeout=timeout)
+        except Exception:
+            self.metrics.failures.inc()
+            raise
+        finally:
+            self.metrics.in_flight.dec()
+        self.metrics.duration.observe(perf_counter() - started)
+        self.metrics.published.inc()
+        return confirmation
+
+    async def _publish_or_store(
+            self,
+            message: AbstractMessage,
+            routing_key: str,
+            timeout: Optional[int],
+    ) -> Optional[ConfirmationFrameType]:
+        """
+        Messages go to outbox while broker is unreachable and while outbox
+        is not drained, so they are published in order
+        """
+        assert self._outbox is not None
+        if not self._channel.is_closed and not self._outbox.depth:
+            try:
+                return await self._publish(message, routing_key, timeout)
+            except UNREACHABLE_ERRORS:
+                self.log.warning("Broker is unreachable, so message is kept in outbox")
+        await self._outbox.put(message, routing_key)
+        self.drain_outbox()
+        return None
+
+    def drain_outbox(self) -> None:
+        if self._outbox is None or not self._outbox.depth:
+            return
+        if self._draining is None or self._draining.done():
+            self._draining = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        assert self._outbox is not None
+        while self._outbox.depth:
+            if self._channel.is_closed:
+                await asyncio.sleep(self._outbox.interval)
+                continue
+            entries = await self._outbox.read()
+            results = await asyncio.gather(
+                *(self._publish(message, key, None) for _, key, message in entries),
+                return_exceptions=True,
+            )
+            done = [
+                id_ for (id_, _, _), result in zip(entries, results)
+                if not isinstance(result, Exception) or self._is_rejected(result)
+            ]
+            await self._outbox.remove(done)
+            if len(done) < len(entries):
+                await asyncio.sleep(self._outbox.interval)
+        self.log.info("Outbox is drained")
+
+    async def close(self) -> None:
+        """
+        Stop draining the outbox and close it. Messages left there are
+        drained by the next run.
+        """
+        if self._draining is not None:
+            self._draining.cancel()
+            await asyncio.gather(self._draining, return_exceptions=True)
+            self._draining = None
+        if self._outbox is not None:
+            await run_sync(self._outbox.close)
+
+    def _is_rejected(self, error: Exception) -> bool:
+        """
+        Message which broker has returned or nacked will not be taken later
+        either, so it is dropped from outbox
+        """
+        if not isinstance(error, DeliveryError):
+            return False
+        self.log.error(f"Message from outbox is rejected by broker: {error!r}")
+        return True
+
+    async def _prepare(self, message: AbstractMessage) -> AbstractMessage:
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire()
+        stamp_deadline(message, inherit=self._inherit_deadline)
+        if self._compressor is not None:
+            # Blob store keeps compressed body, and consumer decompresses it after loading
+            message = await self._compressor.compress(message)
+        if self._claim_check is not None:
+            message = await self._claim_check.offload(message)
+        return message
 
     async def publish(
             self,
             message: Union[Dict, BaseModel, AbstractMessage],
             routing_key: Optional[str] = None,
+            priority: Optional[int] = None,
+            deadline: Optional[float] = None,
     ):
+        """
+        `deadline` is an absolute unix timestamp after which nobody needs
+        the message to be processed.
+        """
         message, routing_key = Processor.wrap_response(message, routing_key)
+        if priority is not None:
+            message.priority = priority
+        if deadline is not None:
+            stamp_deadline(message, deadline)
         return await self.publish_message(message, routing_key)
@@ -0,0 +1,61 @@
+import asyncio
+from functools import wraps
+from math import ceil
+from time import monotonic
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import Optional
+
+
+class RateLimiter:
+
+    """
+    Token bucket rate limiter. Bucket is refilled with `rate` tokens per second
+    up to `burst` tokens. Single limiter can be shared between several components,
+    so they share one budget.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        assert rate > 0, "Rate should be positive"
+        self.rate: float = rate
+        self.burst: int = burst if burst is not None else max(1, ceil(rate))
+        self._tokens: float = float(self.burst)
+        self._updated_at: float = monotonic()
+        self._lock = asyncio.Lock()
+
+    def configure(self, rate: float, burst: Optional[int] = None) -> None:
+        """
+        Change rate and burst of running limiter. Tokens collected with
+        previous rate are kept up to the new burst.
+        """
+        assert rate > 0, "Rate should be positive"
+        self._refill()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, ceil(rate))
+        self._tokens = min(self._tokens, float(self.burst))
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        # Lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def limit(
+            self,
+            func: Callable[..., Coroutine[Any, Any, Any]],
+    ) -> Callable[..., Coroutine[Any, Any, Any]]:
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            await self.acquire()
+            return await func(*args, **kwargs)
+        return wrapper
@@ -1,8 +1,11 @@
 from asyncio import AbstractEventLoop
 from asyncio import Future
 from asyncio import Lock
+from asyncio import wait_for
 from json import JSONDecodeError
 from json import loads
+from time import time
+from typing import Iterable
 from typing import Optional
 from typing import Type
 from typing import Union
@@ -13,6 +16,10 @@ from aio_pika.abc import AbstractMessage
 from pydantic import BaseModel
 
 from ..abc import AbstractRPCClient
+from ..deadline import remaining
+from ..deadline import stamp_deadline
+from ..metrics import rpc_pending_calls
+from ..middleware import Middleware
 from ..processor import Processor
 from . import Consumer
 from . import Publisher
@@ -44,29 +51,39 @@ class RPC(ConsumingComponent):
         self._client: Optional[RPCClient] = None
 
     def set_processor(self, processor: Processor):
+        assert self._worker
+        self._worker.profile(processor)
+        process = self._worker.timed(processor.process)
 
         async def on_message(message: AbstractIncomingMessage) -> None:
             try:
-                outgoing_message, _ = await processor.process(message)
+                outgoing_message, _ = await process(message)
                 outgoing_message.correlation_id = message.correlation_id
                 await self._response_publisher.publish_message(
                     outgoing_message,
                     routing_key=message.reply_to,
                 )
             except NackMessageError as e:
-                await message.nack(requeue=e.requeue)
+                await self._worker.nack(message, requeue=e.requeue, reason='rejected')
                 self.log.exception("Message is Nacked:")
             except JSONDecodeError:
                 self.log.exception("Message cannot be serialized, so we "
                                    "Nack it with requeue=False")
-                await message.nack(requeue=False)
+                await self._worker.nack(message, requeue=False, reason='undecodable')
             except Exception:
-                await message.nack(requeue=self._worker.requeue_broken_messages)
+                await self._worker.nack(
+                    message,
+                    requeue=self._worker.requeue_broken_messages,
+                    reason='broken',
+                )
                 self.log.exception("Message is broken:")
             else:
-                await message.ack()
+                await self._worker.ack(message)
         self._worker.set_callback(on_message)
 
+    def use_middlewares(self, middlewares: Iterable[Middleware]) -> None:
+        self._response_publisher.use_middlewares(middlewares)
+
     @property
     def client(self):
         assert self._client is not None
@@ -108,12 +125,27 @@ class RPCClient(ConsumingComponent, AbstractRPCClient):
         self._response_model = response_model
         self._futures = {}
         self._consuming = Lock()
+        rpc_pending_calls.labels(name).set_function(lambda: self.pending_calls)
+
+    @property
+    def pending_calls(self) -> int:
+        return len(self._futures)
 
     @staticmethod
     def _generate_correlation_id():
         return str(uuid4())
 
-    async def call(self, body: Union[AbstractMessage, BaseModel, dict], headers=None):
+    async def call(
+            self,
+            body: Union[AbstractMessage, BaseModel, dict],
+            headers=None,
+            timeout: Optional[float] = None,
+    ):
+        """
+        Caller's timeout is stamped into request as a deadline, so server
+        doesn't process the request if nobody waits for the response anymore.
+        Deadline of currently processed message is taken into account too.
+        """
         assert self._consuming.locked(), "Consumer is not active"
         message, _ = Processor.wrap_response(body)
         message.correlation_id = self._generate_correlation_id()
@@ -121,19 +153,31 @@ class RPCClient(ConsumingComponent, AbstractRPCClient):
         if headers is not None:
             assert isinstance(headers, dict)
             message.headers.update(headers)
+        deadline = stamp_deadline(
+            message,
+            None if timeout is None else time() + timeout,
+            inherit=True,
+        )
 
         future = self.loop.create_future()
         self._futures[message.correlation_id] = future
 
-        await self._request_publisher.publish_message(message)
+        try:
+            await self._request_publisher.publish_message(message)
+            if deadline is None:
+                return await future
+            return await wait_for(future, remaining(deadline))
+        finally:
+            self._futures.pop(message.correlation_id, None)
 
-        return await future
+    def use_middlewares(self, middlewares: Iterable[Middleware]) -> None:
+        self._request_publisher.use_middlewares(middlewares)
 
     def _prepare_callback(self):
 
         async def on_message(message: AbstractIncomingMessage) -> None:
             if message.correlation_id is None:
-                await message.nack(requeue=False)
+                await self._response_consumer.nack(message, requeue=False, reason='rejected')
                 raise KeyError("Message without correlation id")
 
             if self._response_model:
@@ -143,7 +187,7 @@ class RPCClient(ConsumingComponent, AbstractRPCClient):
             future: Future = self._futures.pop(message.correlation_id, None)
             if future is not None:
                 future.set_result(parsed_response)
-            await message.ack()
+            await self._response_consumer.ack(message)
 
         self._response_consumer.set_callback(on_message)
 
@@ -0,0 +1,74 @@
+import asyncio
+from itertools import count
+from logging import Logger
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import List
+from typing import Optional
+
+from aio_pika.abc import AbstractIncomingMessage
+
+
+class PriorityScheduler:
+
+    """
+    Orders already delivered (prefetched) messages by their priority before
+    they reach the callback. Messages of the same priority are handled in
+    arrival order. Only `concurrency` callbacks are running at once, so it makes
+    sense when `concurrency` is less than consumer `prefetch_count`.
+    """
+
+    def __init__(self, concurrency: int = 1, log: Optional[Logger] = None):
+        assert concurrency > 0, "Concurrency should be positive"
+        self._concurrency: int = concurrency
+        self._log: Optional[Logger] = log
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._counter = count()
+        self._workers: List[asyncio.Task] = []
+        self._callback: Optional[
+            Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]
+        ] = None
+
+    def schedule(
+            self,
+            func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]],
+    ) -> Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]:
+        self._callback = func
+        return self.put
+
+    async def put(self, message: AbstractIncomingMessage) -> None:
+        assert self._queue is not None, "Scheduler is not started"
+        priority = message.priority or 0
+        self._queue.put_nowait((-priority, next(self._counter), message))
+
+    def start(self) -> None:
+        assert self._callback is not None, "Callback is not set"
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        while len(self._workers) < self._concurrency:
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def stop(self) -> None:
+        """
+        Handle messages which are already scheduled and stop workers.
+        """
+        if self._queue is not None:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        assert self._queue is not None
+        assert self._callback is not None
+        while True:
+            _, _, message = await self._queue.get()
+            try:
+                await self._callback(message)
+            except Exception:
+                if self._log:
+                    self._log.exception("Scheduled message callback failed:")
+            finally:
+                self._queue.task_done()
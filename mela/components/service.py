@@ -1,12 +1,19 @@
+import asyncio
 from json import JSONDecodeError
+from typing import AsyncIterator
+from typing import Iterable
+from typing import List
 from typing import Optional
+from typing import Tuple
 
 from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.abc import AbstractMessage
 
 from mela.components import Consumer
 from mela.components import Publisher
 from mela.components.base import ConsumingComponent
 from mela.components.exceptions import NackMessageError
+from mela.middleware import Middleware
 from mela.processor import Processor
 
 
@@ -30,25 +37,62 @@ class Service(ConsumingComponent):
 
     def set_processor(self, processor: Processor):
         self._processor = processor
+        self.consumer.profile(processor)
+        publish_results = self.consumer.timed(self._publish_results)
 
         async def on_message(message: AbstractIncomingMessage) -> None:
             try:
-                outgoing_message, routing_key = await processor.process(message)
-                await self.publisher.publish_message(outgoing_message, routing_key=routing_key)
+                confirmations = await publish_results(processor.process_many(message))
+                await self._wait_confirmations(confirmations)
             except NackMessageError as e:
-                await message.nack(requeue=e.requeue)
+                await self.consumer.nack(message, requeue=e.requeue, reason='rejected')
                 self.log.exception("Message is Nacked:")
             except JSONDecodeError:
                 self.log.exception("Message cannot be serialized, so we "
                                    "Nack it with requeue=False")
-                await message.nack(requeue=False)
+                await self.consumer.nack(message, requeue=False, reason='undecodable')
             except Exception:
-                await message.nack(requeue=self.consumer.requeue_broken_messages)
+                await self.consumer.nack(
+                    message,
+                    requeue=self.consumer.requeue_broken_messages,
+                    reason='broken',
+                )
                 self.log.exception("Message is broken:")
             else:
-                await message.ack()
+                await self.consumer.ack(message)
         self.consumer.set_callback(on_message)
 
+    async def _publish_results(
+            self,
+            results: AsyncIterator[Tuple[AbstractMessage, Optional[str]]],
+    ) -> List[asyncio.Future]:
+        """
+        Start publishing of every processor output as soon as it is produced.
+        Returns futures of publisher confirmations.
+        """
+        confirmations: List[asyncio.Future] = []
+        try:
+            async for outgoing_message, routing_key in results:
+                confirmations.append(asyncio.ensure_future(
+                    self.publisher.publish_message(outgoing_message, routing_key=routing_key),
+                ))
+        except BaseException:
+            # Processor failed in the middle. Outputs which are already sent
+            # should be finished before incoming message is nacked.
+            await asyncio.gather(*confirmations, return_exceptions=True)
+            raise
+        return confirmations
+
+    @staticmethod
+    async def _wait_confirmations(confirmations: List[asyncio.Future]) -> None:
+        results = await asyncio.gather(*confirmations, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def use_middlewares(self, middlewares: Iterable[Middleware]) -> None:
+        self.publisher.use_middlewares(middlewares)
+
     @property
     def consumer(self) -> Consumer:
         if self._consumer is None:
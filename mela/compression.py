@@ -0,0 +1,271 @@
+"""
+Compression of message bodies. Publisher compresses bodies of at least
+`min_size` bytes and names the codec in `content_encoding`, so consumers
+decompress them before decoding whatever codec the publisher uses.
+
+Small JSON messages compress poorly alone, so zstd and deflate can use
+a dictionary trained on sample messages. Dictionary is referred by hash
+of its content, and consumer which has loaded the dictionary decompresses
+messages of any publisher which uses it.
+
+Bodies of at least `EXECUTOR_SIZE` bytes are compressed and decompressed
+in worker thread, so large messages don't block event loop.
+"""
+import abc
+import gzip
+import hashlib
+import zlib
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from aio_pika.abc import AbstractMessage
+from anyio.to_thread import run_sync
+
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+
+DICTIONARY_HEADER = 'x-mela-compression-dictionary'
+
+EXECUTOR_SIZE = 256 * 1024
+
+Transform = Callable[[bytes], bytes]
+
+# Loaded dictionaries by their ids
+dictionaries: Dict[str, bytes] = {}
+
+
+def dictionary_id(dictionary: bytes) -> str:
+    return hashlib.sha256(dictionary).hexdigest()[:16]
+
+
+def register_dictionary(dictionary: bytes) -> str:
+    key = dictionary_id(dictionary)
+    dictionaries[key] = dictionary
+    return key
+
+
+def load_dictionary(path: str) -> str:
+    with open(path, 'rb') as dictionary_file:
+        return register_dictionary(dictionary_file.read())
+
+
+class Codec(abc.ABC):
+
+    encoding: str
+    supports_dictionary: bool = False
+
+    def check(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def compressor(self, level: Optional[int], dictionary: Optional[bytes]) -> Transform:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def decompressor(self, dictionary: Optional[bytes]) -> Transform:
+        raise NotImplementedError
+
+    def train(self, samples: List[bytes], size: int) -> bytes:
+        raise ValueError(f"Codec `{self.encoding}` doesn't support dictionaries")
+
+
+class GzipCodec(Codec):
+
+    encoding = 'gzip'
+
+    def compressor(self, level: Optional[int], dictionary: Optional[bytes]) -> Transform:
+        compresslevel = 6 if level is None else level
+        return lambda data: gzip.compress(data, compresslevel=compresslevel, mtime=0)
+
+    def decompressor(self, dictionary: Optional[bytes]) -> Transform:
+        return gzip.decompress
+
+
+class DeflateCodec(Codec):
+
+    """
+    Zlib stream, as `deflate` encoding of HTTP. Dictionary is a preset
+    dictionary of zlib, i.e. just a string of typical content.
+    """
+
+    encoding = 'deflate'
+    supports_dictionary = True
+
+    def compressor(self, level: Optional[int], dictionary: Optional[bytes]) -> Transform:
+        level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+        if dictionary is None:
+            return lambda data: zlib.compress(data, level)
+
+        def compress(data: bytes) -> bytes:
+            stream = zlib.compressobj(level, zdict=dictionary)
+            return stream.compress(data) + stream.flush()
+        return compress
+
+    def decompressor(self, dictionary: Optional[bytes]) -> Transform:
+        if dictionary is None:
+            return zlib.decompress
+
+        def decompress(data: bytes) -> bytes:
+            stream = zlib.decompressobj(zdict=dictionary)
+            return stream.decompress(data) + stream.flush()
+        return decompress
+
+    def train(self, samples: List[bytes], size: int) -> bytes:
+        # Zlib looks back at most 32 KiB, and the end of dictionary is the closest
+        return b''.join(samples)[-min(size, 32 * 1024):]
+
+
+class ZstdCodec(Codec):
+
+    encoding = 'zstd'
+    supports_dictionary = True
+
+    def check(self) -> None:
+        if zstandard is None:
+            raise ImportError("Codec `zstd` requires `zstandard` package")
+
+    def compressor(self, level: Optional[int], dictionary: Optional[bytes]) -> Transform:
+        self.check()
+        return zstandard.ZstdCompressor(
+            level=3 if level is None else level,
+            dict_data=None if dictionary is None else zstandard.ZstdCompressionDict(dictionary),
+        ).compress
+
+    def decompressor(self, dictionary: Optional[bytes]) -> Transform:
+        self.check()
+        return zstandard.ZstdDecompressor(
+            dict_data=None if dictionary is None else zstandard.ZstdCompressionDict(dictionary),
+        ).decompress
+
+    def train(self, samples: List[bytes], size: int) -> bytes:
+        self.check()
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+class Lz4Codec(Codec):
+
+    encoding = 'lz4'
+
+    def check(self) -> None:
+        if lz4_frame is None:
+            raise ImportError("Codec `lz4` requires `lz4` package")
+
+    def compressor(self, level: Optional[int], dictionary: Optional[bytes]) -> Transform:
+        self.check()
+        compression_level = 0 if level is None else level
+        return lambda data: lz4_frame.compress(data, compression_level=compression_level)
+
+    def decompressor(self, dictionary: Optional[bytes]) -> Transform:
+        self.check()
+        return lz4_frame.decompress
+
+
+codecs: Dict[str, Codec] = {
+    codec.encoding: codec
+    for codec in (GzipCodec(), DeflateCodec(), ZstdCodec(), Lz4Codec())
+}
+
+
+def get_codec(encoding: str) -> Codec:
+    if encoding not in codecs:
+        raise KeyError(f"Codec `{encoding}` is not supported")
+    return codecs[encoding]
+
+
+def train_dictionary(samples: List[bytes], codec: str = 'zstd', size: int = 16 * 1024) -> bytes:
+    return get_codec(codec).train(samples, size)
+
+
+class Compressor:
+
+    def __init__(
+            self,
+            codec: str = 'gzip',
+            min_size: int = 1024,
+            level: Optional[int] = None,
+            dictionary: Optional[str] = None,
+    ):
+        self.codec: Codec = get_codec(codec)
+        self.min_size: int = min_size
+        self.dictionary_id: Optional[str] = None
+        if dictionary is not None:
+            if not self.codec.supports_dictionary:
+                raise ValueError(f"Codec `{codec}` doesn't support dictionaries")
+            self.dictionary_id = load_dictionary(dictionary)
+        self._compress: Transform = self.codec.compressor(
+            level,
+            dictionaries.get(self.dictionary_id) if self.dictionary_id else None,
+        )
+
+    async def compress(self, message: AbstractMessage) -> AbstractMessage:
+        if message.content_encoding or len(message.body) < self.min_size:
+            return message
+        body = await transform(self._compress, message.body)
+        if len(body) >= len(message.body):
+            # Incompressible body is sent as it is
+            return message
+        message.body = body
+        message.body_size = len(body)
+        message.content_encoding = self.codec.encoding
+        if self.dictionary_id is not None:
+            message.headers[DICTIONARY_HEADER] = self.dictionary_id
+        return message
+
+
+async def transform(func: Transform, data: bytes) -> bytes:
+    if len(data) < EXECUTOR_SIZE:
+        return func(data)
+    return await run_sync(func, data)
+
+
+# Decompressors by encoding and dictionary id
+decompressors: Dict[Tuple[str, Optional[str]], Transform] = {}
+
+
+def is_compressed(message: AbstractMessage) -> bool:
+    return message.content_encoding in codecs
+
+
+def decompressor(encoding: str, key: Optional[str]) -> Transform:
+    if (encoding, key) not in decompressors:
+        if key is not None and key not in dictionaries:
+            raise KeyError(f"Compression dictionary `{key}` is not loaded")
+        decompressors[encoding, key] = get_codec(encoding).decompressor(
+            None if key is None else dictionaries[key],
+        )
+    return decompressors[encoding, key]
+
+
+async def decompress_body(message: AbstractMessage, body: Union[bytes, memoryview]) -> bytes:
+    """
+    Body of the message, which may be loaded from blob store, as it was
+    before compression
+    """
+    if not is_compressed(message):
+        return body  # type: ignore
+    key = message.headers.get(DICTIONARY_HEADER) if message.headers else None
+    return await transform(
+        decompressor(message.content_encoding, key),  # type: ignore
+        bytes(body),
+    )
+
+
+async def decompress(message: AbstractMessage) -> None:
+    if not is_compressed(message):
+        return
+    message.body = await decompress_body(message, message.body)
+    message.body_size = len(message.body)
+    message.content_encoding = None
@@ -0,0 +1,69 @@
+"""
+Deadline propagation. Deadline is an absolute unix timestamp stored in message
+header. It is stamped by publishers and checked by consumers before any work
+is done, so messages nobody waits for anymore are not processed.
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from datetime import timedelta
+from time import time
+from typing import Optional
+
+from aio_pika.abc import AbstractMessage
+
+
+DEADLINE_HEADER = 'x-mela-deadline'
+
+# Deadline of the message which is processed now by consumer which drops
+# expired messages. Publishers which opt in with `inherit_deadline` and RPC
+# calls stamp it into messages they send.
+current_deadline: ContextVar[Optional[float]] = ContextVar('mela_deadline', default=None)
+
+
+def get_deadline(message: AbstractMessage) -> Optional[float]:
+    if not message.headers:
+        return None
+    deadline = message.headers.get(DEADLINE_HEADER)
+    if deadline is None:
+        return None
+    return float(deadline)  # type: ignore
+
+
+def expiration_deadline(message: AbstractMessage) -> Optional[float]:
+    expiration = message.expiration
+    if expiration is None:
+        return None
+    if isinstance(expiration, datetime):
+        return expiration.timestamp()
+    if isinstance(expiration, timedelta):
+        return time() + expiration.total_seconds()
+    return time() + float(expiration)
+
+
+def stamp_deadline(
+        message: AbstractMessage,
+        deadline: Optional[float] = None,
+        inherit: bool = False,
+) -> Optional[float]:
+    """
+    Stamp the earliest of given deadline, deadline which is already stamped,
+    one derived from AMQP expiration and, if `inherit` is set, deadline of
+    currently processed message. Returns stamped deadline.
+    """
+    candidates = [
+        candidate for candidate in (
+            deadline,
+            current_deadline.get() if inherit else None,
+            get_deadline(message),
+            expiration_deadline(message),
+        ) if candidate is not None
+    ]
+    if not candidates:
+        return None
+    effective_deadline = min(candidates)
+    message.headers[DEADLINE_HEADER] = effective_deadline
+    return effective_deadline
+
+
+def remaining(deadline: float) -> float:
+    return deadline - time()
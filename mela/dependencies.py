@@ -0,0 +1,110 @@
+"""
+User resources, e.g. DB pools, HTTP sessions or ML models, which handlers
+get by annotation like publishers and RPC clients. Dependencies are registered
+on the scheme or app. Resource is created by its factory once, when the first
+component which needs it is prepared, and is shared by all the handlers.
+
+Factory is a function, coroutine function or async generator function.
+Code after `yield` of async generator is called on app shutdown.
+"""
+import asyncio
+import inspect
+from itertools import count
+from typing import Any
+from typing import AsyncGenerator
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import get_args
+from typing import get_type_hints
+
+from .abc import AbstractSchemeRequirement
+
+
+class Dependency(AbstractSchemeRequirement):
+
+    def __init__(self, type_: type, factory: Callable[[], Any]):
+        self.type_: type = type_
+        self.factory: Callable[[], Any] = factory
+        self.instance: Any = None
+        self.is_resolved: bool = False
+        # Position in order of resolution of all the dependencies
+        self.order: int = 0
+        self._generator: Optional[AsyncGenerator] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _create(self) -> Any:
+        if inspect.isasyncgenfunction(self.factory):
+            self._generator = self.factory()
+            return await self._generator.__anext__()
+        if asyncio.iscoroutinefunction(self.factory):
+            return await self.factory()
+        return self.factory()
+
+    async def resolve(self, settings: Any = None) -> Any:
+        if self.is_resolved:
+            return self.instance
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Components are prepared concurrently, but factory is called once
+            if not self.is_resolved:
+                self.instance = await self._create()
+                self.is_resolved = True
+                self.order = next(_resolutions)
+        return self.instance
+
+    def set_processor(self, processor: Optional[Callable]):
+        raise TypeError("Dependency has no processor")
+
+    async def shutdown(self) -> None:
+        generator, self._generator = self._generator, None
+        self.instance = None
+        self.is_resolved = False
+        if generator is None:
+            return
+        try:
+            await generator.__anext__()
+        except StopAsyncIteration:
+            return
+        raise RuntimeError(f"Factory of `{self.type_.__name__}` dependency yields more than once")
+
+
+_resolutions = count()
+
+
+def dependency_type(factory: Callable[[], Any]) -> type:
+    annotation = get_type_hints(factory).get('return')
+    if annotation is None:
+        raise TypeError(f"Return type of dependency factory `{factory.__name__}` is not annotated")
+    if inspect.isasyncgenfunction(factory):
+        # AsyncIterator[T] or AsyncGenerator[T, None]
+        annotation = get_args(annotation)[0]
+    return annotation
+
+
+def register_dependency(
+        dependencies: Dict[type, Dependency],
+        factory: Callable[[], Any],
+        type_: Optional[type] = None,
+) -> Dependency:
+    """
+    Add dependency to `dependencies` of a scheme by its type
+    """
+    if type_ is None:
+        type_ = dependency_type(factory)
+    if type_ in dependencies:
+        raise KeyError(f"Dependency of type `{type_.__name__}` already exists")
+    dependencies[type_] = Dependency(type_, factory)
+    return dependencies[type_]
+
+
+async def shutdown_dependencies(dependencies: Iterable[Dependency]) -> None:
+    """
+    Dependencies are shut down in reverse order of resolution, so every one
+    is shut down before ones created earlier
+    """
+    resolved = [dependency for dependency in dependencies if dependency.is_resolved]
+    for dependency in sorted(resolved, key=lambda dependency: dependency.order, reverse=True):
+        await dependency.shutdown()
@@ -1,22 +1,43 @@
 from typing import Dict
+from typing import Optional
 
 from ..components import Consumer
+from ..components.load_shedding import LoadShedder
+from ..factories.core.blob_store import claim_check
+from ..factories.core.compression import load_dictionaries
 from ..factories.core.connection import connect
 from ..factories.core.exchange import declare_exchange
 from ..factories.core.queue import declare_queue
+from ..factories.core.rate_limit import rate_limiter
+from ..profiling import SamplingProfiler
 from ..settings import AbstractConnectionParams
 from ..settings import ConsumerParams
 from ..settings import ExchangeParams
+from ..settings import LoadSheddingParams
+from ..settings import ProfilingParams
 from ..settings import QueueParams
 
 
 consumers: Dict[str, Consumer] = {}
 
 
+def load_shedder(settings: Optional[LoadSheddingParams]) -> Optional[LoadShedder]:
+    if settings is None:
+        return None
+    return LoadShedder(**settings.dict())
+
+
+def profiler(name: str, settings: Optional[ProfilingParams]) -> Optional[SamplingProfiler]:
+    if settings is None:
+        return None
+    return SamplingProfiler(name, **settings.dict())
+
+
 async def consumer(settings: ConsumerParams) -> Consumer:
     assert settings.name
     if settings.name not in consumers:
         assert isinstance(settings.connection, AbstractConnectionParams)
+        load_dictionaries(settings.compression_dictionaries)
         connection = await connect(settings.name, settings.connection, 'r')
         channel = await connection.channel()
         await channel.set_qos(prefetch_count=settings.prefetch_count)
@@ -25,7 +46,18 @@ async def consumer(settings: ConsumerParams) -> Consumer:
         assert isinstance(settings.exchange, ExchangeParams)
         exchange = await declare_exchange(settings.exchange, channel)
         await queue.bind(exchange, routing_key=settings.routing_key)
-        instance = Consumer(**settings.get_params_dict(), queue=queue)
+        instance = Consumer(
+            **settings.get_params_dict(),
+            queue=queue,
+            channel=channel,
+            rate_limiter=rate_limiter(settings.rate_limit),
+            load_shedder=load_shedder(settings.load_shedding),
+            profiler=profiler(settings.name, settings.profiling),
+            claim_check=claim_check(
+                settings.claim_check,
+                keep_rejected=settings.queue.dead_letter_exchange is not None,
+            ),
+        )
         consumers[settings.name] = instance
     return consumers[settings.name]
 
@@ -33,6 +65,7 @@ async def consumer(settings: ConsumerParams) -> Consumer:
 async def anonymous_consumer(settings: ConsumerParams) -> Consumer:
     assert isinstance(settings.connection, AbstractConnectionParams)
     assert settings.name
+    load_dictionaries(settings.compression_dictionaries)
     connection = await connect(settings.name, settings.connection, 'r')
     channel = await connection.channel()
     await channel.set_qos(prefetch_count=settings.prefetch_count)
@@ -41,5 +74,13 @@ async def anonymous_consumer(settings: ConsumerParams) -> Consumer:
     assert isinstance(settings.exchange, ExchangeParams)
     exchange = await declare_exchange(settings.exchange, channel)
     await queue.bind(exchange, routing_key=queue.name)
-    instance = Consumer(**settings.get_params_dict(), queue=queue)
+    instance = Consumer(
+        **settings.get_params_dict(),
+        queue=queue,
+        channel=channel,
+        rate_limiter=rate_limiter(settings.rate_limit),
+        load_shedder=load_shedder(settings.load_shedding),
+        profiler=profiler(settings.name, settings.profiling),
+        claim_check=claim_check(settings.claim_check),
+    )
     return instance
@@ -0,0 +1,35 @@
+from typing import Dict
+from typing import Optional
+
+from ...claim_check import BlobStore
+from ...claim_check import ClaimCheck
+from ...claim_check import FileBlobStore
+from ...settings import BlobStoreParams
+from ...settings import ClaimCheckParams
+
+
+blob_stores: Dict[str, BlobStore] = {}
+
+
+def blob_store(settings: BlobStoreParams) -> BlobStore:
+    if settings.name is None:
+        return FileBlobStore(settings.path)
+    if settings.name not in blob_stores:
+        blob_stores[settings.name] = FileBlobStore(settings.path)
+    return blob_stores[settings.name]
+
+
+def claim_check(
+        settings: Optional[ClaimCheckParams],
+        keep_rejected: bool = False,
+) -> Optional[ClaimCheck]:
+    if settings is None:
+        return None
+    assert isinstance(settings.store, BlobStoreParams)
+    return ClaimCheck(
+        blob_store(settings.store),
+        settings.threshold,
+        settings.lazy,
+        settings.delete_acked,
+        keep_rejected,
+    )
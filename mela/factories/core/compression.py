@@ -0,0 +1,17 @@
+from typing import Iterable
+from typing import Optional
+
+from ...compression import Compressor
+from ...compression import load_dictionary
+from ...settings import CompressionParams
+
+
+def compressor(settings: Optional[CompressionParams]) -> Optional[Compressor]:
+    if settings is None:
+        return None
+    return Compressor(**settings.dict())
+
+
+def load_dictionaries(paths: Iterable[str]) -> None:
+    for path in paths:
+        load_dictionary(path)
@@ -2,10 +2,11 @@ from typing import Dict
 from typing import Literal
 from typing import Union
 
-from aio_pika import connect_robust
 from aio_pika.abc import AbstractConnection
 
+from ...metrics import connection_reconnects
 from ...settings import AbstractConnectionParams
+from ...transport import connect as connect_transport
 
 
 connections: Dict[str, AbstractConnection] = {}
@@ -22,6 +23,17 @@ async def close_all_connections():
         await connection.close()
 
 
+async def close_connections(component_name: str) -> None:
+    """
+    Close connections of the component. It should be done in event loop
+    which the connections belong to.
+    """
+    for mode in ('r', 'w'):
+        connection = connections.pop(component_name + '_' + mode, None)
+        if connection is not None:
+            await connection.close()
+
+
 async def connect(
     component_name: str,
     connection_settings: Union[AbstractConnectionParams],
@@ -32,6 +44,8 @@ async def connect(
     full_connection_name = component_name + '_' + mode
     if full_connection_name not in connections:
         params = connection_settings.get_params_dict()
-        connection = await connect_robust(**params)
+        connection = await connect_transport(**params)
+        reconnects = connection_reconnects.labels(full_connection_name)
+        connection.reconnect_callbacks.add(lambda _: reconnects.inc())
         connections[full_connection_name] = connection
     return connections[full_connection_name]
@@ -0,0 +1,20 @@
+from typing import Dict
+from typing import Optional
+
+from ...components.rate_limit import RateLimiter
+from ...settings import RateLimitParams
+
+
+rate_limiters: Dict[str, RateLimiter] = {}
+
+
+def rate_limiter(settings: Optional[RateLimitParams]) -> Optional[RateLimiter]:
+    if settings is None:
+        return None
+    assert isinstance(settings, RateLimitParams)
+    if settings.name is None:
+        # Inline rate limit belongs to a single component
+        return RateLimiter(settings.rate, settings.burst)
+    if settings.name not in rate_limiters:
+        rate_limiters[settings.name] = RateLimiter(settings.rate, settings.burst)
+    return rate_limiters[settings.name]
@@ -1,11 +1,17 @@
 from typing import Dict
+from typing import Optional
 
 from ..components import Publisher
+from ..factories.core.blob_store import claim_check
+from ..factories.core.compression import compressor
 from ..factories.core.connection import connect
 from ..factories.core.exchange import declare_exchange
 from ..factories.core.queue import declare_queue
+from ..factories.core.rate_limit import rate_limiter
+from ..outbox import Outbox
 from ..settings import AbstractConnectionParams
 from ..settings import ExchangeParams
+from ..settings import OutboxParams
 from ..settings import PublisherParams
 from ..settings import QueueParams
 
@@ -13,12 +19,26 @@ from ..settings import QueueParams
 publishers: Dict[str, Publisher] = {}
 
 
+async def close_all_publishers() -> None:
+    while publishers:
+        _, instance = publishers.popitem()
+        await instance.close()
+
+
+def outbox(name: str, settings: Optional[OutboxParams]) -> Optional[Outbox]:
+    if settings is None:
+        return None
+    return Outbox(name, **settings.dict())
+
+
 async def publisher(settings: PublisherParams) -> Publisher:
     assert settings.name
     if settings.name not in publishers:
         assert isinstance(settings.connection, AbstractConnectionParams)
         connection = await connect(settings.name, settings.connection, 'w')
-        channel = await connection.channel(publisher_confirms=(not settings.skip_unroutables))
+        # Unroutable messages are raised as errors, unless they are skipped
+        confirms = not settings.skip_unroutables
+        channel = await connection.channel(publisher_confirms=confirms, on_return_raises=confirms)
         assert isinstance(settings.exchange, ExchangeParams)
         exchange = await declare_exchange(settings.exchange, channel)
         if settings.queue:
@@ -30,6 +50,12 @@ async def publisher(settings: PublisherParams) -> Publisher:
             **settings.get_params_dict(),
             exchange=exchange,
             channel=channel,
+            rate_limiter=rate_limiter(settings.rate_limit),
+            claim_check=claim_check(settings.claim_check),
+            compressor=compressor(settings.compression),
+            outbox=outbox(settings.name, settings.outbox),
         )
+        # Messages left in outbox by previous run
+        instance.drain_outbox()
         publishers[settings.name] = instance
     return publishers[settings.name]
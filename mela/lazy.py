@@ -0,0 +1,34 @@
+"""
+Package attributes which are imported on first access (PEP 562), so
+importing a package doesn't import all of its submodules.
+"""
+from importlib import import_module
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+
+def lazy_attributes(
+        package: str,
+        namespace: Dict[str, Any],
+        attributes: Dict[str, str],
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    `attributes` maps attribute names to modules, relative to `package`,
+    which define them. Returns `__getattr__` and `__dir__` of the package.
+    """
+
+    def __getattr__(name: str) -> Any:
+        if name not in attributes:
+            raise AttributeError(f"module `{package}` has no attribute `{name}`")
+        value = getattr(import_module(attributes[name], package), name)
+        # Next access doesn't get here
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(attributes))
+
+    return __getattr__, __dir__
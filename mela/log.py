@@ -1,5 +1,18 @@
+import json
 import logging
 import sys
+from datetime import datetime
+from datetime import timezone
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from queue import SimpleQueue
+from threading import Lock
+from time import monotonic
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 
 root = logging.getLogger()
@@ -10,3 +23,143 @@ handler.setLevel(logging.DEBUG)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 root.addHandler(handler)
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        suppressed = getattr(record, 'suppressed', None)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        return json.dumps(entry, default=str)
+
+
+class ExceptionRateFilter(logging.Filter):
+
+    """
+    Token bucket for records with exception info: every logger and message
+    pair may pass `rate` of them per second with bursts up to `burst`.
+    Number of suppressed records is attached to the next passed one.
+    """
+
+    def __init__(self, rate: float, burst: int = 10):
+        super().__init__()
+        self.rate: float = rate
+        self.burst: int = burst
+        self._buckets: Dict[Tuple[str, Any], Tuple[float, float]] = {}
+        self._suppressed: Dict[Tuple[str, Any], int] = {}
+        # Records come from loop thread and from threads of sync handlers
+        self._lock: Lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not record.exc_info:
+            return True
+        key = (record.name, record.msg)
+        now = monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} ({suppressed} similar records suppressed)"
+        return True
+
+
+class LocalQueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Queue is in-process, so formatting of traceback and the record itself
+        # is left to listener thread. Only message is rendered now,
+        # because arguments can be changed later.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+_handlers: List[logging.Handler] = []
+# Formatters replaced and filters added by `configure_logging`
+_formatters: Dict[logging.Handler, Optional[logging.Formatter]] = {}
+_filters: List[Tuple[logging.Handler, logging.Filter]] = []
+
+
+def configure_logging(
+        queue: bool = True,
+        json_format: bool = False,
+        exception_rate: Optional[float] = None,
+        exception_burst: int = 10,
+) -> None:
+    """
+    Move handlers of root logger behind in-process queue, so records are
+    formatted and written by background thread instead of event loop.
+    Previous configuration is undone first.
+    """
+    global _listener
+    reset_logging()
+    handlers = list(root.handlers)
+    if json_format:
+        for handler_ in handlers:
+            _formatters[handler_] = handler_.formatter
+            handler_.setFormatter(JsonFormatter())
+    front: List[logging.Handler] = handlers
+    if queue:
+        log_queue: SimpleQueue = SimpleQueue()
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        _handlers[:] = handlers
+        front = [LocalQueueHandler(log_queue)]
+        _replace_root_handlers(front)
+    if exception_rate is not None:
+        for handler_ in front:
+            # Suppressed records are not even put to the queue
+            filter_ = ExceptionRateFilter(exception_rate, exception_burst)
+            handler_.addFilter(filter_)
+            _filters.append((handler_, filter_))
+
+
+def stop_logging() -> None:
+    """
+    Write records left in the queue and return handlers to root logger
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    _replace_root_handlers(_handlers)
+    _handlers.clear()
+
+
+def reset_logging() -> None:
+    """
+    Undo `configure_logging`: stop the queue, remove rate filters and return
+    formatters of handlers
+    """
+    stop_logging()
+    for handler_, filter_ in _filters:
+        handler_.removeFilter(filter_)
+    _filters.clear()
+    for handler_, formatter_ in _formatters.items():
+        handler_.setFormatter(formatter_)
+    _formatters.clear()
+
+
+def _replace_root_handlers(handlers: List[logging.Handler]) -> None:
+    for handler_ in list(root.handlers):
+        root.removeHandler(handler_)
+    for handler_ in list(handlers):
+        root.addHandler(handler_)
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Dict
+from typing import Optional
+
+
+class LoopLagMonitor:
+
+    """
+    Measures event loop lag: how late the loop wakes up a task which sleeps
+    for `interval` seconds. Lag grows when callbacks are waiting for the loop
+    because of CPU bound or blocking code. `beat` is loop time of the last
+    wake up, so other threads can see the loop is blocked right now.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval: float = interval
+        self.lag: float = 0.0
+        self.beat: float = 0.0
+        self._users: int = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._users += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._measure())
+
+    def stop(self) -> None:
+        self._users -= 1
+        if self._users <= 0 and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._users = 0
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.beat = loop.time()
+        while True:
+            expected = self.beat + self.interval
+            await asyncio.sleep(self.interval)
+            self.beat = loop.time()
+            self.lag = max(0.0, self.beat - expected)
+
+
+monitors: Dict[asyncio.AbstractEventLoop, LoopLagMonitor] = {}
+
+
+def loop_lag_monitor(loop: Optional[asyncio.AbstractEventLoop] = None) -> LoopLagMonitor:
+    """
+    Single monitor is shared by every component running in the loop
+    """
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    if loop not in monitors:
+        monitors[loop] = LoopLagMonitor()
+    return monitors[loop]
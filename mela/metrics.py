@@ -0,0 +1,394 @@
+"""
+Low overhead metrics of Mela components. Metric values are plain numbers
+updated in event loop thread, so instrumentation costs an attribute update.
+Registry can be rendered in Prometheus text exposition format and served by
+`MetricsServer`. Consumers count received messages and time handlers only
+if the registry is enabled, otherwise their hot path has no instrumentation.
+"""
+import asyncio
+from bisect import bisect_left
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+NACK_REASONS = ('rejected', 'undecodable', 'broken', 'expired', 'shed')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class CounterValue:
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value: float = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeValue:
+
+    __slots__ = ('value', '_function')
+
+    def __init__(self):
+        self.value: float = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Value will be calculated by `function` when it is collected
+        """
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self.value
+
+
+class HistogramValue:
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets: Sequence[float] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+
+    type_: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        assert len(values) == len(self.labelnames), f"Metric `{self.name}` labels mismatch"
+        if values not in self._values:
+            self._values[values] = self._new_value()
+        return self._values[values]
+
+    def remove(self, *values: str) -> None:
+        self._values.pop(values, None)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_}',
+        ]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+
+    type_ = 'counter'
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def _samples(self) -> Iterator[str]:
+        for labelvalues, value in list(self._values.items()):
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f'{self.name}{labels} {_format_value(value.value)}'  # type: ignore
+
+
+class Gauge(Metric):
+
+    type_ = 'gauge'
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def _samples(self) -> Iterator[str]:
+        for labelvalues, value in list(self._values.items()):
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f'{self.name}{labels} {_format_value(value.get())}'  # type: ignore
+
+
+class Histogram(Metric):
+
+    type_ = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def _samples(self) -> Iterator[str]:
+        for labelvalues, value in list(self._values.items()):
+            cumulative = 0
+            bounds = self.buckets + (float('inf'),)
+            for bound, count in zip(bounds, value.counts):  # type: ignore
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames,
+                    labelvalues,
+                    f'le="{_format_value(bound)}"',
+                )
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f'{self.name}_sum{labels} {_format_value(value.sum)}'  # type: ignore
+            yield f'{self.name}_count{labels} {value.count}'  # type: ignore
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        # Consumers which start after it is set are instrumented
+        self.enabled: bool = False
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise KeyError(f"Metric `{metric.name}` is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore
+
+    def get(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+registry = Registry()
+
+messages_received = registry.counter(
+    'mela_messages_received_total',
+    "Messages delivered to consumer",
+    ('component',),
+)
+messages_acked = registry.counter(
+    'mela_messages_acked_total',
+    "Messages acked by consumer",
+    ('component',),
+)
+messages_nacked = registry.counter(
+    'mela_messages_nacked_total',
+    "Messages nacked by consumer",
+    ('component', 'reason'),
+)
+messages_in_flight = registry.gauge(
+    'mela_messages_in_flight',
+    "Messages delivered to consumer and not acked or nacked yet",
+    ('component',),
+)
+handler_duration = registry.histogram(
+    'mela_handler_duration_seconds',
+    "Time spent in message processor",
+    ('component',),
+)
+messages_published = registry.counter(
+    'mela_messages_published_total',
+    "Messages published by publisher",
+    ('component',),
+)
+publish_failures = registry.counter(
+    'mela_publish_failures_total',
+    "Messages which publishing failed",
+    ('component',),
+)
+publishes_in_flight = registry.gauge(
+    'mela_publishes_in_flight',
+    "Messages which are being published and not confirmed yet",
+    ('component',),
+)
+publish_duration = registry.histogram(
+    'mela_publish_confirm_duration_seconds',
+    "Time between publishing and broker confirmation",
+    ('component',),
+)
+outbox_depth = registry.gauge(
+    'mela_outbox_depth',
+    "Messages which wait in local outbox until broker is reachable",
+    ('component',),
+)
+outbox_age = registry.gauge(
+    'mela_outbox_age_seconds',
+    "How long the oldest message waits in local outbox",
+    ('component',),
+)
+rpc_pending_calls = registry.gauge(
+    'mela_rpc_pending_calls',
+    "RPC calls which are waiting for response",
+    ('component',),
+)
+connection_reconnects = registry.counter(
+    'mela_connection_reconnects_total',
+    "Reconnects of robust connection",
+    ('connection',),
+)
+node_exclusions = registry.counter(
+    'mela_node_exclusions_total',
+    "Exclusions of failed broker nodes of cluster connections",
+    ('node',),
+)
+event_loop_lag = registry.gauge(
+    'mela_event_loop_lag_seconds',
+    "How late event loop wakes up sleeping task",
+)
+event_loop_blocks = registry.counter(
+    'mela_event_loop_blocks_total',
+    "Event loop blocks longer than watchdog threshold",
+    ('handler',),
+)
+event_loop_block_duration = registry.histogram(
+    'mela_event_loop_block_duration_seconds',
+    "Duration of event loop blocks caught by watchdog",
+)
+
+
+class ConsumerMetrics:
+
+    def __init__(self, component: str):
+        self.received: CounterValue = messages_received.labels(component)
+        self.acked: CounterValue = messages_acked.labels(component)
+        self._nacked: Dict[str, CounterValue] = {
+            reason: messages_nacked.labels(component, reason) for reason in NACK_REASONS
+        }
+        self.handler_duration: HistogramValue = handler_duration.labels(component)
+        messages_in_flight.labels(component).set_function(self.in_flight)
+
+    def nacked(self, reason: str) -> CounterValue:
+        return self._nacked[reason]
+
+    def in_flight(self) -> float:
+        return (
+            self.received.value
+            - self.acked.value
+            - sum(counter.value for counter in self._nacked.values())
+        )
+
+
+class PublisherMetrics:
+
+    def __init__(self, component: str):
+        self.published: CounterValue = messages_published.labels(component)
+        self.failures: CounterValue = publish_failures.labels(component)
+        self.in_flight: GaugeValue = publishes_in_flight.labels(component)
+        self.duration: HistogramValue = publish_duration.labels(component)
+
+
+class MetricsServer:
+
+    """
+    Minimal HTTP server which serves the registry in Prometheus text format
+    at `/metrics`. It is based on asyncio streams, so no dependencies needed.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9090, registry_: Registry = registry):
+        self.host: str = host
+        self.port: int = port
+        self.registry: Registry = registry_
+        self.routes: Dict[str, Callable[[], str]] = {'/metrics': self.registry.render}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self.registry.enabled = True
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            # Headers are not used, but they should be read out
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) > 1 else ''
+            if path in self.routes:
+                status, body = '200 OK', self.routes[path]().encode()
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: {self.content_type}\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                'Connection: close\r\n\r\n'.encode() + body,
+            )
+            await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,69 @@
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.abc import AbstractMessage
+from aiormq.abc import ConfirmationFrameType
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+Publish = Callable[[AbstractMessage, Optional[str]], Awaitable[Optional[ConfirmationFrameType]]]
+
+
+class Middleware:
+
+    """
+    Base class of message handling middlewares. Override only hooks you need.
+    Hooks which are not overridden are not called at all, and components
+    without middlewares have no extra calls on the hot path.
+    """
+
+    async def before_decode(self, message: AbstractIncomingMessage) -> None:
+        """
+        Called before message body is parsed. Raise `NackMessageError`
+        to reject the message.
+        """
+
+    async def after_decode(
+            self,
+            message: AbstractIncomingMessage,
+            params: Dict[str, Any],
+    ) -> None:
+        """
+        Called with parsed handler params. Params can be changed in place.
+        """
+
+    async def around_handler(self, call_next: Handler, params: Dict[str, Any]) -> Any:
+        return await call_next(params)
+
+    async def around_publish(
+            self,
+            call_next: Publish,
+            message: AbstractMessage,
+            routing_key: Optional[str],
+    ) -> Optional[ConfirmationFrameType]:
+        return await call_next(message, routing_key)
+
+
+def overridden_hooks(middlewares: Iterable[Middleware], hook: str) -> List[Callable]:
+    return [
+        getattr(middleware, hook) for middleware in middlewares
+        if getattr(type(middleware), hook) is not getattr(Middleware, hook)
+    ]
+
+
+def merge_middlewares(*groups: Iterable[Middleware]) -> List[Middleware]:
+    """
+    Concatenate middlewares keeping the first occurrence of each one
+    """
+    merged: List[Middleware] = []
+    for group in groups:
+        for middleware in group:
+            if middleware not in merged:
+                merged.append(middleware)
+    return merged
@@ -0,0 +1,146 @@
+"""
+Local outbox of publisher. While broker is unreachable, published messages
+are appended to SQLite file and acknowledged locally. They are drained in
+batches with publisher confirms when channel is open again, so a message
+is deleted from outbox only when broker has taken it.
+"""
+import pickle  # noqa: S403
+import sqlite3
+import threading
+from time import time
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from aio_pika import Message
+from aio_pika.abc import AbstractMessage
+from anyio.to_thread import run_sync
+
+from .metrics import outbox_age
+from .metrics import outbox_depth
+
+
+MESSAGE_PROPERTIES = (
+    'headers', 'content_type', 'content_encoding', 'delivery_mode', 'priority',
+    'correlation_id', 'reply_to', 'expiration', 'message_id', 'timestamp', 'type',
+    'user_id', 'app_id',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    publisher TEXT NOT NULL,
+    created REAL NOT NULL,
+    routing_key TEXT NOT NULL,
+    body BLOB NOT NULL,
+    properties BLOB NOT NULL
+)
+"""
+
+Entry = Tuple[int, str, Message]
+
+
+def dump_properties(message: AbstractMessage) -> bytes:
+    return pickle.dumps({name: getattr(message, name) for name in MESSAGE_PROPERTIES})
+
+
+def load_properties(data: bytes) -> dict:
+    # Outbox file is written only by the application itself
+    return pickle.loads(data)  # noqa: S301
+
+
+class Outbox:
+
+    """
+    Several publishers can share the file, every one drains its own
+    messages in order they were appended.
+    """
+
+    def __init__(self, publisher: str, path: str, batch_size: int = 100, interval: float = 1.0):
+        self.publisher: str = publisher
+        self.path: str = path
+        self.batch_size: int = batch_size
+        self.interval: float = interval
+        self.depth: int = 0
+        self._oldest: Optional[float] = None
+        # Statements are executed in worker threads one at a time
+        self._lock: threading.Lock = threading.Lock()
+        self._db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(SCHEMA)
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbox_publisher ON outbox (publisher, id)')
+        self._db.commit()
+        self._load_state()
+        outbox_depth.labels(publisher).set_function(lambda: self.depth)
+        outbox_age.labels(publisher).set_function(self.age)
+
+    def age(self) -> float:
+        """
+        Seconds since the oldest message waits in outbox
+        """
+        return 0.0 if self._oldest is None else max(0.0, time() - self._oldest)
+
+    def _load_state(self) -> None:
+        with self._lock:
+            self._count()
+
+    def _append(self, created: float, routing_key: str, body: bytes, properties: bytes) -> None:
+        # State is changed under the same lock as the file, so it matches the file
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT INTO outbox (publisher, created, routing_key, body, properties) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.publisher, created, routing_key, body, properties),
+            )
+            self.depth += 1
+            if self._oldest is None:
+                self._oldest = created
+
+    async def put(self, message: AbstractMessage, routing_key: str) -> None:
+        await run_sync(
+            self._append,
+            time(),
+            routing_key,
+            bytes(message.body),
+            dump_properties(message),
+        )
+
+    def _count(self) -> None:
+        self.depth, self._oldest = self._db.execute(
+            'SELECT COUNT(*), MIN(created) FROM outbox WHERE publisher = ?',
+            (self.publisher,),
+        ).fetchone()
+
+    def _select(self) -> List[Tuple[int, str, bytes, bytes]]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, routing_key, body, properties FROM outbox '
+                'WHERE publisher = ? ORDER BY id LIMIT ?',
+                (self.publisher, self.batch_size),
+            ).fetchall()
+            if not rows:
+                # Messages are removed by someone else, like previous run with the same file
+                self._count()
+            return rows
+
+    async def read(self) -> List[Entry]:
+        rows = await run_sync(self._select)
+        return [
+            (id_, routing_key, Message(body, **load_properties(properties)))
+            for id_, routing_key, body, properties in rows
+        ]
+
+    def _delete(self, ids: List[int]) -> None:
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM outbox WHERE id = ?', [(id_,) for id_ in ids])
+            self._count()
+
+    async def remove(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        await run_sync(self._delete, ids)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
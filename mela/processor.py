@@ -1,13 +1,17 @@
 import asyncio
+import cProfile
 import inspect
 import json
 from functools import partial
 from logging import Logger
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
 from typing import Callable
 from typing import Dict
 from typing import ForwardRef
 from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import Type
@@ -26,6 +30,15 @@ from pydantic.typing import evaluate_forwardref
 from .abc import AbstractPublisher
 from .abc import AbstractRPCClient
 from .abc import AbstractSchemeRequirement
+from .middleware import Middleware
+from .middleware import merge_middlewares
+from .middleware import overridden_hooks
+from .profiling import SamplingProfiler
+from .profiling import current_profile
+from .watchdog import register_handler
+
+
+_exhausted = object()
 
 
 class Processor:
@@ -40,8 +53,17 @@ class Processor:
             call: Callable,
             input_class: Optional[Type[BaseModel]] = None,
             validate_args: bool = False,
+            middlewares: Optional[List[Middleware]] = None,
+            dependencies: Iterable[type] = (),
     ):
+        """
+        `dependencies` are types of resources registered so far, params
+        annotated with them are not parsed from message
+        """
         self._call = call
+        register_handler(call)
+        self._is_async_generator = inspect.isasyncgenfunction(call)
+        self._is_generator = inspect.isgeneratorfunction(call)
         if validate_args:
             self._call = validate_arguments(
                 config={
@@ -51,16 +73,21 @@ class Processor:
         if not self._is_coroutine():
             self.__process = self.__process_sync  # type: ignore
         self._input_class = input_class
+        self._given_input_class = input_class
         self._signature = self._get_typed_signature()
         self._params = self._get_typed_parameters()
         self._static_params: Iterable[inspect.Parameter] = []
         self._dynamic_params: Iterable[inspect.Parameter] = []
-        self._split_static_and_dynamic_params()
+        self._split_static_and_dynamic_params(dependencies)
         self._cached_static_params: Dict[str, Any] = {}
         if self._input_class is None:
             self._get_data_class()
         self._select_solver()
         self._have_static_params = False
+        self._middlewares: List[Middleware] = list(middlewares or [])
+        self._profiler: Optional[SamplingProfiler] = None
+        # Decoder and handler call without profiling, while profiler is used
+        self._unprofiled: Optional[Tuple[Callable, Callable]] = None
 
     async def __process(self, *args, **kwargs):
         return await self._call(*args, **kwargs)
@@ -70,8 +97,14 @@ class Processor:
         return await run_sync(func, *args)
 
     def cache_static_params(self, component, scheme):
+        # Dependencies can be registered after the handler
+        dependencies = scheme.dependencies
+        self._split_static_and_dynamic_params(dependencies)
+        self._reselect_solver()
         for param in self._static_params:  # type: inspect.Parameter
-            if param.annotation is Logger:
+            if param.annotation in dependencies:
+                self._cached_static_params[param.name] = dependencies[param.annotation]
+            elif param.annotation is Logger:
                 self._cached_static_params[param.name] = component.log
             elif issubclass(param.annotation, AbstractPublisher):
                 self._cached_static_params[param.name] = scheme.publisher(param.default)
@@ -80,6 +113,20 @@ class Processor:
             else:
                 raise TypeError("Static param cannot be solved")
 
+    def static_requirements(self, dependencies: Iterable[type] = ()) -> List[Tuple[str, str]]:
+        """
+        Types and names of publishers and RPC clients injected to params of handler
+        """
+        required = []
+        for param in self._static_params:  # type: inspect.Parameter
+            if param.annotation in dependencies or not isinstance(param.default, str):
+                continue
+            if issubclass(param.annotation, AbstractPublisher):
+                required.append(('publisher', param.default))
+            elif issubclass(param.annotation, AbstractRPCClient):
+                required.append(('rpc_client', param.default))
+        return required
+
     async def solve_requirements(self, settings):
         updated_values = {}
         for param_name, requirement in self._cached_static_params.items():
@@ -99,9 +146,12 @@ class Processor:
             all_subclasses.extend(klass.__subclasses__())
         return self.static_param_classes + all_subclasses
 
-    def _split_static_and_dynamic_params(self):
+    def _split_static_and_dynamic_params(self, dependencies: Iterable[type] = ()):
+        self._static_params = []
+        self._dynamic_params = []
+        static_param_classes = self._static_param_classes_with_subclasses()
         for param in self._params:  # type: inspect.Parameter
-            if param.annotation in self._static_param_classes_with_subclasses():
+            if param.annotation in static_param_classes or param.annotation in dependencies:
                 self._static_params.append(param)
                 self._have_static_params = True
             else:
@@ -120,12 +170,190 @@ class Processor:
         elif isinstance(result, dict):
             return Message(json.dumps(result).encode()), routing_key
 
+    @classmethod
+    def wrap_output(
+            cls,
+            output: Union[Dict, BaseModel, Message, Tuple[Any, str]],
+    ) -> Tuple[Message, Optional[str]]:
+        """
+        Wrap single output of fan-out processor. Output can be provided
+        with its own routing key as `(result, routing_key)` tuple.
+        """
+        if isinstance(output, tuple):
+            result, routing_key = output
+            return cls.wrap_response(result, routing_key)
+        return cls.wrap_response(output)
+
     async def process(self, message: AbstractIncomingMessage) -> Tuple[Message, Optional[str]]:
         solved_params = self._solve_dependencies(message)
         result = await self(**solved_params)
         wrapped_result = self.wrap_response(result)
         return wrapped_result
 
+    async def process_many(
+            self,
+            message: AbstractIncomingMessage,
+    ) -> AsyncIterator[Tuple[Message, Optional[str]]]:
+        """
+        Same as `process`, but yields every output of generator (sync or async)
+        or list returning processor as soon as it is produced.
+        """
+        solved_params = self._solve_dependencies(message)
+        result = await self._call_handler(solved_params)
+        async for output in self._iterate_outputs(result):
+            yield output
+
+    async def _call_handler(self, params: Dict[str, Any]) -> Any:
+        if self._is_async_generator or self._is_generator:
+            # Generator object is iterated by `_iterate_outputs`
+            return self._call(**params)
+        return await self(**params)
+
+    async def _iterate_outputs(self, result: Any) -> AsyncIterator[Tuple[Message, Optional[str]]]:
+        if self._is_async_generator:
+            async for output in result:
+                yield self.wrap_output(output)
+        elif self._is_generator:
+            async for output in self._iterate_in_thread(result):
+                yield self.wrap_output(output)
+        elif isinstance(result, list):
+            for output in result:
+                yield self.wrap_output(output)
+        else:
+            yield self.wrap_response(result)
+
+    def use_middlewares(self, scheme_middlewares: Iterable[Middleware] = ()) -> None:
+        """
+        Compile middleware chain: scheme middlewares go first, then ones of
+        the processor itself. Without middlewares `process` and `process_many`
+        are left untouched.
+        """
+        middlewares = merge_middlewares(scheme_middlewares, self._middlewares)
+        before_decode = overridden_hooks(middlewares, 'before_decode')
+        after_decode = overridden_hooks(middlewares, 'after_decode')
+        around_handler = overridden_hooks(middlewares, 'around_handler')
+        if not (before_decode or after_decode or around_handler):
+            self.__dict__.pop('process', None)
+            self.__dict__.pop('process_many', None)
+            return
+
+        decode = self._compile_decoder(before_decode, after_decode)
+        handler = self._call_handler
+        for hook in reversed(around_handler):
+            handler = partial(hook, handler)
+
+        async def process(message: AbstractIncomingMessage) -> Tuple[Message, Optional[str]]:
+            result = await handler(await decode(message))
+            return self.wrap_response(result)
+
+        async def process_many(
+                message: AbstractIncomingMessage,
+        ) -> AsyncIterator[Tuple[Message, Optional[str]]]:
+            result = await handler(await decode(message))
+            async for output in self._iterate_outputs(result):
+                yield output
+
+        self.process = process  # type: ignore
+        self.process_many = process_many  # type: ignore
+
+    def _compile_decoder(
+            self,
+            before_decode: List[Callable],
+            after_decode: List[Callable],
+    ) -> Callable[[AbstractIncomingMessage], Awaitable[Dict[str, Any]]]:
+
+        async def decode(message: AbstractIncomingMessage) -> Dict[str, Any]:
+            for hook in before_decode:
+                await hook(message)
+            params = self._solve_dependencies(message)
+            for hook in after_decode:
+                await hook(message, params)
+            return params
+        return decode
+
+    def use_profiler(self, profiler: Optional[SamplingProfiler]) -> None:
+        """
+        Profile sampled invocations: decoding of the message and handler call.
+        Both of them are looked up on instance, so not sampled invocations
+        have only the sampling check as overhead. Profile of async handler
+        also catches other tasks which run while the handler awaits.
+
+        Restarted component brings its own profiler or none, so profiler
+        which is used already is replaced or removed.
+        """
+        self._remove_profiler()
+        if profiler is not None:
+            self._install_profiler(profiler)
+
+    def _install_profiler(self, profiler: SamplingProfiler) -> None:
+        self._profiler = profiler
+        decode = self._solve_dependencies
+        call_handler = self.__process
+        self._unprofiled = (decode, call_handler)
+
+        def sampled_decode(message: AbstractIncomingMessage) -> Dict[str, Any]:
+            profile = profiler.sample()
+            if profile is None:
+                return decode(message)
+            # Consumer releases the profile, if decoding fails
+            current_profile.set(profile)
+            solved = profiler.runcall(profile, decode, message)
+            if self._is_async_generator or self._is_generator:
+                # Generator handlers are iterated outside the processor
+                current_profile.set(None)
+                profiler.collect(profile)
+            return solved
+
+        async def sampled_call_handler(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await call_handler(*args, **kwargs)
+            current_profile.set(None)
+            try:
+                return await self._call_profiled(profiler, profile, call_handler, *args, **kwargs)
+            finally:
+                profiler.collect(profile)
+
+        self._solve_dependencies = sampled_decode  # type: ignore
+        self.__process = sampled_call_handler  # type: ignore
+
+    def _reselect_solver(self) -> None:
+        # Data class and solver are chosen from params which are still parsed from message
+        profiler = self._profiler
+        self._remove_profiler()
+        self._input_class = self._given_input_class
+        if self._input_class is None:
+            self._get_data_class()
+        self._select_solver()
+        self.use_profiler(profiler)
+
+    def _remove_profiler(self) -> None:
+        if self._unprofiled is not None:
+            self._solve_dependencies, self.__process = self._unprofiled  # type: ignore
+            self._unprofiled = None
+        self._profiler = None
+
+    async def _call_profiled(
+            self,
+            profiler: SamplingProfiler,
+            profile: cProfile.Profile,
+            call_handler,
+            *args,
+            **kwargs,
+    ):
+        if not self._is_coroutine():
+            # Profile is enabled in worker thread which runs sync handler
+            return await run_sync(partial(profiler.runcall, profile, self._call, *args, **kwargs))
+        return await profiler.call(profile, call_handler, *args, **kwargs)
+
+    @staticmethod
+    async def _iterate_in_thread(iterator: Iterable) -> AsyncIterator[Any]:
+        # Sync generator body may block, so each step is done in worker thread
+        output = await run_sync(next, iterator, _exhausted)
+        while output is not _exhausted:
+            yield output
+            output = await run_sync(next, iterator, _exhausted)
+
     @staticmethod
     def _get_typed_annotation(param: inspect.Parameter, globalns: Dict[str, Any]) -> Any:
         annotation = param.annotation
@@ -173,7 +401,7 @@ class Processor:
     def _get_data_class(self):
         message_class_candidate = None
         if self._input_class is None:
-            for param in self._params:
+            for param in self._dynamic_params:
                 if issubclass(param.annotation, BaseModel):
                     if message_class_candidate is None:
                         message_class_candidate = param.annotation
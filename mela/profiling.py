@@ -0,0 +1,194 @@
+"""
+Sampling profiler of message processors. Only sampled invocations of
+a processor are profiled with cProfile, stats are aggregated and can be
+dumped to file on signal, periodically or rendered by metrics server.
+
+Profile of async handler stays enabled while the handler awaits, and only one
+profiler can be active in the process, so one invocation is profiled at a time.
+Invocations which happen meanwhile are not sampled.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import tracemalloc
+from contextvars import ContextVar
+from random import random
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Coroutine
+from typing import Dict
+from typing import Optional
+from typing import TypeVar
+
+from aio_pika.abc import AbstractIncomingMessage
+
+
+T = TypeVar('T')
+
+log = logging.getLogger('mela.profiling')
+
+
+# Profile of the invocation which is sampled now
+current_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar(
+    'mela_profile',
+    default=None,
+)
+
+# Held while a sampled invocation is profiled
+_profiling = threading.Lock()
+
+
+class SamplingProfiler:
+
+    def __init__(
+            self,
+            name: str,
+            sample_rate: float = 0.01,
+            trace_allocations: bool = False,
+            output: Optional[str] = None,
+            interval: Optional[float] = None,
+            top: int = 30,
+    ):
+        self.name: str = name
+        self.sample_rate: float = sample_rate
+        self.trace_allocations: bool = trace_allocations
+        self.output: Optional[str] = output
+        self.interval: Optional[float] = interval
+        self.top: int = top
+        self.samples: int = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._task: Optional[asyncio.Task] = None
+        profilers[name] = self
+
+    def start(self) -> None:
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.interval and self.output and self._task is None:
+            self._task = asyncio.create_task(self._dump_periodically())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def sample(self) -> Optional[cProfile.Profile]:
+        if random() >= self.sample_rate or not _profiling.acquire(blocking=False):
+            return None
+        return cProfile.Profile()
+
+    @staticmethod
+    def release() -> None:
+        _profiling.release()
+
+    def collect(self, profile: cProfile.Profile) -> None:
+        try:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.samples += 1
+        except TypeError:
+            # Profile is empty, if it was not enabled
+            pass
+        finally:
+            self.release()
+
+    @staticmethod
+    def _enable(profile: cProfile.Profile) -> bool:
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiling tool is active, like debugger or coverage
+            log.warning("Invocation is not profiled: %r", e)
+            return False
+        return True
+
+    def runcall(self, profile: cProfile.Profile, func: Callable[..., T], *args, **kwargs) -> T:
+        if not self._enable(profile):
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    async def call(
+            self,
+            profile: cProfile.Profile,
+            func: Callable[..., Awaitable[T]],
+            *args,
+            **kwargs,
+    ) -> T:
+        if not self._enable(profile):
+            return await func(*args, **kwargs)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    def scope(
+            self,
+            func: Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]],
+    ) -> Callable[[AbstractIncomingMessage], Coroutine[Any, Any, None]]:
+        """
+        Profile sampled while decoding the message is not left for the next
+        message, if the handler is not reached
+        """
+
+        async def wrapper(message: AbstractIncomingMessage) -> None:
+            token = current_profile.set(None)
+            try:
+                return await func(message)
+            finally:
+                profile = current_profile.get()
+                current_profile.reset(token)
+                if profile is not None:
+                    self.release()
+        return wrapper
+
+    def report(self) -> str:
+        stream = io.StringIO()
+        stream.write(f"Profile of `{self.name}`, {self.samples} sampled invocations\n")
+        if self._stats is not None:
+            self._stats.stream = stream  # type: ignore
+            self._stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        if tracemalloc.is_tracing():
+            stream.write("Top allocations:\n")
+            snapshot = tracemalloc.take_snapshot()
+            for statistic in snapshot.statistics('lineno')[:self.top]:
+                stream.write(f"{statistic}\n")
+        return stream.getvalue()
+
+    def dump(self) -> None:
+        """
+        Write aggregated stats in pstats format to `output` file and text report
+        next to it, so stats can be opened in any pstats compatible viewer.
+        """
+        if not self.output:
+            return
+        if self._stats is not None:
+            self._stats.dump_stats(self.output)
+        with open(f'{self.output}.txt', 'w') as report_file:
+            report_file.write(self.report())
+
+    async def _dump_periodically(self) -> None:
+        assert self.interval
+        while True:
+            await asyncio.sleep(self.interval)
+            # Stats are updated in loop thread, so they are dumped there too
+            self.dump()
+
+
+profilers: Dict[str, SamplingProfiler] = {}
+
+
+def dump_all() -> None:
+    for profiler in profilers.values():
+        profiler.dump()
+
+
+def render_all() -> str:
+    return '\n'.join(profiler.report() for profiler in profilers.values())
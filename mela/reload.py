@@ -0,0 +1,202 @@
+"""
+Hot reload of settings. Changes of consumers and logging are applied to
+running app without restart of the process: prefetch count, rate limit
+and log level of consumer are changed in place, consumer with any other
+change is restarted, and consumers added to or removed from settings are
+started or stopped. Restarted consumer is cancelled first and waits for
+messages in flight, so they are acked by the channel they came from.
+
+Other components are not restarted, so settings which change any of them
+are rejected as a whole, and the running ones are kept.
+"""
+import asyncio
+import logging
+import os
+import signal
+from time import monotonic
+from typing import TYPE_CHECKING
+from typing import List
+from typing import Optional
+from typing import Set
+
+from pydantic import BaseModel
+
+from .components import Consumer
+from .factories.consumer import consumers
+from .log import configure_logging
+from .log import reset_logging
+from .scheme.requirement import SchemeRequirement
+from .settings import COMPONENT_SECTIONS
+from .settings import ConsumerParams
+from .settings import Settings
+
+
+if TYPE_CHECKING:
+    from .app import Mela
+
+
+log = logging.getLogger('mela.reload')
+
+# Consumer params which are changed without restart of consumer
+TUNABLE_PARAMS = frozenset({'prefetch_count', 'rate_limit', 'log_level'})
+
+
+def changed_fields(old: BaseModel, new: BaseModel) -> Set[str]:
+    return {name for name in new.__fields__ if getattr(old, name) != getattr(new, name)}
+
+
+def is_tunable(old: ConsumerParams, new: ConsumerParams) -> bool:
+    changed = changed_fields(old, new)
+    if not changed <= TUNABLE_PARAMS:
+        return False
+    if 'rate_limit' not in changed:
+        return True
+    # Limiter is changed in place only if consumer keeps the same one
+    return (
+        old.rate_limit is not None
+        and new.rate_limit is not None
+        and old.rate_limit.name == new.rate_limit.name  # type: ignore
+    )
+
+
+class Reloader:
+
+    def __init__(
+            self,
+            app: 'Mela',
+            path: str,
+            interval: Optional[float] = 5.0,
+            sighup: bool = True,
+            drain_timeout: float = 30.0,
+    ):
+        self.app: 'Mela' = app
+        self.path: str = path
+        self.interval: Optional[float] = interval
+        self.sighup: bool = sighup
+        self.drain_timeout: float = drain_timeout
+        self._mtime: Optional[int] = self._stat()
+        self._task: Optional[asyncio.Task] = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.interval is not None:
+            self._task = loop.create_task(self._watch())
+        if self.sighup:
+            loop.add_signal_handler(signal.SIGHUP, self.request)
+
+    async def stop(self) -> None:
+        if self.sighup:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def request(self) -> asyncio.Task:
+        return asyncio.get_running_loop().create_task(self.reload())
+
+    async def _watch(self) -> None:
+        assert self.interval
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self._stat()
+            if mtime != self._mtime:
+                self._mtime = mtime
+                await self.reload()
+
+    async def reload(self) -> bool:
+        # Concurrent reloads are applied one by one
+        async with self._lock:
+            try:
+                settings = self.app.load_settings()
+            except Exception:
+                log.exception("Settings are not reloaded, running ones are kept")
+                return False
+            fixed = self.fixed_changes(self.app.settings, settings)
+            if fixed:
+                log.error(
+                    "Settings are not reloaded, running ones are kept: "
+                    "components %s are changed, they require restart of the app",
+                    ', '.join(f'`{name}`' for name in fixed),
+                )
+                return False
+            await self.apply(settings)
+        log.info("Settings are reloaded")
+        return True
+
+    def fixed_changes(self, old: Settings, new: Settings) -> List[str]:
+        """
+        Names of running components, which are not reloaded, with changed settings
+        """
+        changed = []
+        for requirement in self.app.requirements.values():
+            if requirement.type_ == 'consumer' or requirement.params is not None:
+                continue
+            section = COMPONENT_SECTIONS[requirement.type_][-1]
+            running = getattr(old, section).get(requirement.name)
+            if running != getattr(new, section).get(requirement.name):
+                changed.append(requirement.name)
+        return changed
+
+    async def apply(self, settings: Settings) -> None:
+        old, self.app.settings = self.app.settings, settings
+        if settings.logging != old.logging:
+            if settings.logging:
+                configure_logging(**settings.logging.dict())
+            else:
+                reset_logging()
+        for requirement in list(self.app.requirements.values()):
+            if requirement.type_ == 'consumer' and requirement.params is None:
+                await self._apply_consumer(
+                    requirement,
+                    old.consumers.get(requirement.name),
+                    settings.consumers.get(requirement.name),
+                )
+
+    async def _apply_consumer(
+            self,
+            requirement: SchemeRequirement,
+            old: Optional[ConsumerParams],
+            new: Optional[ConsumerParams],
+    ) -> None:
+        if old == new:
+            return
+        instance = consumers.get(requirement.name)
+        if instance is not None and old is not None and new is not None and is_tunable(old, new):
+            await self._tune(instance, old, new)
+            log.info("Consumer `%s` is tuned", requirement.name)
+            return
+        if instance is not None:
+            await self._stop(instance)
+            log.info("Consumer `%s` is stopped", requirement.name)
+        if new is not None:
+            await self.app.start_component(requirement)
+            log.info("Consumer `%s` is started", requirement.name)
+
+    @staticmethod
+    async def _tune(instance: Consumer, old: ConsumerParams, new: ConsumerParams) -> None:
+        if new.prefetch_count != old.prefetch_count:
+            await instance.set_prefetch_count(new.prefetch_count)
+        if new.rate_limit != old.rate_limit:
+            instance.set_rate_limit(new.rate_limit.rate, new.rate_limit.burst)  # type: ignore
+        if new.log_level != old.log_level:
+            instance.config_logger(new.log_level)
+
+    async def _stop(self, instance: Consumer) -> None:
+        consumers.pop(instance.name, None)
+        await instance.cancel()
+        if instance.no_ack:
+            # Messages are acked on delivery, so handlers don't need the channel
+            await instance.close()
+            return
+        deadline = monotonic() + self.drain_timeout
+        while instance.metrics.in_flight() > 0 and monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await instance.close()
@@ -2,11 +2,16 @@ import warnings
 from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import List
 from typing import Optional
 from typing import Type
 
 from pydantic import BaseModel
 
+from ..dependencies import Dependency
+from ..dependencies import register_dependency
+from ..middleware import Middleware
+from ..middleware import merge_middlewares
 from ..processor import Processor
 from ..settings import ConsumerParams
 from ..settings import PublisherParams
@@ -27,26 +32,67 @@ class MelaScheme:
     ):
         self.name: str = name
         self.requirements: Dict['str', SchemeRequirement] = {}
+        self.middlewares: List[Middleware] = []
+        # Dependencies by their types
+        self.dependencies: Dict[type, Dependency] = {}
 
     def register_component_requirement(self, requirement: SchemeRequirement):
         if requirement.name in self.requirements:
             raise KeyError(f"Looks like requirement with name `{requirement.name}` already exists")
+        requirement.scheme_middlewares = self.middlewares
         self.requirements[requirement.name] = requirement
 
+    def middleware(self, middleware: Middleware) -> Middleware:
+        """
+        Register middleware for every component of the scheme. Middlewares are
+        called in order of registration, before component's own ones.
+        """
+        self.middlewares.append(middleware)
+        return middleware
+
+    def dependency(
+        self,
+        factory: Optional[Callable] = None,
+        *,
+        type_: Optional[type] = None,
+    ) -> Callable:
+        """
+        Register factory of resource which is injected to handlers by
+        annotation. Type of resource is the return annotation of factory
+        unless `type_` is given.
+
+            @app.dependency
+            async def db_pool() -> AsyncIterator[Pool]:
+                pool = await create_pool()
+                yield pool
+                await pool.close()
+        """
+
+        def decorator(func: Callable) -> Callable:
+            register_dependency(self.dependencies, func, type_)
+            return func
+
+        if factory is None:
+            return decorator
+        return decorator(factory)
+
     def service(
         self,
         name: str,
         params: Optional[ServiceParams] = None,
         validate_args: bool = False,
         input_class: Type[BaseModel] = None,
+        middlewares: Optional[List[Middleware]] = None,
     ) -> Callable[[Callable], Callable]:
-        requirement = SchemeRequirement(name, 'service', params)
+        requirement = SchemeRequirement(name, 'service', params, middlewares=middlewares)
 
         def decorator(func: Callable) -> Callable:
             processor = Processor(
                 func,
                 input_class=input_class,
                 validate_args=validate_args,
+                middlewares=middlewares,
+                dependencies=self.dependencies,
             )
             requirement.set_processor(processor)
             return processor
@@ -58,8 +104,9 @@ class MelaScheme:
         self,
         name: str,
         params: Optional[PublisherParams] = None,
+        middlewares: Optional[List[Middleware]] = None,
     ) -> SchemeRequirement:
-        requirement = SchemeRequirement(name, 'publisher', params)
+        requirement = SchemeRequirement(name, 'publisher', params, middlewares=middlewares)
         self.register_component_requirement(requirement)
         return requirement
 
@@ -69,8 +116,9 @@ class MelaScheme:
         params: ConsumerParams = None,
         validate_args: bool = False,
         input_class: Type[BaseModel] = None,
+        middlewares: Optional[List[Middleware]] = None,
     ) -> Callable[[Callable], Callable]:
-        requirement = SchemeRequirement(name, 'consumer', params)
+        requirement = SchemeRequirement(name, 'consumer', params, middlewares=middlewares)
         self.register_component_requirement(requirement)
 
         def decorator(func: Callable[..., Any]) -> Callable:
@@ -78,6 +126,8 @@ class MelaScheme:
                 func,
                 input_class=input_class,
                 validate_args=validate_args,
+                middlewares=middlewares,
+                dependencies=self.dependencies,
             )
             requirement.set_processor(processor)
             return processor
@@ -89,8 +139,9 @@ class MelaScheme:
         params: Optional[RPCParams] = None,
         validate_args: bool = False,
         request_model: Type[BaseModel] = None,
+        middlewares: Optional[List[Middleware]] = None,
     ):
-        requirement = SchemeRequirement(name, 'rpc_service', params)
+        requirement = SchemeRequirement(name, 'rpc_service', params, middlewares=middlewares)
         self.register_component_requirement(requirement)
 
         def decorator(func: Callable[..., Any]) -> Callable:
@@ -98,6 +149,8 @@ class MelaScheme:
                 func,
                 input_class=request_model,
                 validate_args=validate_args,
+                middlewares=middlewares,
+                dependencies=self.dependencies,
             )
             requirement.set_processor(processor)
             return processor
@@ -112,12 +165,19 @@ class MelaScheme:
         self,
         name: str,
         params: Optional[RPCParams] = None,
+        middlewares: Optional[List[Middleware]] = None,
     ) -> SchemeRequirement:
-        requirement = SchemeRequirement(name, 'rpc_client', params)
+        requirement = SchemeRequirement(name, 'rpc_client', params, middlewares=middlewares)
         self.register_component_requirement(requirement)
         return requirement
 
     def merge(self, other: 'MelaScheme') -> 'MelaScheme':
+        for type_, dependency in other.dependencies.items():
+            if self.dependencies.get(type_, dependency) is not dependency:
+                raise KeyError(f"Dependency of type `{type_.__name__}` already exists")
+            self.dependencies[type_] = dependency
         for requirement in other.requirements.values():
+            # Middlewares of merged scheme are applied only to its own components
+            requirement.middlewares = merge_middlewares(other.middlewares, requirement.middlewares)
             self.register_component_requirement(requirement)
         return self
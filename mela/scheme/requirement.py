@@ -1,10 +1,16 @@
+from functools import partial
 from typing import Callable
+from typing import List
 from typing import Literal
 from typing import Mapping
 from typing import Optional
 
 from ..abc import AbstractSchemeRequirement
+from ..components.proxy import LazyComponent
+from ..components.proxy import proxies
 from ..factories import factory_dict
+from ..middleware import Middleware
+from ..middleware import merge_middlewares
 from ..settings import ComponentParamsBaseModel
 
 
@@ -16,12 +22,19 @@ class SchemeRequirement(AbstractSchemeRequirement):
         type_: Literal['publisher', 'consumer', 'service', 'rpc_service', 'rpc_client'],
         params: Optional[ComponentParamsBaseModel] = None,
         processor: Optional[Callable] = None,
+        middlewares: Optional[List[Middleware]] = None,
     ):
         self.name = name
         self.type_ = type_
         self.params = params
         self.factory = factory_dict[type_]
         self.processor = processor
+        self.middlewares: List[Middleware] = list(middlewares or [])
+        # Middlewares of scheme which requirement is registered in
+        self.scheme_middlewares: List[Middleware] = []
+        # Publishers and RPC clients of lazy requirement are resolved on first use
+        self.lazy: bool = False
+        self._proxy: Optional[LazyComponent] = None
 
     async def _resolve(self, settings):
         if self.params:
@@ -48,8 +61,19 @@ class SchemeRequirement(AbstractSchemeRequirement):
         return await self.factory(registry[self.name])
 
     async def resolve(self, settings):
+        if self.lazy and self.type_ in proxies:
+            if self._proxy is None:
+                self._proxy = proxies[self.type_](self.name, partial(self._resolve_now, settings))
+            return self._proxy
+        return await self._resolve_now(settings)
+
+    async def _resolve_now(self, settings):
         resolved = await self._resolve(settings)
+        middlewares = merge_middlewares(self.scheme_middlewares, self.middlewares)
+        if middlewares:
+            resolved.use_middlewares(middlewares)
         if self.processor:
+            self.processor.use_middlewares(middlewares)
             resolved.set_processor(self.processor)
         return resolved
 
@@ -1,7 +1,11 @@
 import abc
 from typing import Any
 from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Literal
 from typing import Optional
+from typing import Set
 from typing import Tuple
 from typing import Union
 
@@ -10,11 +14,13 @@ from aio_pika import ExchangeType
 from aio_pika.abc import AbstractExchange
 from aio_pika.abc import AbstractQueue
 from pydantic import AmqpDsn
+from pydantic import AnyUrl
 from pydantic import BaseModel
 from pydantic import BaseSettings
 from pydantic import Extra
 from pydantic import Field
 from pydantic import PrivateAttr
+from pydantic import validator
 from pydantic.env_settings import SettingsSourceCallable
 
 
@@ -64,14 +70,43 @@ class ConnectionParams(AbstractConnectionParams):
         return res
 
 
+class MemoryDsn(AnyUrl):
+    """
+    URL of in-process broker: `memory://` or `memory://<broker name>`
+    """
+    allowed_schemes = {'memory'}
+    host_required = False
+
+
 class URLConnectionParams(AbstractConnectionParams):
 
-    url: AmqpDsn
+    url: Union[AmqpDsn, MemoryDsn]
 
     def get_params_dict(self):
         return self.dict(exclude={'name'})
 
 
+class ClusterConnectionParams(AbstractConnectionParams):
+    """
+    Connection to one of broker `nodes`. With `prefer_local` policy nodes are
+    tried in the given order, with `round_robin` every connection starts from
+    the next node, and with `spread` from the node with the fewest connections
+    of the process. Node which fails is skipped for `exclusion_period` seconds.
+    """
+    nodes: List[Union[AmqpDsn, MemoryDsn]] = Field(min_items=1)
+    policy: Literal['prefer_local', 'round_robin', 'spread'] = 'prefer_local'
+    connect_timeout: float = Field(default=5.0, gt=0)
+    exclusion_period: float = Field(default=30.0, ge=0)
+
+    def get_params_dict(self):
+        params = self.dict(exclude={'name'})
+        params['nodes'] = [str(node) for node in self.nodes]
+        return params
+
+
+AnyConnectionParams = Union[ConnectionParams, URLConnectionParams, ClusterConnectionParams]
+
+
 class ExchangeParams(BaseModel):
     _instance: Optional[AbstractExchange] = PrivateAttr(default=None)
 
@@ -99,6 +134,7 @@ class QueueParams(BaseModel):
     dead_letter_exchange: Optional[Union[str, ExchangeParams]] = None
     dead_letter_exchange_type: ExchangeType = ExchangeType.DIRECT
     dead_letter_routing_key: Optional[str] = None
+    max_priority: Optional[int] = Field(default=None, ge=1, le=255)
 
     def solve_dead_letter_exchange(self, exchanges: Dict['str', 'ExchangeParams']):
         if isinstance(self.dead_letter_exchange, str):
@@ -115,6 +151,8 @@ class QueueParams(BaseModel):
         if self.dead_letter_exchange:
             arguments['x-dead-letter-exchange'] = self.dead_letter_exchange.name
             arguments['x-dead-letter-routing-key'] = self.dead_letter_routing_key
+        if self.max_priority:
+            arguments['x-max-priority'] = self.max_priority
         return {
             'name': self.name,
             'durable': self.durable,
@@ -128,6 +166,140 @@ class QueueParams(BaseModel):
         self.solve_dead_letter_exchange(settings.exchanges)
 
 
+class RateLimitParams(BaseModel):
+    """
+    Token bucket params. Named rate limits declared in `rate-limits` section
+    are shared between all the components which refer them.
+    """
+    name: Optional[str] = None
+    rate: float = Field(gt=0)
+    burst: Optional[int] = Field(default=None, gt=0)
+
+
+class LoadSheddingParams(BaseModel):
+    """
+    Latency SLO of a consumer. Deliveries are shed while it is exceeded.
+    """
+    max_queue_delay: Optional[float] = Field(default=None, gt=0)
+    max_loop_lag: Optional[float] = Field(default=None, gt=0)
+    protected_priority: Optional[int] = None
+    requeue: bool = False
+    requeue_pause: float = Field(default=1.0, ge=0)
+
+
+class ProfilingParams(BaseModel):
+    """
+    Sampling profiler of component processor. Aggregated stats are dumped
+    to `output` on SIGUSR1 or every `interval` seconds.
+    """
+    sample_rate: float = Field(default=0.01, gt=0, le=1)
+    trace_allocations: bool = False
+    output: Optional[str] = None
+    interval: Optional[float] = Field(default=None, gt=0)
+
+
+class WatchdogParams(BaseModel):
+    """
+    Blocks of event loop longer than `threshold` seconds are reported
+    with the stack of blocking code
+    """
+    threshold: float = Field(default=0.5, gt=0)
+    interval: float = Field(default=0.1, gt=0)
+
+
+class LoggingParams(BaseModel):
+    """
+    With `queue` records are written by background thread. Records with
+    exception info can be limited to `exception_rate` per second for
+    every logger and message.
+    """
+    queue: bool = True
+    json_format: bool = Field(default=False, alias='json')
+    exception_rate: Optional[float] = Field(default=None, gt=0)
+    exception_burst: int = Field(default=10, gt=0)
+
+
+class ReloadParams(BaseModel):
+    """
+    Settings file is checked for changes every `interval` seconds, unless
+    it's null, and reloaded on SIGHUP if `sighup` is set. Restarted
+    consumers wait for messages in flight at most `drain_timeout` seconds.
+    """
+    interval: Optional[float] = Field(default=5.0, gt=0)
+    sighup: bool = True
+    drain_timeout: float = Field(default=30.0, ge=0)
+
+
+class BlobStoreParams(BaseModel):
+    """
+    Directory of file blob store. Publishers and consumers refer the store
+    by name, so it can be mounted to different paths on their hosts.
+    """
+    name: Optional[str] = None
+    path: str
+
+
+class ClaimCheckParams(BaseModel):
+    """
+    Publisher puts bodies larger than `threshold` bytes to the blob store.
+    Consumer loads them before decoding or, if `lazy`, by `load_body` call,
+    and deletes them after ack, or after nack without requeue if the queue
+    has no dead letter exchange. Turn off `delete_acked` if the message is
+    routed to several queues.
+    """
+    store: Union[str, BlobStoreParams]
+    threshold: int = Field(default=1024 * 1024, ge=0)
+    lazy: bool = False
+    delete_acked: bool = True
+
+    def solve(self, settings: 'Settings') -> None:
+        if isinstance(self.store, str):
+            if self.store not in settings.blob_stores:
+                raise KeyError(f"Blob store `{self.store}` is not described in config")
+            self.store = settings.blob_stores[self.store]
+
+
+class CompressionParams(BaseModel):
+    """
+    Publisher compresses bodies of at least `min_size` bytes. Zstd and
+    deflate can use `dictionary` file trained on typical messages, which
+    consumers load by `compression_dictionaries`.
+    """
+    codec: Literal['gzip', 'deflate', 'zstd', 'lz4'] = 'gzip'
+    min_size: int = Field(default=1024, ge=0)
+    level: Optional[int] = None
+    dictionary: Optional[str] = None
+
+
+class OutboxParams(BaseModel):
+    """
+    SQLite file where publisher keeps messages while broker is unreachable.
+    They are published by batches of `batch_size` when channel is open.
+    """
+    path: str
+    batch_size: int = Field(default=100, gt=0)
+    interval: float = Field(default=1.0, gt=0)
+
+
+class MetricsParams(BaseModel):
+    """
+    Address of HTTP endpoint which serves metrics in Prometheus text format
+    """
+    host: str = '127.0.0.1'
+    port: int = 9090
+
+
+def solve_rate_limit(
+        rate_limit: Optional[Union[str, RateLimitParams]],
+        rate_limits: Dict[str, RateLimitParams],
+) -> Optional[RateLimitParams]:
+    if isinstance(rate_limit, str):
+        if rate_limit not in rate_limits:
+            raise KeyError(f"Rate limit `{rate_limit}` is not described in config")
+        return rate_limits[rate_limit]
+    return rate_limit
+
+
 class ComponentParamsBaseModel(BaseModel, abc.ABC):
     name: Optional[str] = None
     log_level: str = 'info'
@@ -142,17 +314,24 @@ class ComponentParamsBaseModel(BaseModel, abc.ABC):
 
 
 class PublisherParams(ComponentParamsBaseModel):
-    connection: Union[str, ConnectionParams, URLConnectionParams] = 'default'
+    connection: Union[str, AnyConnectionParams] = 'default'
     exchange: Union[str, ExchangeParams]
     exchange_type: str = 'direct'  # DEPRECATED will be deleted in v1.2.0
     routing_key: str
     skip_unroutables: bool = False
     queue: Optional[Union[str, QueueParams]] = None
     timeout: Optional[Union[int, float]] = None
+    rate_limit: Optional[Union[str, RateLimitParams]] = None
+    claim_check: Optional[ClaimCheckParams] = None
+    compression: Optional[CompressionParams] = None
+    outbox: Optional[OutboxParams] = None
+    # Stamp deadline of currently processed message into published ones,
+    # if its consumer drops expired messages
+    inherit_deadline: bool = False
 
     def solve_connection(
             self,
-            connections: Dict[str, Union[ConnectionParams, URLConnectionParams]],
+            connections: Dict[str, AnyConnectionParams],
     ) -> None:
         if isinstance(self.connection, str):
             if self.connection not in connections:
@@ -185,6 +364,9 @@ class PublisherParams(ComponentParamsBaseModel):
             self.solve_queue(settings.queues)
             assert isinstance(self.queue, QueueParams)
             self.queue.solve(settings)
+        self.rate_limit = solve_rate_limit(self.rate_limit, settings.rate_limits)
+        if self.claim_check:
+            self.claim_check.solve(settings)
         if parent_name and self.name is None:
             self.name = parent_name + '_publisher'
 
@@ -193,11 +375,12 @@ class PublisherParams(ComponentParamsBaseModel):
             'name': self.name,
             'default_timeout': self.timeout,
             'default_routing_key': self.routing_key,
+            'inherit_deadline': self.inherit_deadline,
         }
 
 
 class ConsumerParams(ComponentParamsBaseModel):
-    connection: Union[str, ConnectionParams, URLConnectionParams] = 'default'
+    connection: Union[str, AnyConnectionParams] = 'default'
     exchange: Union[str, ExchangeParams]
     exchange_type: str = 'direct'  # DEPRECATED will be deleted in v1.2.0
     routing_key: str
@@ -206,10 +389,33 @@ class ConsumerParams(ComponentParamsBaseModel):
     dead_letter_exchange: Optional[str] = None
     dead_letter_routing_key: Optional[str] = None
     requeue_broken_messages: bool = True
+    rate_limit: Optional[Union[str, RateLimitParams]] = None
+    # Handle prefetched messages in priority order by `concurrency` handlers at once
+    prioritize: bool = False
+    concurrency: int = Field(default=1, gt=0)
+    # Nack messages with passed deadline before processing, deadline of the
+    # rest is inherited by publishers and RPC calls of their handlers
+    drop_expired: bool = False
+    load_shedding: Optional[LoadSheddingParams] = None
+    profiling: Optional[ProfilingParams] = None
+    claim_check: Optional[ClaimCheckParams] = None
+    # Decompress bodies compressed by publishers. Turn it on, if any of them compresses
+    decompress: bool = False
+    # Dictionaries of publishers, which compress messages with them. Consumer
+    # with dictionaries decompresses bodies even without `decompress`
+    compression_dictionaries: List[str] = []
+
+    @validator('load_shedding')
+    @classmethod
+    def queue_delay_requires_prioritize(cls, value, values):
+        # Without scheduler messages wait in broker, and delay is not measured
+        if value and value.max_queue_delay is not None and not values.get('prioritize'):
+            raise ValueError("`max_queue_delay` requires `prioritize: true`")
+        return value
 
     def solve_connection(
         self,
-        connections: Dict[str, Union[ConnectionParams, URLConnectionParams]],
+        connections: Dict[str, AnyConnectionParams],
     ) -> None:
         if isinstance(self.connection, str):
             if self.connection not in connections:
@@ -247,6 +453,9 @@ class ConsumerParams(ComponentParamsBaseModel):
         self.solve_queue(settings.queues)
         assert isinstance(self.queue, QueueParams)
         self.queue.solve(settings)
+        self.rate_limit = solve_rate_limit(self.rate_limit, settings.rate_limits)
+        if self.claim_check:
+            self.claim_check.solve(settings)
         if parent_name and self.name is None:
             self.name = parent_name + '_consumer'
 
@@ -256,6 +465,10 @@ class ConsumerParams(ComponentParamsBaseModel):
             'prefetch_count': self.prefetch_count,
             'requeue_broken_messages': self.requeue_broken_messages,
             'log_level': self.log_level,
+            'prioritize': self.prioritize,
+            'concurrency': self.concurrency,
+            'drop_expired': self.drop_expired,
+            'decompress': self.decompress or bool(self.compression_dictionaries),
         }
 
 
@@ -264,6 +477,7 @@ class ServiceParams(ComponentParamsBaseModel):
     consumer: Union[str, ConsumerParams]
     publisher: Union[str, PublisherParams]
     requeue_broken_messages: Optional[bool] = None
+    profiling: Optional[ProfilingParams] = None
 
     name: Optional[str] = None
 
@@ -274,6 +488,8 @@ class ServiceParams(ComponentParamsBaseModel):
             self.consumer = consumers[self.consumer]
         if self.requeue_broken_messages is not None:
             self.consumer.requeue_broken_messages = self.requeue_broken_messages
+        if self.profiling is not None:
+            self.consumer.profiling = self.profiling
 
     def solve_publisher(self, publishers: Dict[str, PublisherParams]):
         if isinstance(self.publisher, str):
@@ -298,7 +514,7 @@ class ServiceParams(ComponentParamsBaseModel):
 
 
 class RPCParams(ComponentParamsBaseModel):
-    connection: Union[str, ConnectionParams, URLConnectionParams] = 'default'
+    connection: Union[str, AnyConnectionParams] = 'default'
     worker: Optional[ConsumerParams] = None
     response_publisher: Optional[PublisherParams] = None
     request_publisher: Optional[PublisherParams] = None
@@ -312,10 +528,14 @@ class RPCParams(ComponentParamsBaseModel):
     response_exchange: Union[str, ExchangeParams]
 
     prefetch_count: int = 1
+    rate_limit: Optional[Union[str, RateLimitParams]] = None
+    # Nack requests whose callers don't wait for the response anymore
+    drop_expired: bool = False
+    profiling: Optional[ProfilingParams] = None
 
     def solve_connection(
         self,
-        connections: Dict[str, Union[ConnectionParams, URLConnectionParams]],
+        connections: Dict[str, AnyConnectionParams],
     ) -> None:
         if isinstance(self.connection, str):
             if self.connection not in connections:
@@ -359,6 +579,9 @@ class RPCParams(ComponentParamsBaseModel):
                 routing_key=self.routing_key,
                 queue=self.queue,
                 prefetch_count=self.prefetch_count,
+                rate_limit=solve_rate_limit(self.rate_limit, settings.rate_limits),
+                drop_expired=self.drop_expired,
+                profiling=self.profiling,
             )
         if self.response_publisher is None:
             self.response_publisher = PublisherParams(
@@ -379,20 +602,78 @@ class RPCParams(ComponentParamsBaseModel):
         pass
 
 
+# Settings sections of component types, as in YAML and as field names
+COMPONENT_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    'publisher': ('publishers',),
+    'consumer': ('consumers',),
+    'service': ('services',),
+    'rpc_service': ('rpc-services', 'rpc_services'),
+    'rpc_client': ('rpc-services', 'rpc_services'),
+}
+
+Requirement = Tuple[str, str]
+
+
+def required_names(
+        values: Dict[str, Any],
+        requirements: Iterable[Requirement],
+) -> Dict[str, Set[str]]:
+    required: Dict[str, Set[str]] = {
+        section: set() for sections in COMPONENT_SECTIONS.values() for section in sections
+    }
+    for type_, name in requirements:
+        for section in COMPONENT_SECTIONS[type_]:
+            required[section].add(name)
+    # Services refer consumers and publishers by name
+    services = values.get('services') or {}
+    for name in required['services']:
+        service = services.get(name) or {}
+        for field, section in (('consumer', 'consumers'), ('publisher', 'publishers')):
+            if isinstance(service.get(field), str):
+                required[section].add(service[field])
+    return required
+
+
+def required_values(values: Dict[str, Any], requirements: Iterable[Requirement]) -> Dict[str, Any]:
+    """
+    Raw settings without components which are not required. Connections,
+    exchanges and other shared sections are left as they are.
+    """
+    required = required_names(values, requirements)
+    filtered = dict(values)
+    for section, names in required.items():
+        if isinstance(values.get(section), dict):
+            filtered[section] = {
+                name: params for name, params in values[section].items() if name in names
+            }
+    return filtered
+
+
 class Settings(BaseSettings):
 
-    connections: Dict[str, Union[ConnectionParams, URLConnectionParams]] = {}
+    connections: Dict[str, AnyConnectionParams] = {}
     services: Dict[str, ServiceParams] = {}
     consumers: Dict[str, ConsumerParams] = {}
     publishers: Dict[str, PublisherParams] = {}
     exchanges: Dict[str, ExchangeParams] = {}
     queues: Dict[str, QueueParams] = {}
     rpc_services: Dict[str, RPCParams] = Field(default_factory=dict, alias='rpc-services')
+    rate_limits: Dict[str, RateLimitParams] = Field(default_factory=dict, alias='rate-limits')
+    blob_stores: Dict[str, BlobStoreParams] = Field(default_factory=dict, alias='blob-stores')
+    metrics: Optional[MetricsParams] = None
+    watchdog: Optional[WatchdogParams] = None
+    logging: Optional[LoggingParams] = None
+    reload: Optional[ReloadParams] = None
 
     def __init__(self, **values: Any):
+        """
+        With `_requirements`, pairs of component type and name, only these
+        components are validated and solved
+        """
         super().__init__(**values)
-        for connection_name, connection in self.connections.items():
-            connection.name = connection_name
+        for section in (self.connections, self.rate_limits, self.blob_stores):
+            for name, params in section.items():
+                params.name = name
         for rpc_name, rpc_config in self.rpc_services.items():
             rpc_config.name = rpc_name
             rpc_config.solve(self)
@@ -406,8 +687,17 @@ class Settings(BaseSettings):
             publisher_config.name = publisher_name
             publisher_config.solve(self)
 
+    def _build_values(self, init_kwargs: Dict[str, Any], *args: Any, **kwargs: Any) -> Dict:
+        requirements = init_kwargs.pop('_requirements', None)
+        values = super()._build_values(init_kwargs, *args, **kwargs)
+        if requirements is None:
+            return values
+        return required_values(values, requirements)
+
     class Config:
         yaml_file_path = 'application.yml'
+        # Directory of compiled settings snapshots, see `load_settings`
+        snapshot_dir: Optional[str] = None
 
         extra = Extra.ignore
 
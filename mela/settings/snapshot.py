@@ -0,0 +1,88 @@
+"""
+Compiled settings. Validated settings with solved references are pickled
+to snapshot directory, and processes which start with the same settings
+file, environment and requirements load the snapshot instead of parsing
+and solving settings again.
+"""
+import hashlib
+import os
+import pickle  # noqa: S403
+import re
+import sys
+from typing import Iterable
+from typing import Optional
+
+from . import Requirement
+from . import Settings
+
+
+ENV_REFERENCE = re.compile(rb'\$\{?([A-Za-z_][A-Za-z0-9_]*)')
+
+
+def snapshot_key(config: bytes, requirements: Optional[Iterable[Requirement]]) -> str:
+    """
+    Hash of everything which settings are built of: settings file, values of
+    environment variables which it refers or which override its sections,
+    and required components
+    """
+    key = hashlib.sha256(config)
+    variables = {name.decode() for name in ENV_REFERENCE.findall(config)}
+    sections = {field.lower() for field in Settings.__fields__}
+    for name in sorted(os.environ):
+        if name in variables or name.lower() in sections:
+            key.update(f'{name}={os.environ[name]}\0'.encode())
+    if requirements is not None:
+        key.update(repr(sorted(requirements)).encode())
+    key.update(sys.version.encode())
+    return key.hexdigest()[:32]
+
+
+def compile_settings(requirements: Optional[Iterable[Requirement]] = None) -> Settings:
+    if requirements is None:
+        return Settings()
+    return Settings(_requirements=list(requirements))
+
+
+def _load(path: str) -> Optional[Settings]:
+    try:
+        with open(path, 'rb') as snapshot_file:
+            # Snapshots are written only by the application itself
+            settings = pickle.load(snapshot_file)  # noqa: S301
+    except Exception:
+        # Snapshot is missing or is made by another version of settings models
+        return None
+    return settings if isinstance(settings, Settings) else None
+
+
+def _save(path: str, settings: Settings) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        pickle.dump(settings, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    # Concurrently started workers don't read partial snapshot
+    os.replace(temp_path, path)
+
+
+def load_settings(
+        requirements: Optional[Iterable[Requirement]] = None,
+        snapshot_dir: Optional[str] = None,
+) -> Settings:
+    """
+    Settings with only `requirements` components, if they are given. They are
+    loaded from snapshot if `snapshot_dir`, by default `Settings.Config.snapshot_dir`,
+    is set and the snapshot is still valid, otherwise compiled and saved.
+    """
+    if requirements is not None:
+        requirements = list(requirements)
+    if snapshot_dir is None:
+        snapshot_dir = Settings.Config.snapshot_dir
+    if snapshot_dir is None:
+        return compile_settings(requirements)
+    with open(Settings.Config.yaml_file_path, 'rb') as config_file:  # type: ignore
+        config = config_file.read()
+    path = os.path.join(snapshot_dir, f'settings-{snapshot_key(config, requirements)}.pickle')
+    settings = _load(path)
+    if settings is None:
+        settings = compile_settings(requirements)
+        _save(path, settings)
+    return settings
@@ -0,0 +1,128 @@
+"""
+Publishing from code which doesn't run in event loop, e.g. WSGI views,
+Celery tasks or worker threads. Publishers live in event loop of dedicated
+thread and are shared by all the threads of the process.
+"""
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Coroutine
+from typing import Deque
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from aio_pika.abc import AbstractMessage
+from pydantic import BaseModel
+
+from .components import Publisher
+
+
+Call = Callable[[], Awaitable[Any]]
+
+
+class LoopThread:
+
+    def __init__(self, name: str = 'mela-loop'):
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._thread: threading.Thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def is_current(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if not self.is_running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self.is_running:
+            self.loop.close()
+
+
+def _copy_result(future: Future, task: asyncio.Task) -> None:
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())  # type: ignore
+    else:
+        future.set_result(task.result())
+
+
+class ThreadSafePublisher:
+
+    """
+    Publisher handle which can be called from any thread. Calls are queued
+    and the loop thread is woken up once for all the calls which arrive
+    before it starts publishing them, so calls in bulk are published as
+    a batch with confirmations awaited concurrently.
+    """
+
+    def __init__(self, publisher: Publisher, loop: asyncio.AbstractEventLoop):
+        self.publisher: Publisher = publisher
+        self._loop: asyncio.AbstractEventLoop = loop
+        self._pending: Deque[Tuple[Future, Call]] = deque()
+        self._lock: threading.Lock = threading.Lock()
+        self._scheduled: bool = False
+
+    def publish(
+            self,
+            message: Union[Dict, BaseModel, AbstractMessage],
+            routing_key: Optional[str] = None,
+            priority: Optional[int] = None,
+            deadline: Optional[float] = None,
+    ) -> Future:
+        return self._submit(
+            partial(self.publisher.publish, message, routing_key, priority, deadline),
+        )
+
+    def publish_message(
+            self,
+            message: AbstractMessage,
+            routing_key: Optional[str] = None,
+            timeout: Optional[int] = None,
+    ) -> Future:
+        return self._submit(
+            partial(self.publisher.publish_message, message, routing_key, timeout),
+        )
+
+    def _submit(self, call: Call) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((future, call))
+            if self._scheduled:
+                return future
+            self._scheduled = True
+        self._loop.call_soon_threadsafe(self._flush)
+        return future
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+            self._scheduled = False
+        for future, call in batch:
+            if future.set_running_or_notify_cancel():
+                task = self._loop.create_task(call())
+                task.add_done_callback(partial(_copy_result, future))
@@ -0,0 +1,32 @@
+"""
+Transport is selected by scheme of connection URL: `memory://` connections
+go to in-process broker and all the other ones go to RabbitMQ. Connection
+with `nodes` goes to one of them, see `cluster`.
+"""
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from urllib.parse import urlsplit
+
+from aio_pika import connect_robust
+from aio_pika.abc import AbstractConnection
+
+from . import cluster
+from . import memory
+
+
+transports: Dict[str, Callable[..., Awaitable[Any]]] = {
+    'memory': memory.connect,
+}
+
+
+async def connect(**params: Any) -> AbstractConnection:
+    if 'nodes' in params:
+        return await cluster.connect(connect_node, **params)
+    return await connect_node(**params)
+
+
+async def connect_node(**params: Any) -> AbstractConnection:
+    scheme = urlsplit(str(params['url'])).scheme if params.get('url') else 'amqp'
+    return await transports.get(scheme, connect_robust)(**params)
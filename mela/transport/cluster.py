@@ -0,0 +1,146 @@
+"""
+Connections to a cluster of broker nodes. Order of nodes to connect is
+selected by policy, node which fails to connect is excluded for a while
+and the next one is tried at once. Robust connection which is lost is
+reconnected to another node, and so is each of its failed attempts.
+"""
+import asyncio
+import logging
+from collections import Counter
+from itertools import count
+from time import monotonic
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlsplit
+
+from aio_pika.abc import AbstractConnection
+from aio_pika.exceptions import CONNECTION_EXCEPTIONS
+from yarl import URL
+
+from ..metrics import node_exclusions
+
+
+log = logging.getLogger('mela.transport.cluster')
+
+ConnectNode = Callable[..., Awaitable[AbstractConnection]]
+
+
+def node_address(node: str) -> str:
+    # Node URL has credentials, so only its address goes to logs and metrics
+    parts = urlsplit(node)
+    return f'{parts.scheme}://{parts.hostname or ""}:{parts.port or ""}'
+
+
+class Cluster:
+
+    """
+    State of nodes shared by all the connections of the process to them
+    """
+
+    def __init__(self, nodes: List[str], policy: str, exclusion_period: float):
+        self.nodes: List[str] = nodes
+        self.policy: str = policy
+        self.exclusion_period: float = exclusion_period
+        self.connections: Counter = Counter()
+        self._excluded_until: Dict[str, float] = {}
+        self._turns = count()
+
+    def is_excluded(self, node: str) -> bool:
+        return self._excluded_until.get(node, 0.0) > monotonic()
+
+    def exclude(self, node: str) -> None:
+        self._excluded_until[node] = monotonic() + self.exclusion_period
+        node_exclusions.labels(node_address(node)).inc()
+
+    def _exclusion(self, node: str) -> Tuple[bool, float]:
+        if not self.is_excluded(node):
+            return False, 0.0
+        return True, self._excluded_until[node]
+
+    def order(self) -> List[str]:
+        nodes = list(self.nodes)
+        if self.policy == 'round_robin':
+            turn = next(self._turns) % len(nodes)
+            nodes = nodes[turn:] + nodes[:turn]
+        elif self.policy == 'spread':
+            nodes.sort(key=self.connections.__getitem__)
+        # Excluded nodes are tried only when all the nodes are excluded,
+        # the one which was excluded first goes first
+        return sorted(nodes, key=self._exclusion)
+
+
+class ClusterLink:
+
+    """
+    Node of a connection. Lost connection moves to another node, and robust
+    connection reconnects to it. Robust connection fires close callbacks on
+    each failed attempt to reconnect too, so it moves on until some node
+    accepts it.
+    """
+
+    def __init__(self, cluster: Cluster, connection: AbstractConnection, node: str):
+        self.cluster: Cluster = cluster
+        self.connection: AbstractConnection = connection
+        self.node: str = node
+        self.connected: bool = True
+        cluster.connections[node] += 1
+        connection.close_callbacks.add(self.on_close)
+        reconnect_callbacks = getattr(connection, 'reconnect_callbacks', None)
+        if reconnect_callbacks is not None:
+            reconnect_callbacks.add(self.on_reconnect)
+
+    def on_close(self, sender: Any, exc: Optional[BaseException] = None) -> None:
+        if self.connected:
+            # Failed attempts to reconnect are not counted twice
+            self.connected = False
+            self.cluster.connections[self.node] -= 1
+        if not isinstance(exc, Exception):
+            # Connection is closed by the app
+            return
+        self.cluster.exclude(self.node)
+        self.node = self.cluster.order()[0]
+        self.connection.url = URL(self.node)  # type: ignore
+        log.warning("Connection is lost, reconnecting to %s", node_address(self.node))
+
+    def on_reconnect(self, sender: Any) -> None:
+        self.connected = True
+        self.cluster.connections[self.node] += 1
+
+
+# Clusters by their nodes and policy
+clusters: Dict[Tuple[Tuple[str, ...], str, float], Cluster] = {}
+
+
+def get_cluster(nodes: List[str], policy: str, exclusion_period: float) -> Cluster:
+    key = (tuple(nodes), policy, exclusion_period)
+    if key not in clusters:
+        clusters[key] = Cluster(list(nodes), policy, exclusion_period)
+    return clusters[key]
+
+
+async def connect(
+        connect_node: ConnectNode,
+        nodes: List[str],
+        policy: str = 'prefer_local',
+        connect_timeout: float = 5.0,
+        exclusion_period: float = 30.0,
+        **params: Any,
+) -> AbstractConnection:
+    cluster = get_cluster(nodes, policy, exclusion_period)
+    failures = []
+    for node in cluster.order():
+        try:
+            connection = await connect_node(url=node, timeout=connect_timeout, **params)
+        except (asyncio.TimeoutError, *CONNECTION_EXCEPTIONS) as e:
+            cluster.exclude(node)
+            failures.append(f'{node_address(node)}: {e!r}')
+            log.warning("Node %s is excluded, it fails to connect: %r", node_address(node), e)
+            continue
+        ClusterLink(cluster, connection, node)
+        return connection
+    raise ConnectionError(f"None of cluster nodes is reachable: {'; '.join(failures)}")
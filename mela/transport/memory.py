@@ -0,0 +1,683 @@
+"""
+In-process broker. It implements the part of AMQP model which Mela uses:
+direct, topic and fanout exchanges, queues and bindings, QoS, ack and nack,
+dead lettering, per-message expiration and publisher confirms. Delivered
+messages are real `aio_pika.IncomingMessage` objects, so components can't
+tell it from RabbitMQ. Connections to the same `memory://<name>` URL share
+one broker.
+"""
+import asyncio
+import copy
+import heapq
+from collections import deque
+from functools import lru_cache
+from itertools import count
+from time import monotonic
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+from urllib.parse import urlsplit
+
+from aio_pika import ExchangeType
+from aio_pika import IncomingMessage
+from aio_pika.abc import AbstractMessage
+from aio_pika.exceptions import QueueEmpty
+from aio_pika.tools import CallbackCollection
+from aiormq.abc import DeliveredMessage
+from aiormq.exceptions import ChannelInvalidStateError
+from aiormq.exceptions import ChannelNotFoundEntity
+from aiormq.exceptions import ChannelPreconditionFailed
+from aiormq.exceptions import PublishError
+from pamqp.commands import Basic
+from pamqp.header import ContentHeader
+
+
+Callback = Callable[[IncomingMessage], Awaitable[Any]]
+
+SUPPORTED_EXCHANGE_TYPES = (ExchangeType.DIRECT, ExchangeType.FANOUT, ExchangeType.TOPIC)
+
+NO_ROUTE = 312
+
+
+@lru_cache(maxsize=4096)
+def topic_matches(binding_key: str, routing_key: str) -> bool:
+    return _match_words(tuple(binding_key.split('.')), tuple(routing_key.split('.')))
+
+
+def _match_words(pattern: Tuple[str, ...], words: Tuple[str, ...]) -> bool:
+    if not pattern:
+        return not words
+    head, rest = pattern[0], pattern[1:]
+    if head == '#':
+        # `#` matches zero or more words
+        return any(_match_words(rest, words[i:]) for i in range(len(words) + 1))
+    if not words:
+        return False
+    return head in ('*', words[0]) and _match_words(rest, words[1:])
+
+
+class Envelope:
+
+    __slots__ = ('body', 'properties', 'exchange', 'routing_key', 'redelivered', 'expires_at')
+
+    def __init__(
+            self,
+            body: bytes,
+            properties: Basic.Properties,
+            exchange: str,
+            routing_key: str,
+            redelivered: bool = False,
+    ):
+        self.body: bytes = body
+        self.properties: Basic.Properties = properties
+        self.exchange: str = exchange
+        self.routing_key: str = routing_key
+        self.redelivered: bool = redelivered
+        self.expires_at: Optional[float] = None
+        if properties.expiration:
+            self.expires_at = monotonic() + int(properties.expiration) / 1000
+
+    def requeued(self) -> 'Envelope':
+        envelope = copy.copy(self)
+        envelope.redelivered = True
+        return envelope
+
+    def dead(self, queue: str, reason: str) -> 'Envelope':
+        properties = copy.copy(self.properties)
+        properties.expiration = None
+        properties.headers = dict(properties.headers or {})
+        properties.headers['x-death'] = [{
+            'count': 1,
+            'reason': reason,
+            'queue': queue,
+            'exchange': self.exchange,
+            'routing-keys': [self.routing_key],
+        }]
+        return Envelope(self.body, properties, self.exchange, self.routing_key)
+
+    def delivered(self, channel: 'MemoryChannel', consumer_tag: str, tag: int) -> DeliveredMessage:
+        return DeliveredMessage(
+            delivery=Basic.Deliver(
+                consumer_tag=consumer_tag,
+                delivery_tag=tag,
+                redelivered=self.redelivered,
+                exchange=self.exchange,
+                routing_key=self.routing_key,
+            ),
+            header=ContentHeader(body_size=len(self.body), properties=self.properties),
+            body=self.body,
+            channel=channel,  # type: ignore
+        )
+
+
+class MemoryConsumer:
+
+    def __init__(
+            self,
+            tag: str,
+            queue: 'QueueState',
+            channel: 'MemoryChannel',
+            callback: Callback,
+            no_ack: bool,
+    ):
+        self.tag: str = tag
+        self.queue: 'QueueState' = queue
+        self.channel: 'MemoryChannel' = channel
+        self.callback: Callback = callback
+        self.no_ack: bool = no_ack
+        self.unacked: int = 0
+
+    def has_capacity(self) -> bool:
+        prefetch_count = self.channel.prefetch_count
+        return self.no_ack or not prefetch_count or self.unacked < prefetch_count
+
+    def settle(self) -> None:
+        self.unacked -= 1
+        self.queue.dispatch()
+
+
+class QueueState:
+
+    def __init__(
+            self,
+            broker: 'MemoryBroker',
+            name: str,
+            arguments: Dict[str, Any],
+            auto_delete: bool = False,
+            owner: Optional['MemoryConnection'] = None,
+    ):
+        self.broker: 'MemoryBroker' = broker
+        self.name: str = name
+        self.arguments: Dict[str, Any] = arguments
+        self.auto_delete: bool = auto_delete
+        self.owner: Optional['MemoryConnection'] = owner
+        self.max_priority: Optional[int] = arguments.get('x-max-priority')
+        self.consumers: List[MemoryConsumer] = []
+        self._turn: int = 0
+        self._seq = count()
+        # Priority queues are heaps of `(-priority, seq, envelope)`
+        self._heap: List[Tuple[int, int, Envelope]] = []
+        self._deque: Deque[Envelope] = deque()
+
+    def __len__(self) -> int:
+        return len(self._heap) + len(self._deque)
+
+    def put(self, envelope: Envelope, front: bool = False) -> None:
+        if self.max_priority is None:
+            if front:
+                self._deque.appendleft(envelope)
+            else:
+                self._deque.append(envelope)
+        else:
+            priority = min(envelope.properties.priority or 0, self.max_priority)
+            seq = next(self._seq)
+            heapq.heappush(self._heap, (-priority, -seq if front else seq, envelope))
+        self.dispatch()
+
+    def pop(self) -> Optional[Envelope]:
+        while len(self):
+            if self.max_priority is None:
+                envelope = self._deque.popleft()
+            else:
+                envelope = heapq.heappop(self._heap)[2]
+            if envelope.expires_at is not None and envelope.expires_at <= monotonic():
+                self.dead_letter(envelope, 'expired')
+                continue
+            return envelope
+        return None
+
+    def purge(self) -> int:
+        purged = len(self)
+        self._heap.clear()
+        self._deque.clear()
+        return purged
+
+    def dispatch(self) -> None:
+        while len(self):
+            consumer = self._next_consumer()
+            if consumer is None:
+                return
+            envelope = self.pop()
+            if envelope is None:
+                return
+            consumer.channel.deliver(consumer, envelope)
+
+    def _next_consumer(self) -> Optional[MemoryConsumer]:
+        for _ in range(len(self.consumers)):
+            consumer = self.consumers[self._turn % len(self.consumers)]
+            self._turn += 1
+            if consumer.has_capacity():
+                return consumer
+        return None
+
+    def dead_letter(self, envelope: Envelope, reason: str) -> None:
+        exchange = self.arguments.get('x-dead-letter-exchange')
+        if exchange is None:
+            return
+        routing_key = self.arguments.get('x-dead-letter-routing-key') or envelope.routing_key
+        self.broker.publish(exchange, routing_key, envelope.dead(self.name, reason))
+
+    def remove_consumer(self, consumer: MemoryConsumer) -> None:
+        if consumer in self.consumers:
+            self.consumers.remove(consumer)
+        if self.auto_delete and not self.consumers:
+            self.broker.delete_queue(self.name)
+
+
+class ExchangeState:
+
+    def __init__(self, name: str, type_: ExchangeType):
+        self.name: str = name
+        self.type: ExchangeType = type_
+        # Routing key -> name -> bound queue
+        self.bindings: Dict[str, Dict[str, QueueState]] = {}
+
+    def bind(self, queue: QueueState, routing_key: str) -> None:
+        self.bindings.setdefault(routing_key, {})[queue.name] = queue
+
+    def unbind(self, queue_name: str, routing_key: Optional[str] = None) -> None:
+        keys = list(self.bindings) if routing_key is None else [routing_key]
+        for key in keys:
+            bound = self.bindings.get(key, {})
+            bound.pop(queue_name, None)
+            if not bound:
+                self.bindings.pop(key, None)
+
+    def route(self, routing_key: str) -> List[QueueState]:
+        if self.type == ExchangeType.DIRECT:
+            return list(self.bindings.get(routing_key, {}).values())
+        routed: Dict[str, QueueState] = {}
+        for key, bound in self.bindings.items():
+            if self.type == ExchangeType.FANOUT or topic_matches(key, routing_key):
+                routed.update(bound)
+        return list(routed.values())
+
+
+class MemoryBroker:
+
+    def __init__(self, name: str = ''):
+        self.name: str = name
+        self.exchanges: Dict[str, ExchangeState] = {'': ExchangeState('', ExchangeType.DIRECT)}
+        self.queues: Dict[str, QueueState] = {}
+        # Generated names of queues and consumer tags
+        self.tags = count(1)
+
+    def declare_exchange(self, name: str, type_: ExchangeType, passive: bool) -> ExchangeState:
+        exchange = self.exchanges.get(name)
+        if exchange is None:
+            if passive:
+                raise ChannelNotFoundEntity(f"Exchange `{name}` is not declared")
+            if type_ not in SUPPORTED_EXCHANGE_TYPES:
+                raise NotImplementedError(f"Exchange type `{type_.value}` is not supported")
+            exchange = self.exchanges[name] = ExchangeState(name, type_)
+        elif exchange.type != type_ and not passive:
+            raise ChannelPreconditionFailed(f"Exchange `{name}` is declared with another type")
+        return exchange
+
+    def declare_queue(
+            self,
+            name: str,
+            arguments: Dict[str, Any],
+            passive: bool,
+            auto_delete: bool,
+            owner: Optional['MemoryConnection'],
+    ) -> QueueState:
+        queue = self.queues.get(name)
+        if queue is None:
+            if passive:
+                raise ChannelNotFoundEntity(f"Queue `{name}` is not declared")
+            queue = self.queues[name] = QueueState(self, name, arguments, auto_delete, owner)
+        return queue
+
+    def delete_queue(self, name: str) -> None:
+        self.queues.pop(name, None)
+        for exchange in self.exchanges.values():
+            exchange.unbind(name)
+
+    def publish(self, exchange_name: str, routing_key: str, envelope: Envelope) -> bool:
+        if exchange_name == '':
+            # Default exchange routes to queue with name equal to routing key
+            queue = self.queues.get(routing_key)
+            queues = [queue] if queue is not None else []
+        else:
+            if exchange_name not in self.exchanges:
+                raise ChannelNotFoundEntity(f"Exchange `{exchange_name}` is not declared")
+            queues = self.exchanges[exchange_name].route(routing_key)
+        for queue in queues:
+            queue.put(envelope)
+        return bool(queues)
+
+
+class MemoryExchange:
+
+    def __init__(self, channel: 'MemoryChannel', state: ExchangeState, internal: bool = False):
+        self.channel: 'MemoryChannel' = channel
+        self.name: str = state.name
+        self.type: ExchangeType = state.type
+        self.internal: bool = internal
+
+    async def publish(
+            self,
+            message: AbstractMessage,
+            routing_key: str,
+            *,
+            mandatory: bool = True,
+            immediate: bool = False,
+            timeout: Optional[float] = None,
+    ) -> Optional[Union[Basic.Ack, Basic.Return]]:
+        if self.internal:
+            raise ValueError(f"Can not publish to internal exchange: '{self.name}'!")
+        self.channel.ensure_open()
+        properties = message.properties
+        # Broker gets a copy of headers, as if they were serialized
+        properties.headers = dict(properties.headers or {})
+        envelope = Envelope(message.body, properties, self.name, routing_key)
+        routed = self.channel.connection.broker.publish(self.name, routing_key, envelope)
+        if not self.channel.publisher_confirms:
+            return None
+        if not routed and mandatory:
+            returned = DeliveredMessage(
+                delivery=Basic.Return(NO_ROUTE, 'NO_ROUTE', self.name, routing_key),
+                header=ContentHeader(body_size=len(envelope.body), properties=envelope.properties),
+                body=envelope.body,
+                channel=self.channel,  # type: ignore
+            )
+            if self.channel.on_return_raises:
+                raise PublishError(returned, returned.delivery)
+            # Returned message is given to return callbacks and to the publisher
+            self.channel.return_callbacks(IncomingMessage(returned, no_ack=True))
+            return returned  # type: ignore
+        return Basic.Ack(delivery_tag=next(self.channel.confirmations))
+
+    def __repr__(self) -> str:
+        return f"<MemoryExchange({self.name}): type={self.type.value}>"
+
+
+class MemoryQueue:
+
+    def __init__(self, channel: 'MemoryChannel', state: QueueState):
+        self.channel: 'MemoryChannel' = channel
+        self.name: str = state.name
+        self._state: QueueState = state
+
+    async def bind(
+            self,
+            exchange: Union[MemoryExchange, str],
+            routing_key: Optional[str] = None,
+            *,
+            arguments: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None,
+    ) -> Basic.Ack:
+        exchange_name = exchange if isinstance(exchange, str) else exchange.name
+        if exchange_name not in self.channel.connection.broker.exchanges:
+            raise ChannelNotFoundEntity(f"Exchange `{exchange_name}` is not declared")
+        if routing_key is None:
+            routing_key = self.name
+        self.channel.connection.broker.exchanges[exchange_name].bind(self._state, routing_key)
+        return Basic.Ack()
+
+    async def unbind(
+            self,
+            exchange: Union[MemoryExchange, str],
+            routing_key: Optional[str] = None,
+            arguments: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None,
+    ) -> None:
+        exchange_name = exchange if isinstance(exchange, str) else exchange.name
+        exchange_state = self.channel.connection.broker.exchanges.get(exchange_name)
+        if exchange_state is not None:
+            exchange_state.unbind(self.name, self.name if routing_key is None else routing_key)
+
+    async def consume(
+            self,
+            callback: Callback,
+            no_ack: bool = False,
+            exclusive: bool = False,
+            arguments: Optional[Dict[str, Any]] = None,
+            consumer_tag: Optional[str] = None,
+            timeout: Optional[float] = None,
+    ) -> str:
+        self.channel.ensure_open()
+        if exclusive and self._state.consumers:
+            raise ChannelPreconditionFailed(f"Queue `{self.name}` already has consumers")
+        if consumer_tag is None:
+            consumer_tag = f'ctag-{next(self.channel.connection.broker.tags)}'
+        consumer = MemoryConsumer(consumer_tag, self._state, self.channel, callback, no_ack)
+        self.channel.consumers[consumer_tag] = consumer
+        self._state.consumers.append(consumer)
+        self._state.dispatch()
+        return consumer_tag
+
+    async def cancel(
+            self,
+            consumer_tag: str,
+            timeout: Optional[float] = None,
+            nowait: bool = False,
+    ) -> Basic.CancelOk:
+        consumer = self.channel.consumers.pop(consumer_tag, None)
+        if consumer is not None:
+            self._state.remove_consumer(consumer)
+        return Basic.CancelOk(consumer_tag=consumer_tag)
+
+    async def get(
+            self,
+            *,
+            no_ack: bool = False,
+            fail: bool = True,
+            timeout: Optional[float] = 5,
+    ) -> Optional[IncomingMessage]:
+        envelope = self._state.pop()
+        if envelope is None:
+            if fail:
+                raise QueueEmpty
+            return None
+        return self.channel.get(self._state, envelope, no_ack)
+
+    async def purge(self, no_wait: bool = False, timeout: Optional[float] = None) -> int:
+        return self._state.purge()
+
+    async def delete(
+            self,
+            *,
+            if_unused: bool = True,
+            if_empty: bool = True,
+            timeout: Optional[float] = None,
+    ) -> None:
+        if if_unused and self._state.consumers:
+            raise ChannelPreconditionFailed(f"Queue `{self.name}` is in use")
+        if if_empty and len(self._state):
+            raise ChannelPreconditionFailed(f"Queue `{self.name}` is not empty")
+        self.channel.connection.broker.delete_queue(self.name)
+
+    def __repr__(self) -> str:
+        return f"<MemoryQueue({self.name})>"
+
+
+class MemoryChannel:
+
+    def __init__(
+            self,
+            connection: 'MemoryConnection',
+            publisher_confirms: bool = True,
+            on_return_raises: bool = False,
+    ):
+        if not publisher_confirms and on_return_raises:
+            raise RuntimeError('"on_return_raises" not applicable without "publisher_confirms"')
+        self.connection: 'MemoryConnection' = connection
+        self.publisher_confirms: bool = publisher_confirms
+        self.on_return_raises: bool = on_return_raises
+        self.return_callbacks: CallbackCollection = CallbackCollection(self)
+        self.is_closed: bool = False
+        self.prefetch_count: int = 0
+        self.consumers: Dict[str, MemoryConsumer] = {}
+        self.confirmations = count(1)
+        self._delivery_tags = count(1)
+        self._unacked: Dict[int, Tuple[QueueState, Optional[MemoryConsumer], Envelope]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __await__(self):
+        return self._open().__await__()
+
+    async def _open(self) -> 'MemoryChannel':
+        return self
+
+    async def __aenter__(self) -> 'MemoryChannel':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def ensure_open(self) -> None:
+        if self.is_closed:
+            raise ChannelInvalidStateError("Channel is closed")
+
+    @property
+    def default_exchange(self) -> MemoryExchange:
+        return MemoryExchange(self, self.connection.broker.exchanges[''])
+
+    async def set_qos(
+            self,
+            prefetch_count: int = 0,
+            prefetch_size: int = 0,
+            global_: bool = False,
+            timeout: Optional[float] = None,
+            all_channels: Optional[bool] = None,
+    ) -> None:
+        self.prefetch_count = prefetch_count
+        # Raised limit lets consumers take more of the waiting messages at once
+        queues = {consumer.queue.name: consumer.queue for consumer in self.consumers.values()}
+        for queue in queues.values():
+            queue.dispatch()
+
+    async def declare_exchange(
+            self,
+            name: str,
+            type: Union[ExchangeType, str] = ExchangeType.DIRECT,
+            *,
+            durable: bool = False,
+            auto_delete: bool = False,
+            internal: bool = False,
+            passive: bool = False,
+            arguments: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None,
+    ) -> MemoryExchange:
+        self.ensure_open()
+        state = self.connection.broker.declare_exchange(name, ExchangeType(type), passive)
+        return MemoryExchange(self, state, internal)
+
+    async def declare_queue(
+            self,
+            name: Optional[str] = None,
+            *,
+            durable: bool = False,
+            exclusive: bool = False,
+            passive: bool = False,
+            auto_delete: bool = False,
+            arguments: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None,
+    ) -> MemoryQueue:
+        self.ensure_open()
+        if not name:
+            name = f'amq.gen-{next(self.connection.broker.tags)}'
+        state = self.connection.broker.declare_queue(
+            name,
+            # `None` arguments are not sent to RabbitMQ too
+            {key: value for key, value in (arguments or {}).items() if value is not None},
+            passive,
+            auto_delete,
+            self.connection if exclusive else None,
+        )
+        return MemoryQueue(self, state)
+
+    def deliver(self, consumer: MemoryConsumer, envelope: Envelope) -> None:
+        tag = next(self._delivery_tags)
+        if not consumer.no_ack:
+            consumer.unacked += 1
+            self._unacked[tag] = (consumer.queue, consumer, envelope)
+        message = IncomingMessage(envelope.delivered(self, consumer.tag, tag), consumer.no_ack)
+        # Every delivery is handled in its own task, like aiormq does
+        task = asyncio.get_running_loop().create_task(consumer.callback(message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, queue: QueueState, envelope: Envelope, no_ack: bool) -> IncomingMessage:
+        tag = next(self._delivery_tags)
+        if not no_ack:
+            self._unacked[tag] = (queue, None, envelope)
+        return IncomingMessage(envelope.delivered(self, '', tag), no_ack)
+
+    async def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        for queue, consumer, _ in self._settle(delivery_tag, multiple):
+            if consumer is not None:
+                consumer.settle()
+
+    async def basic_nack(
+            self,
+            delivery_tag: int,
+            multiple: bool = False,
+            requeue: bool = True,
+    ) -> None:
+        for queue, consumer, envelope in self._settle(delivery_tag, multiple):
+            if requeue:
+                queue.put(envelope.requeued(), front=True)
+            else:
+                queue.dead_letter(envelope, 'rejected')
+            if consumer is not None:
+                consumer.settle()
+
+    async def basic_reject(self, delivery_tag: int, *, requeue: bool = True) -> None:
+        await self.basic_nack(delivery_tag, requeue=requeue)
+
+    def _settle(
+            self,
+            delivery_tag: int,
+            multiple: bool,
+    ) -> List[Tuple[QueueState, Optional[MemoryConsumer], Envelope]]:
+        self.ensure_open()
+        if multiple:
+            tags = [tag for tag in self._unacked if tag <= delivery_tag]
+        elif delivery_tag in self._unacked:
+            tags = [delivery_tag]
+        else:
+            raise ChannelPreconditionFailed(f"Unknown delivery tag {delivery_tag}")
+        return [self._unacked.pop(tag) for tag in tags]
+
+    async def close(self, exc: Optional[BaseException] = None) -> None:
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for consumer in self.consumers.values():
+            consumer.queue.remove_consumer(consumer)
+        self.consumers.clear()
+        # Unacked messages of closed channel are redelivered to other consumers
+        for queue, _, envelope in self._unacked.values():
+            queue.put(envelope.requeued(), front=True)
+        self._unacked.clear()
+
+
+class MemoryConnection:
+
+    # Capability checked by `IncomingMessage.nack`
+    basic_nack = True
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker: MemoryBroker = broker
+        self.is_closed: bool = False
+        self.close_callbacks: CallbackCollection = CallbackCollection(self)
+        self.reconnect_callbacks: CallbackCollection = CallbackCollection(self)
+        self._channels: List[MemoryChannel] = []
+
+    def channel(
+            self,
+            channel_number: Optional[int] = None,
+            publisher_confirms: bool = True,
+            on_return_raises: bool = False,
+    ) -> MemoryChannel:
+        if self.is_closed:
+            raise RuntimeError("Connection is closed")
+        channel = MemoryChannel(self, publisher_confirms, on_return_raises)
+        self._channels.append(channel)
+        return channel
+
+    async def connect(self, timeout: Optional[float] = None) -> None:
+        pass
+
+    async def ready(self) -> None:
+        pass
+
+    async def close(self, exc: Optional[BaseException] = None) -> None:
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for channel in self._channels:
+            await channel.close()
+        for queue in list(self.broker.queues.values()):
+            if queue.owner is self:
+                self.broker.delete_queue(queue.name)
+        self.close_callbacks(exc)
+
+    async def __aenter__(self) -> 'MemoryConnection':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+
+brokers: Dict[str, MemoryBroker] = {}
+
+
+def broker(name: str = '') -> MemoryBroker:
+    if name not in brokers:
+        brokers[name] = MemoryBroker(name)
+    return brokers[name]
+
+
+async def connect(url: str, **kwargs: Any) -> MemoryConnection:
+    return MemoryConnection(broker(urlsplit(str(url)).hostname or ''))
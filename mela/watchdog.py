@@ -0,0 +1,105 @@
+"""
+Watchdog of blocking calls. Loop lag monitor stamps every wake up of the
+event loop, while helper thread checks the stamps. When the loop doesn't
+wake up longer than threshold, stack of the loop thread is captured and
+the block is attributed to the handler which is on the stack.
+"""
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import traceback
+from types import CodeType
+from types import FrameType
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+from .loop_lag import LoopLagMonitor
+from .loop_lag import loop_lag_monitor
+from .metrics import event_loop_block_duration
+from .metrics import event_loop_blocks
+from .metrics import event_loop_lag
+
+
+log = logging.getLogger('mela.watchdog')
+
+# Code objects of processor handlers, the stack is attributed by them
+handlers: Dict[CodeType, str] = {}
+
+
+def register_handler(call: Callable) -> None:
+    func = inspect.unwrap(call)
+    code = getattr(func, '__code__', None)
+    if code is not None:
+        handlers[code] = f'{func.__module__}.{func.__qualname__}'
+
+
+def attribute(frame: Optional[FrameType]) -> str:
+    """
+    Name of the innermost handler on the stack
+    """
+    while frame is not None:
+        if frame.f_code in handlers:
+            return handlers[frame.f_code]
+        frame = frame.f_back
+    return 'unknown'
+
+
+class Watchdog:
+
+    def __init__(self, threshold: float = 0.5, interval: float = 0.1):
+        self.threshold: float = threshold
+        self.interval: float = interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._monitor: Optional[LoopLagMonitor] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped: threading.Event = threading.Event()
+        # Beat of the loop which is blocked and already reported
+        self._reported_beat: Optional[float] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._monitor = loop_lag_monitor(self._loop)
+        self._monitor.start()
+        event_loop_lag.labels().set_function(lambda: self._monitor.lag)  # type: ignore
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, name='mela-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._monitor is not None:
+            self._monitor.stop()
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def check(self) -> None:
+        assert self._loop and self._monitor
+        beat = self._monitor.beat
+        if self._reported_beat is not None and beat != self._reported_beat:
+            # Loop has woken up after reported block
+            event_loop_block_duration.labels().observe(self._monitor.lag)
+            self._reported_beat = None
+        blocked = self._loop.time() - beat - self._monitor.interval
+        if beat and blocked > self.threshold and self._reported_beat is None:
+            self._reported_beat = beat
+            self._report(blocked)
+
+    def _report(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)  # type: ignore
+        handler = attribute(frame)
+        event_loop_blocks.labels(handler).inc()
+        stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+        log.warning(
+            f"Event loop is blocked for {blocked:.3f}s by `{handler}`, "
+            f"it may miss AMQP heartbeats. Blocking code:\n{stack}",
+        )
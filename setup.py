@@ -18,7 +18,7 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/alem-research/mela",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['tests', 'tests.*', 'benchmarks', 'benchmarks.*']),
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: Apache Software License",
@@ -29,5 +29,12 @@ setuptools.setup(
         ""
     ],
     python_requires='>=3.11',
-    install_requires=install_requires
+    install_requires=install_requires,
+    extras_require={
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+    },
+    entry_points={
+        'console_scripts': ['mela=mela.cli:main'],
+    },
 )
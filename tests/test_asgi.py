@@ -0,0 +1,70 @@
+import asyncio
+
+from mela import Mela
+from mela.asgi import MelaLifespan
+from mela.factories import rpc_service
+from mela.factories.core.connection import connections
+from mela.factories.publisher import publishers
+from mela.processor import Processor
+
+
+PUBLISHERS = """
+publishers:
+  reports:
+    exchange: asgi-x
+    routing_key: reports
+    queue: asgi-q
+"""
+
+RPC_SERVICES = """
+rpc-services:
+  reports:
+    exchange: asgi-rpc-x
+    routing_key: reports
+    queue: asgi-rpc-q
+    response_exchange: asgi-rpc-responses
+"""
+
+
+async def test_lifespan_closes_only_what_it_opened(settings_factory, memory_broker):
+    lifespan = MelaLifespan(Mela('test_asgi', settings_factory(PUBLISHERS)))
+    dependency = lifespan.publisher('reports')
+
+    async with lifespan(None):
+        publisher = dependency()
+        assert publisher is lifespan.publishers['reports']
+        await publisher.publish({'report': 1})
+        assert publishers['reports'] is publisher
+
+    assert lifespan.publishers == {}
+    assert 'reports' not in publishers
+    assert 'reports_w' not in connections
+    assert len(memory_broker.queues['asgi-q']) == 1
+
+
+async def test_lifespan_drains_calls_to_running_handler(settings_factory):
+    app = Mela('test_asgi_rpc', settings_factory(RPC_SERVICES))
+    server = await rpc_service(app.settings.rpc_services['reports'])
+    handled = []
+
+    async def handler(report: int):
+        await asyncio.sleep(0.05)
+        handled.append(report)
+        return {'report': report}
+
+    server.set_processor(Processor(handler))
+    await server.consume()
+    lifespan = MelaLifespan(app, publishers=[], rpc_clients=['reports'])
+
+    async with lifespan(None):
+        client = lifespan.rpc_client('reports')()
+        call = asyncio.create_task(client.call({'report': 1}))
+        await asyncio.sleep(0.01)
+        # Shutdown waits for the handler which is still running
+        assert handled == []
+
+    assert call.done()
+    assert call.result() == {'report': 1}
+    # Connections of the server are not closed by the lifespan
+    assert not connections['reports_service_r'].is_closed
+    await server.cancel()
@@ -0,0 +1,53 @@
+import io
+
+from mela.bench import LoadGenerator
+from mela.bench import Record
+from mela.bench import read_records
+from mela.bench import write_record
+from mela.cli import main
+
+
+PUBLISHERS = """
+publishers:
+  load:
+    exchange: bench-x
+    routing_key: bench
+    queue: bench-q
+"""
+
+
+def test_recording_round_trip():
+    stream = io.BytesIO()
+    write_record(stream, Record(b'{"a": 1}', 'key', {'x-h': 1}, 'application/json', 0.5))
+    write_record(stream, Record(b'', offset=1.0))
+    stream.seek(0)
+
+    first, second = read_records(stream)
+
+    assert (first.body, first.routing_key, first.headers, first.offset) == (
+        b'{"a": 1}', 'key', {'x-h': 1}, 0.5,
+    )
+    assert (second.body, second.routing_key) == (b'', None)
+
+
+async def test_load_generator_sends_count_with_concurrency():
+    sent = []
+
+    async def send(record):
+        sent.append(record.body)
+        if len(sent) % 5 == 0:
+            raise ValueError
+
+    records = [Record(b'1'), Record(b'2')]
+    stats = await LoadGenerator(send, records, concurrency=3, count=20).run()
+
+    assert len(sent) == 20
+    assert set(sent) == {b'1', b'2'}
+    assert (len(stats.latencies), stats.errors) == (16, 4)
+
+
+def test_bench_publisher_command(settings_file, settings_factory, capsys):
+    settings_factory(PUBLISHERS)
+    main(['--config', str(settings_file), 'bench', 'publisher', 'load', '--count', '50'])
+
+    assert capsys.readouterr().out.startswith('50 sent, 0 failed')
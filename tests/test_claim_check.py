@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from mela import IncomingMessage
+from mela.claim_check import CLAIM_CHECK_HEADER
+from mela.claim_check import FileBlobStore
+from mela.claim_check import load_body
+from mela.components import NackMessageError
+from mela.factories import consumer
+from mela.factories import publisher
+from mela.factories.consumer import consumers
+from mela.factories.core.connection import close_connections
+from mela.factories.publisher import publishers
+from mela.processor import Processor
+from mela.settings import BlobStoreParams
+from mela.settings import ClaimCheckParams
+from mela.settings import ConsumerParams
+from mela.settings import ExchangeParams
+from mela.settings import PublisherParams
+from mela.settings import QueueParams
+from mela.settings import URLConnectionParams
+
+
+def test_file_blob_store_round_trip(tmp_path):
+    store = FileBlobStore(str(tmp_path))
+    key = store.put(b'large body')
+
+    assert bytes(store.get(key)) == b'large body'
+    store.delete(key)
+    assert not (tmp_path / key[:2] / key).exists()
+
+
+@pytest.fixture
+async def claim_checked_pair(tmp_path):
+    names = []
+
+    async def factory(name, lazy=False, dead_letter_exchange=None):
+        connection = URLConnectionParams(url=f'memory://{name}')
+        exchange = ExchangeParams(name=f'{name}-x')
+        queue = QueueParams(name=f'{name}-q', dead_letter_exchange=dead_letter_exchange)
+        store = BlobStoreParams(name=name, path=str(tmp_path))
+        names.extend([f'{name}_publisher', f'{name}_consumer'])
+        publisher_ = await publisher(PublisherParams(
+            name=f'{name}_publisher',
+            connection=connection,
+            exchange=exchange,
+            routing_key=name,
+            queue=queue,
+            claim_check=ClaimCheckParams(store=store, threshold=32),
+        ))
+        consumer_ = await consumer(ConsumerParams(
+            name=f'{name}_consumer',
+            connection=connection,
+            exchange=exchange,
+            routing_key=name,
+            queue=queue,
+            claim_check=ClaimCheckParams(store=store, lazy=lazy),
+        ))
+        return publisher_, consumer_
+
+    yield factory
+    for name in names:
+        publishers.pop(name, None)
+        consumers.pop(name, None)
+        await close_connections(name)
+
+
+async def test_large_body_is_offloaded_and_resolved(tmp_path, claim_checked_pair):
+    publisher_, consumer_ = await claim_checked_pair('test_claim_check')
+    received = asyncio.Queue()
+
+    async def handler(text: str, message: IncomingMessage):
+        key = message.headers.get(CLAIM_CHECK_HEADER)
+        await received.put((text, key, key is not None and (tmp_path / key[:2] / key).exists()))
+
+    consumer_.set_processor(Processor(handler))
+    await consumer_.consume()
+    await publisher_.publish({'text': 'small'})
+    await publisher_.publish({'text': 'x' * 100})
+
+    assert await received.get() == ('small', None, False)
+    text, key, stored = await received.get()
+    assert text == 'x' * 100
+    assert stored is True
+    # Blob is deleted when the message is acked
+    assert await is_deleted(tmp_path / key[:2] / key)
+
+
+async def is_deleted(blob) -> bool:
+    for _ in range(100):
+        if not blob.exists():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+@pytest.mark.parametrize('dead_letter_exchange,deleted', [
+    (None, True),
+    (ExchangeParams(name='claim-check-dead-x'), False),
+])
+async def test_blob_of_rejected_message_is_deleted_unless_dead_lettered(
+        tmp_path,
+        claim_checked_pair,
+        dead_letter_exchange,
+        deleted,
+):
+    publisher_, consumer_ = await claim_checked_pair(
+        f'test_rejected_claim_check_{deleted}',
+        dead_letter_exchange=dead_letter_exchange,
+    )
+    rejected = asyncio.Queue()
+
+    async def handler(text: str, message: IncomingMessage):
+        await rejected.put(message.headers[CLAIM_CHECK_HEADER])
+        raise NackMessageError("Message is rejected", requeue=False)
+
+    consumer_.set_processor(Processor(handler))
+    await consumer_.consume()
+    await publisher_.publish({'text': 'x' * 100})
+    key = await rejected.get()
+
+    assert await is_deleted(tmp_path / key[:2] / key) is deleted
+
+
+async def test_lazy_claim_check_loads_body_on_demand(claim_checked_pair):
+    publisher_, consumer_ = await claim_checked_pair('test_lazy_claim_check', lazy=True)
+    received = asyncio.Queue()
+
+    async def handler(size: int, message: IncomingMessage):
+        await received.put((size, bytes(await load_body(message))))
+
+    consumer_.set_processor(Processor(handler))
+    await consumer_.consume()
+    await publisher_.publish({'text': 'x' * 100})
+
+    size, body = await received.get()
+    assert size == len(body)
+    assert body == b'{"text": "' + b'x' * 100 + b'"}'
@@ -0,0 +1,70 @@
+import pytest
+from aio_pika import RobustConnection
+from aio_pika.connection import Connection
+
+from mela.settings import ClusterConnectionParams
+from mela.transport import connect
+from mela.transport import transports
+from mela.transport.cluster import ClusterLink
+from mela.transport.cluster import get_cluster
+
+
+async def unreachable(url: str, **kwargs):
+    raise ConnectionRefusedError(url)
+
+
+@pytest.fixture(autouse=True)
+def failing_transport():
+    transports['failing'] = unreachable
+    yield
+    transports.pop('failing')
+
+
+def params(*nodes: str, **kwargs) -> dict:
+    return ClusterConnectionParams(nodes=list(nodes), **kwargs).get_params_dict()
+
+
+async def test_failed_node_is_excluded_and_lost_connection_moves():
+    # Settings allow only broker URLs, so failing transport is given directly
+    connection = await connect(nodes=['failing://a', 'memory://cluster_b', 'memory://cluster_c'])
+    assert connection.broker.name == 'cluster_b'
+
+    await connection.close(ConnectionResetError())
+    # Robust connection reconnects to the url
+    assert str(connection.url) == 'memory://cluster_c'
+    with pytest.raises(ConnectionError):
+        await connect(nodes=['failing://a', 'failing://b'])
+
+
+async def test_connections_are_spread_and_rotated():
+    spread = params('memory://spread_a', 'memory://spread_b', policy='spread')
+    connections = [await connect(**spread) for _ in range(3)]
+    assert [c.broker.name for c in connections] == ['spread_a', 'spread_b', 'spread_a']
+    await connections[1].close()
+    assert (await connect(**spread)).broker.name == 'spread_b'
+
+    rotated = params('memory://rr_a', 'memory://rr_b', policy='round_robin')
+    names = [(await connect(**rotated)).broker.name for _ in range(4)]
+    assert names == ['rr_a', 'rr_b', 'rr_a', 'rr_b']
+
+
+async def test_reconnect_moves_on_while_nodes_are_down():
+    nodes = ['amqp://127.0.0.1:1', 'amqp://127.0.0.1:2', 'amqp://127.0.0.1:3']
+    cluster = get_cluster(nodes, 'prefer_local', 30.0)
+    connection = RobustConnection(nodes[0])
+    link = ClusterLink(cluster, connection, nodes[0])
+
+    # Attempts are made as robust connection reconnects, nothing listens on the ports
+    for node in nodes[:2]:
+        assert str(connection.url) == node
+        with pytest.raises(ConnectionError):
+            await Connection.connect(connection, 1)
+    assert str(connection.url) == nodes[2]
+    assert [cluster.is_excluded(node) for node in nodes] == [True, True, False]
+    assert cluster.connections[nodes[0]] == 0 and cluster.connections[nodes[1]] == 0
+
+    with pytest.raises(ConnectionError):
+        await Connection.connect(connection, 1)
+    # All the nodes are down, the one excluded first is tried again
+    assert link.node == str(connection.url) == nodes[0]
+    await connection.close()
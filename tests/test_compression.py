@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+
+from aio_pika import Message
+
+from mela import IncomingMessage
+from mela.compression import DICTIONARY_HEADER
+from mela.compression import EXECUTOR_SIZE
+from mela.compression import Compressor
+from mela.compression import decompress_body
+from mela.compression import train_dictionary
+from mela.factories import consumer
+from mela.factories import publisher
+from mela.factories.consumer import consumers
+from mela.factories.core.connection import close_connections
+from mela.factories.publisher import publishers
+from mela.processor import Processor
+from mela.settings import CompressionParams
+from mela.settings import ConsumerParams
+from mela.settings import ExchangeParams
+from mela.settings import PublisherParams
+from mela.settings import QueueParams
+from mela.settings import URLConnectionParams
+
+
+def sample(i):
+    return json.dumps({'user_id': i, 'event': 'page_view', 'path': f'/items/{i}'}).encode()
+
+
+async def test_small_and_incompressible_bodies_are_sent_as_is():
+    compressor = Compressor('gzip', min_size=16)
+
+    assert (await compressor.compress(Message(b'{}'))).content_encoding is None
+    assert (await compressor.compress(Message(bytes(range(200))))).content_encoding is None
+    message = await compressor.compress(Message(b'x' * 100))
+    assert message.content_encoding == 'gzip'
+    assert await decompress_body(message, message.body) == b'x' * 100
+
+
+async def test_dictionary_compresses_small_messages(tmp_path):
+    path = tmp_path / 'messages.dict'
+    path.write_bytes(train_dictionary([sample(i) for i in range(100)], 'deflate'))
+    plain = Compressor('deflate', min_size=0)
+    trained = Compressor('deflate', min_size=0, dictionary=str(path))
+
+    message = await trained.compress(Message(sample(1000)))
+    assert len(message.body) < len((await plain.compress(Message(sample(1000)))).body)
+    assert message.headers[DICTIONARY_HEADER] == trained.dictionary_id
+    assert await decompress_body(message, message.body) == sample(1000)
+
+
+async def test_large_bodies_are_compressed_in_worker_thread():
+    compressor = Compressor('gzip')
+    compress = compressor._compress
+    threads = []
+
+    def tracked(data):
+        threads.append(threading.get_ident())
+        return compress(data)
+
+    compressor._compress = tracked
+    await compressor.compress(Message(b'x' * 1024))
+    message = await compressor.compress(Message(b'x' * EXECUTOR_SIZE))
+
+    assert threads[0] == threading.get_ident()
+    assert threads[1] != threading.get_ident()
+    assert await decompress_body(message, message.body) == b'x' * EXECUTOR_SIZE
+
+
+async def test_consumer_decompresses_before_processing():
+    connection = URLConnectionParams(url='memory://test_compression')
+    exchange = ExchangeParams(name='compression-x')
+    queue = QueueParams(name='compression-q')
+    publisher_ = await publisher(PublisherParams(
+        name='test_compression_publisher',
+        connection=connection,
+        exchange=exchange,
+        routing_key='compression',
+        queue=queue,
+        compression=CompressionParams(codec='gzip', min_size=32),
+    ))
+    consumer_ = await consumer(ConsumerParams(
+        name='test_compression_consumer',
+        connection=connection,
+        exchange=exchange,
+        routing_key='compression',
+        queue=queue,
+        decompress=True,
+    ))
+    received = asyncio.Queue()
+
+    async def handler(text: str, message: IncomingMessage):
+        await received.put((text, message.body_size))
+
+    try:
+        consumer_.set_processor(Processor(handler))
+        await consumer_.consume()
+        await publisher_.publish({'text': 'x' * 1000})
+
+        text, size = await received.get()
+        assert text == 'x' * 1000
+        assert size == len(json.dumps({'text': text}))
+    finally:
+        for instance, registry in ((publisher_, publishers), (consumer_, consumers)):
+            registry.pop(instance.name, None)
+            await close_connections(instance.name)
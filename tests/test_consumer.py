@@ -0,0 +1,277 @@
+import asyncio
+import logging
+from time import time
+
+import pytest
+from aio_pika import Message
+from pydantic import ValidationError
+
+from mela.components import Consumer
+from mela.components.load_shedding import LoadShedder
+from mela.deadline import DEADLINE_HEADER
+from mela.deadline import current_deadline
+from mela.deadline import stamp_deadline
+from mela.factories import rpc_service
+from mela.factories.core.connection import close_all_connections
+from mela.middleware import Middleware
+from mela.processor import Processor
+from mela.profiling import SamplingProfiler
+from mela.profiling import current_profile
+from mela.settings import ConsumerParams
+from mela.settings import QueueParams
+
+
+RPC_SERVICES = """
+rpc-services:
+  slow:
+    exchange: expired-rpc-x
+    routing_key: slow
+    queue: expired-rpc-q
+    response_exchange: expired-rpc-responses
+    drop_expired: true
+"""
+
+
+class FailingAfterDecode(Middleware):
+
+    async def after_decode(self, message, params):
+        raise ValueError("Handler is not reached")
+
+
+async def test_prioritized_consumer_handles_urgent_messages_first(incoming_message_factory):
+    consumer_ = Consumer('test_prioritized', prefetch_count=10, prioritize=True, concurrency=1)
+    handled = []
+    release = asyncio.Event()
+
+    async def callback(message):
+        await release.wait()
+        handled.append(message.body)
+
+    consumer_.set_callback(callback)
+    consumer_._scheduler.start()
+    await consumer_._callback(incoming_message_factory('first'))
+    # Let the only worker take the first message
+    await asyncio.sleep(0)
+    for body, priority in [('bulk', 1), ('urgent', 9), ('normal', 5)]:
+        await consumer_._callback(incoming_message_factory(body, priority=priority))
+    await asyncio.sleep(0)
+    release.set()
+    await consumer_._scheduler.stop()
+
+    assert handled == ['first', 'urgent', 'normal', 'bulk']
+
+
+def test_queue_max_priority_argument():
+    params = QueueParams(name='test_priority_q', max_priority=10)
+    assert params.get_params_dict()['arguments'] == {'x-max-priority': 10}
+
+
+async def test_consumer_drops_expired_messages(incoming_message_factory):
+    consumer_ = Consumer('test_expired', drop_expired=True)
+    handled = []
+
+    async def callback(message):
+        handled.append(message.body)
+        assert current_deadline.get() == message.headers.get(DEADLINE_HEADER)
+
+    consumer_.set_callback(callback)
+    expired = incoming_message_factory('expired', headers={DEADLINE_HEADER: time() - 1})
+    await consumer_._callback(expired)
+    alive = incoming_message_factory('alive', headers={DEADLINE_HEADER: time() + 60})
+    await consumer_._callback(alive)
+    await consumer_._callback(incoming_message_factory('eternal'))
+
+    assert handled == ['alive', 'eternal']
+    assert expired.nacked is True
+    assert consumer_.metrics.nacked('expired').value == 1
+
+
+async def test_consumer_keeps_expired_messages_by_default(incoming_message_factory):
+    consumer_ = Consumer('test_keeps_expired')
+    handled = []
+
+    async def callback(message):
+        handled.append(message.body)
+        # Deadlines are not even read
+        assert current_deadline.get() is None
+
+    consumer_.set_callback(callback)
+    expired = incoming_message_factory('expired', headers={DEADLINE_HEADER: time() - 1})
+    await consumer_._callback(expired)
+
+    assert handled == ['expired']
+    assert expired.nacked is False
+    # Consumer without metrics, compression and deadline checks calls callback directly
+    assert consumer_._callback is callback
+
+
+async def test_rpc_server_skips_requests_of_callers_who_gave_up(settings_factory):
+    server = await rpc_service(settings_factory(RPC_SERVICES).rpc_services['slow'])
+    handled = []
+
+    async def handler(job: int):
+        await asyncio.sleep(0.05)
+        handled.append(job)
+        return {'job': job}
+
+    server.set_processor(Processor(handler))
+    await server.consume()
+    try:
+        first = asyncio.create_task(server.client.call({'job': 1}))
+        await asyncio.sleep(0.01)
+        # Worker is busy with the first request until the second caller times out
+        with pytest.raises(asyncio.TimeoutError):
+            await server.client.call({'job': 2}, timeout=0.01)
+        assert await first == {'job': 1}
+        expired = server._worker.metrics.nacked('expired')
+        for _ in range(100):
+            if expired.value:
+                break
+            await asyncio.sleep(0.01)
+
+        assert expired.value == 1
+        assert handled == [1]
+    finally:
+        await server.cancel()
+        await close_all_connections()
+
+
+def test_deadline_is_inherited_on_demand():
+    token = current_deadline.set(time() + 5)
+    try:
+        assert stamp_deadline(Message(b'')) is None
+        assert stamp_deadline(Message(b''), inherit=True) == current_deadline.get()
+    finally:
+        current_deadline.reset(token)
+
+
+def test_stamp_earliest_deadline():
+    message = Message(b'', expiration=10)
+    assert stamp_deadline(message) <= time() + 10
+    deadline = time() + 5
+    assert stamp_deadline(message, deadline) == deadline
+    assert message.headers[DEADLINE_HEADER] == deadline
+    assert stamp_deadline(message, deadline + 5) == deadline
+    assert stamp_deadline(Message(b'')) is None
+
+
+async def test_overloaded_consumer_sheds_delayed_messages(incoming_message_factory):
+    consumer_ = Consumer(
+        'test_shedding',
+        prefetch_count=10,
+        prioritize=True,
+        load_shedder=LoadShedder(max_queue_delay=0.01, protected_priority=5),
+    )
+    handled = []
+
+    async def callback(message):
+        await asyncio.sleep(0.02)
+        handled.append(message.body)
+
+    consumer_.set_callback(callback)
+    consumer_._scheduler.start()
+    messages = [
+        incoming_message_factory('first'),
+        incoming_message_factory('urgent', priority=5),
+        incoming_message_factory('bulk', priority=1),
+    ]
+    for message in messages:
+        await consumer_._callback(message)
+        await asyncio.sleep(0)
+    await consumer_._scheduler.stop()
+
+    assert handled == ['first', 'urgent']
+    assert messages[2].nacked is True
+    assert consumer_.metrics.nacked('shed').value == 1
+
+
+async def test_shed_message_is_requeued_without_holding_handler(incoming_message_factory):
+    shedder = LoadShedder(max_queue_delay=0.01, requeue=True, requeue_pause=60)
+    nacked = []
+
+    async def nack(message, requeue, reason):
+        nacked.append((message.body, requeue, reason))
+
+    async def callback(message):
+        raise AssertionError("Shed message is handled")
+
+    guarded = shedder.guard(callback, logging.getLogger('test_shedding'), nack)
+    message = incoming_message_factory('late')
+    # Message waited for a handler since loop start
+    shedder._arrivals[id(message)] = 0.0
+    await asyncio.wait_for(guarded(message), 1)
+    assert nacked == []
+
+    shedder.stop()
+    await asyncio.sleep(0)
+    assert nacked == [('late', True, 'shed')]
+
+
+def test_queue_delay_requires_prioritize():
+    with pytest.raises(ValidationError):
+        ConsumerParams(
+            exchange='x',
+            routing_key='key',
+            queue='q',
+            load_shedding={'max_queue_delay': 0.1},
+        )
+
+
+async def test_profiler_samples_sync_and_async_handlers(tmp_path, incoming_message_factory):
+    def sync_handler(value: int):
+        return {'value': value}
+
+    async def async_handler(value: int):
+        return {'value': value}
+
+    for handler in (sync_handler, async_handler):
+        output = str(tmp_path / handler.__name__)
+        profiler = SamplingProfiler(handler.__name__, sample_rate=1, output=output)
+        consumer_ = Consumer(f'test_{handler.__name__}', profiler=profiler)
+        consumer_.set_processor(Processor(handler))
+        message = incoming_message_factory(b'{"value": 1}')
+        await consumer_._callback(message)
+        profiler.dump()
+
+        assert message.acked is True
+        assert profiler.samples == 1
+        assert handler.__name__ in profiler.report()
+        assert (tmp_path / handler.__name__).exists()
+
+
+async def test_profiler_samples_one_invocation_at_a_time(incoming_message_factory):
+    release = asyncio.Event()
+
+    async def handler(value: int):
+        await release.wait()
+        return {'value': value}
+
+    profiler = SamplingProfiler('overlapping', sample_rate=1)
+    consumer_ = Consumer('test_profiler_overlapping', profiler=profiler)
+    consumer_.set_processor(Processor(handler))
+    messages = [incoming_message_factory(b'{"value": 1}') for _ in range(3)]
+    handling = [asyncio.create_task(consumer_._callback(message)) for message in messages]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*handling)
+
+    assert all(message.acked for message in messages)
+    assert profiler.samples == 1
+
+
+async def test_profiler_is_released_if_handler_is_not_reached(incoming_message_factory):
+    async def handler(value: int):
+        return {'value': value}
+
+    profiler = SamplingProfiler('unreached', sample_rate=1)
+    processor = Processor(handler, middlewares=[FailingAfterDecode()])
+    processor.use_middlewares()
+    consumer_ = Consumer('test_profiler_unreached', profiler=profiler)
+    consumer_.set_processor(processor)
+    broken = incoming_message_factory(b'{"value": 1}')
+    await consumer_._callback(broken)
+
+    assert broken.nacked is True
+    assert current_profile.get() is None
+    assert profiler.sample() is not None
+    profiler.release()
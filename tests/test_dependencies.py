@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+import pytest
+from pydantic import BaseModel
+
+from mela.dependencies import shutdown_dependencies
+from mela.processor import Processor
+from mela.scheme import MelaScheme
+
+
+class Pool:
+
+    def __init__(self):
+        self.closed = False
+
+
+class Session:
+    pass
+
+
+class Limits(BaseModel):
+    limit: int = 10
+
+
+class Order(BaseModel):
+    order_id: int
+
+
+class FakeComponent:
+    log = logging.getLogger('test_dependencies')
+
+
+@pytest.fixture
+def scheme():
+    return MelaScheme('test_dependencies')
+
+
+async def prepare(processor, scheme_):
+    processor.cache_static_params(FakeComponent(), scheme_)
+    await processor.solve_requirements(None)
+
+
+async def test_dependency_is_created_once_and_shut_down(scheme, incoming_message_factory):
+    created = []
+
+    def handler(value: int, pool: Pool):
+        return {'value': value, 'pool': id(pool)}
+
+    # Dependency registered after the handler is injected too
+    processor = Processor(handler)
+
+    @scheme.dependency
+    async def pool() -> AsyncIterator[Pool]:
+        await asyncio.sleep(0.01)
+        instance = Pool()
+        created.append(instance)
+        yield instance
+        instance.closed = True
+
+    other = Processor(handler)
+    await asyncio.gather(prepare(processor, scheme), prepare(other, scheme))
+
+    assert len(created) == 1
+    assert await processor(value=1) == {'value': 1, 'pool': id(created[0])}
+    assert await other.process(incoming_message_factory(b'{"value": 2}'))
+    await shutdown_dependencies(scheme.dependencies.values())
+    assert created[0].closed
+
+
+async def test_dependency_type_can_be_given_explicitly(scheme):
+
+    @scheme.dependency(type_=Session)
+    def session():
+        return Session()
+
+    async def handler(session: Session):
+        return session
+
+    processor = Processor(handler)
+    await prepare(processor, scheme)
+
+    assert isinstance(await processor(), Session)
+    with pytest.raises(KeyError):
+        scheme.dependency(session, type_=Session)
+    await shutdown_dependencies(scheme.dependencies.values())
+
+
+async def test_dependencies_belong_to_their_scheme():
+    first = MelaScheme('test_dependencies_first')
+    second = MelaScheme('test_dependencies_second')
+
+    @first.dependency
+    def pool() -> Pool:
+        return Pool()
+
+    @second.dependency
+    def other_pool() -> Pool:
+        return Pool()
+
+    async def handler(pool: Pool):
+        return pool
+
+    processor = Processor(handler)
+    await prepare(processor, first)
+    assert await processor() is first.dependencies[Pool].instance
+
+    with pytest.raises(KeyError):
+        first.merge(second)
+    app = MelaScheme('test_dependencies_app').merge(first)
+    assert app.dependencies[Pool] is first.dependencies[Pool]
+    await shutdown_dependencies(first.dependencies.values())
+
+
+async def test_dependency_of_model_type_is_not_parsed_from_message(
+        scheme,
+        incoming_message_factory,
+):
+    # Handler which is registered before the dependency gets it too
+    def late(order_id: int, limits: Limits):
+        return {'order_id': order_id, 'limit': limits.limit}
+
+    late_processor = Processor(late)
+
+    @scheme.dependency
+    def limits() -> Limits:
+        return Limits()
+
+    @scheme.consumer('orders')
+    def handler(order: Order, limits: Limits):
+        return {'order_id': order.order_id, 'limit': limits.limit}
+
+    for processor in (handler, late_processor):
+        await prepare(processor, scheme)
+        message, _ = await processor.process(incoming_message_factory(b'{"order_id": 1}'))
+        assert message.body == b'{"order_id": 1, "limit": 10}'
+    await shutdown_dependencies(scheme.dependencies.values())
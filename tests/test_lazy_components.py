@@ -0,0 +1,35 @@
+import asyncio
+
+from anyio.to_thread import run_sync
+
+from mela import Mela
+from mela.factories.core.connection import close_all_connections
+from mela.factories.publisher import publishers
+
+
+PUBLISHERS = """
+publishers:
+  lazy_reports:
+    exchange: lazy-x
+    routing_key: reports
+    queue: lazy-q
+"""
+
+
+async def test_publisher_is_resolved_once_on_first_use(settings_factory, memory_broker):
+    app = Mela('test_lazy_components', settings_factory(PUBLISHERS), lazy_components=True)
+    requirement = app.publisher('lazy_reports')
+
+    proxy = await requirement.resolve(app.settings)
+    assert not proxy.is_resolved
+    assert 'lazy_reports' not in publishers
+
+    await asyncio.gather(*(proxy.publish({'report': i}) for i in range(3)))
+    # Proxy can be used from threads which run own event loop
+    await run_sync(asyncio.run, proxy.publish({'report': 3}))
+
+    assert proxy.instance is publishers['lazy_reports']
+    assert await requirement.resolve(app.settings) is proxy
+    assert len(memory_broker.queues['lazy-q']) == 4
+    publishers.pop('lazy_reports')
+    await close_all_connections()
@@ -0,0 +1,86 @@
+import json
+import logging
+import subprocess
+import sys
+from logging.handlers import QueueHandler
+
+from mela.log import ExceptionRateFilter
+from mela.log import JsonFormatter
+from mela.log import configure_logging
+from mela.log import handler as stdout_handler
+from mela.log import reset_logging
+from mela.log import root
+from mela.log import stop_logging
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def log_exceptions(log, count):
+    for _ in range(count):
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            log.exception("Message is broken:")
+
+
+def test_exception_rate_filter_suppresses_storm():
+    log = logging.getLogger('test_exception_rate')
+    log.propagate = False
+    handler = ListHandler()
+    handler.addFilter(ExceptionRateFilter(rate=0.001, burst=2))
+    log.addHandler(handler)
+
+    log_exceptions(log, 5)
+    log.info("Not an exception")
+
+    assert len(handler.lines) == 3
+
+
+def test_queue_logging_writes_json_in_background():
+    handler = ListHandler()
+    root.addHandler(handler)
+    try:
+        configure_logging(queue=True, json_format=True, exception_rate=1000)
+        log_exceptions(logging.getLogger('test_queue_logging'), 1)
+        stop_logging()
+        assert isinstance(handler.formatter, JsonFormatter)
+    finally:
+        root.removeHandler(handler)
+        reset_logging()
+
+    entry = json.loads(handler.lines[-1])
+    assert entry['logger'] == 'test_queue_logging'
+    assert 'ValueError: broken' in entry['exception']
+
+
+def test_reconfigured_logging_is_not_stacked():
+    configure_logging(queue=True, json_format=True, exception_rate=1000)
+    configure_logging(queue=False, exception_rate=1000)
+    try:
+        assert stdout_handler in root.handlers
+        assert not any(isinstance(handler, QueueHandler) for handler in root.handlers)
+        assert not isinstance(stdout_handler.formatter, JsonFormatter)
+        assert len(stdout_handler.filters) == 1
+    finally:
+        reset_logging()
+    assert stdout_handler.filters == []
+
+
+def test_components_log_to_stdout_without_app():
+    code = (
+        "import logging, asyncio\n"
+        "from mela.components import Publisher\n"
+        "async def main():\n"
+        "    Publisher('standalone').log.info('Standalone component')\n"
+        "asyncio.run(main())\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert 'Standalone component' in result.stdout
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+from aio_pika import ExchangeType
+from aio_pika import IncomingMessage
+from aio_pika import Message
+from aiormq.exceptions import PublishError
+from pamqp import commands as spec
+
+from mela.transport import connect
+from mela.transport.memory import topic_matches
+
+
+@pytest.fixture
+async def channel(request):
+    connection = await connect(url=f'memory://{request.node.name}')
+    channel_ = await connection.channel()
+    yield channel_
+    await connection.close()
+
+
+async def collect(queue, count, no_ack=True):
+    received = []
+    done = asyncio.Event()
+
+    async def callback(message: IncomingMessage):
+        received.append(message)
+        if len(received) == count:
+            done.set()
+
+    await queue.consume(callback, no_ack=no_ack)
+    await asyncio.wait_for(done.wait(), 1)
+    return received
+
+
+@pytest.mark.parametrize('binding_key,routing_key,matches', [
+    ('a.*', 'a.b', True),
+    ('a.*', 'a.b.c', False),
+    ('a.#', 'a', True),
+    ('a.#.c', 'a.b.b.c', True),
+    ('#', 'anything.at.all', True),
+    ('*.b', 'a.c', False),
+])
+def test_topic_matching(binding_key, routing_key, matches):
+    assert topic_matches(binding_key, routing_key) is matches
+
+
+async def test_topic_and_fanout_routing(channel):
+    topic = await channel.declare_exchange('topic-x', ExchangeType.TOPIC)
+    fanout = await channel.declare_exchange('fanout-x', ExchangeType.FANOUT)
+    orders = await channel.declare_queue('orders-q')
+    everything = await channel.declare_queue('everything-q')
+    await orders.bind(topic, 'orders.*')
+    await everything.bind(fanout, 'ignored')
+
+    await topic.publish(Message(b'created'), 'orders.created')
+    await topic.publish(Message(b'payment'), 'payments.created', mandatory=False)
+    await fanout.publish(Message(b'broadcast'), 'any')
+
+    assert [m.body for m in await collect(orders, 1)] == [b'created']
+    assert [m.body for m in await collect(everything, 1)] == [b'broadcast']
+
+
+async def test_unroutable_message_is_returned_by_default(channel):
+    exchange = await channel.declare_exchange('unroutable-x')
+    returned = []
+    channel.return_callbacks.add(lambda sender, message: returned.append(message.body))
+
+    result = await exchange.publish(Message(b'lost'), 'nowhere')
+    assert isinstance(result.delivery, spec.Basic.Return)
+    assert returned == [b'lost']
+    unconfirmed = await channel.connection.channel(publisher_confirms=False)
+    exchange = await unconfirmed.declare_exchange('unroutable-x')
+    assert await exchange.publish(Message(b'lost'), 'nowhere') is None
+
+
+async def test_unroutable_message_raises_on_demand(channel):
+    raising = await channel.connection.channel(on_return_raises=True)
+    exchange = await raising.declare_exchange('unroutable-x')
+    with pytest.raises(PublishError):
+        await exchange.publish(Message(b'lost'), 'nowhere')
+    result = await exchange.publish(Message(b'lost'), 'nowhere', mandatory=False)
+    assert isinstance(result, spec.Basic.Ack)
+
+
+async def test_prefetch_limits_unacked_deliveries(channel):
+    await channel.set_qos(prefetch_count=2)
+    queue = await channel.declare_queue('qos-q')
+    for i in range(5):
+        await channel.default_exchange.publish(Message(str(i).encode()), 'qos-q')
+    received = []
+
+    async def callback(message):
+        received.append(message)
+
+    await queue.consume(callback)
+    await asyncio.sleep(0)
+    assert len(received) == 2
+    await received[0].ack()
+    await asyncio.sleep(0)
+    assert [m.body for m in received] == [b'0', b'1', b'2']
+
+
+async def test_raised_prefetch_delivers_waiting_messages(channel):
+    await channel.set_qos(prefetch_count=1)
+    queue = await channel.declare_queue('requalified-q')
+    for i in range(3):
+        await channel.default_exchange.publish(Message(str(i).encode()), 'requalified-q')
+    received = []
+
+    async def callback(message):
+        received.append(message)
+
+    await queue.consume(callback)
+    await asyncio.sleep(0)
+    assert len(received) == 1
+    await channel.set_qos(prefetch_count=3)
+    await asyncio.sleep(0)
+    assert [m.body for m in received] == [b'0', b'1', b'2']
+
+
+async def test_rejected_message_goes_to_dead_letter_exchange(channel):
+    dlx = await channel.declare_exchange('dead-x')
+    dead = await channel.declare_queue('dead-q')
+    await dead.bind(dlx, 'dead')
+    queue = await channel.declare_queue(
+        'work-q',
+        arguments={'x-dead-letter-exchange': 'dead-x', 'x-dead-letter-routing-key': 'dead'},
+    )
+    await channel.default_exchange.publish(Message(b'requeued'), 'work-q')
+
+    message = await queue.get()
+    await message.nack(requeue=True)
+    message = await queue.get()
+    assert message.redelivered is True
+    await message.nack(requeue=False)
+
+    dead_message, = await collect(dead, 1)
+    assert dead_message.body == b'requeued'
+    assert dead_message.headers['x-death'][0]['reason'] == 'rejected'
+
+
+async def test_priority_queue_delivers_urgent_first(channel):
+    queue = await channel.declare_queue('priority-q', arguments={'x-max-priority': 10})
+    for body, priority in [(b'bulk', 1), (b'urgent', 9), (b'normal', 5)]:
+        await channel.default_exchange.publish(Message(body, priority=priority), 'priority-q')
+
+    assert [m.body for m in await collect(queue, 3)] == [b'urgent', b'normal', b'bulk']
@@ -0,0 +1,69 @@
+import asyncio
+
+from mela import metrics
+from mela.components import Consumer
+from mela.metrics import MetricsServer
+from mela.metrics import Registry
+from mela.processor import Processor
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    received = registry.counter('test_received_total', "Received", ('component',))
+    latency = registry.histogram('test_latency_seconds', "Latency", ('component',), (0.1, 1))
+    in_flight = registry.gauge('test_in_flight', "In flight", ('component',))
+    received.labels('printer').inc()
+    latency.labels('printer').observe(0.5)
+    in_flight.labels('printer').set_function(lambda: 3)
+
+    assert registry.render() == '\n'.join([
+        '# HELP test_received_total Received',
+        '# TYPE test_received_total counter',
+        'test_received_total{component="printer"} 1.0',
+        '# HELP test_latency_seconds Latency',
+        '# TYPE test_latency_seconds histogram',
+        'test_latency_seconds_bucket{component="printer",le="0.1"} 0',
+        'test_latency_seconds_bucket{component="printer",le="1.0"} 1',
+        'test_latency_seconds_bucket{component="printer",le="+Inf"} 1',
+        'test_latency_seconds_sum{component="printer"} 0.5',
+        'test_latency_seconds_count{component="printer"} 1',
+        '# HELP test_in_flight In flight',
+        '# TYPE test_in_flight gauge',
+        'test_in_flight{component="printer"} 3.0',
+    ]) + '\n'
+
+
+async def test_metrics_server_serves_registry():
+    registry = Registry()
+    registry.counter('test_served_total', "Served").labels().inc()
+    server = MetricsServer('127.0.0.1', 0, registry)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+    finally:
+        await server.stop()
+
+    assert response.startswith(b'HTTP/1.1 200 OK')
+    assert response.endswith(b'test_served_total 1.0\n')
+
+
+async def test_consumer_is_instrumented_only_with_enabled_metrics(incoming_message_factory):
+    async def handler(value: int):
+        return {'value': value}
+
+    for enabled in (False, True):
+        metrics.registry.enabled = enabled
+        try:
+            consumer_ = Consumer(f'test_instrumented_{enabled}')
+            consumer_.set_processor(Processor(handler))
+        finally:
+            metrics.registry.enabled = False
+        await consumer_._callback(incoming_message_factory(b'{"value": 1}'))
+
+        assert consumer_.metrics.acked.value == 1
+        assert consumer_.metrics.received.value == enabled
+        assert consumer_.metrics.handler_duration.count == enabled
@@ -0,0 +1,83 @@
+from aio_pika import Message
+
+from mela.middleware import Middleware
+from mela.processor import Processor
+
+
+class Recorder(Middleware):
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    async def before_decode(self, message):
+        self.calls.append(f'{self.name}:before_decode')
+
+    async def after_decode(self, message, params):
+        self.calls.append(f'{self.name}:after_decode')
+        params['value'] += 1
+
+    async def around_handler(self, call_next, params):
+        self.calls.append(f'{self.name}:handler_enter')
+        result = await call_next(params)
+        self.calls.append(f'{self.name}:handler_exit')
+        return result
+
+
+class Tagger(Middleware):
+
+    async def around_publish(self, call_next, message, routing_key):
+        message.headers['tagged'] = True
+        return await call_next(message, 'tagged.' + routing_key)
+
+
+async def test_processor_middlewares_order(incoming_message_factory):
+    calls = []
+
+    async def handler(value: int):
+        calls.append('handler')
+        return {'value': value}
+
+    processor = Processor(handler, middlewares=[Recorder('own', calls)])
+    processor.use_middlewares([Recorder('scheme', calls)])
+    outgoing_message, _ = await processor.process(incoming_message_factory(b'{"value": 1}'))
+
+    assert outgoing_message.body == b'{"value": 3}'
+    assert calls == [
+        'scheme:before_decode',
+        'own:before_decode',
+        'scheme:after_decode',
+        'own:after_decode',
+        'scheme:handler_enter',
+        'own:handler_enter',
+        'handler',
+        'own:handler_exit',
+        'scheme:handler_exit',
+    ]
+
+
+async def test_processor_without_middlewares_is_not_wrapped():
+    async def handler(value: int):
+        return {'value': value}
+
+    processor = Processor(handler, middlewares=[Tagger()])
+    processor.use_middlewares([])
+
+    assert 'process' not in processor.__dict__
+    assert 'process_many' not in processor.__dict__
+
+
+async def test_publisher_middleware_wraps_publishing(
+        fake_exchange_factory,
+        fake_publisher_factory,
+):
+    exchange = fake_exchange_factory()
+    publisher_ = fake_publisher_factory(exchange)
+    tagger = Tagger()
+    publisher_.use_middlewares([tagger])
+    publisher_.use_middlewares([tagger])
+    await publisher_.publish_message(Message(b''), 'key')
+
+    message, routing_key = exchange.published[0]
+    assert routing_key == 'tagged.key'
+    assert message.headers['tagged'] is True
@@ -0,0 +1,108 @@
+import asyncio
+
+from aio_pika import Message
+from aiormq.exceptions import ChannelInvalidStateError
+
+from mela.components import Publisher
+from mela.outbox import Outbox
+
+
+class FlakyChannel:
+    is_closed = True
+
+
+class FlakyExchange:
+
+    def __init__(self):
+        self.published = []
+        self.unreachable = False
+
+    async def publish(self, message, routing_key, timeout=None):
+        if self.unreachable:
+            raise ChannelInvalidStateError("Channel is closed")
+        self.published.append((message.body, routing_key, message.headers))
+        return True
+
+
+async def test_messages_are_kept_in_outbox_until_channel_is_open(tmp_path):
+    exchange = FlakyExchange()
+    channel = FlakyChannel()
+    outbox = Outbox('test_outbox_publisher', str(tmp_path / 'outbox.db'), interval=0.01)
+    publisher = Publisher(
+        'test_outbox_publisher',
+        'key',
+        exchange=exchange,
+        channel=channel,
+        outbox=outbox,
+    )
+
+    assert await publisher.publish_message(Message(b'first', headers={'x-n': 1})) is None
+    assert await publisher.publish_message(Message(b'second'), 'other') is None
+    assert outbox.depth == 2
+    assert outbox.age() > 0
+    assert not exchange.published
+
+    channel.is_closed = False
+    # Outbox is drained before new messages, so the order is kept
+    await publisher.publish_message(Message(b'third'))
+    await asyncio.wait_for(publisher._draining, 1)
+
+    assert [body for body, _, _ in exchange.published] == [b'first', b'second', b'third']
+    assert exchange.published[0] == (b'first', 'key', {'x-n': 1})
+    assert exchange.published[1][1] == 'other'
+    assert outbox.depth == 0
+    assert outbox.age() == 0
+
+
+async def test_failed_publish_goes_to_outbox_and_survives_restart(tmp_path):
+    exchange = FlakyExchange()
+    exchange.unreachable = True
+    channel = FlakyChannel()
+    channel.is_closed = False
+    path = str(tmp_path / 'outbox.db')
+    outbox = Outbox('test_outbox_restart', path)
+    publisher = Publisher(
+        'test_outbox_restart',
+        'key',
+        exchange=exchange,
+        channel=channel,
+        outbox=outbox,
+    )
+
+    await publisher.publish_message(Message(b'kept'))
+    channel.is_closed = True
+    await publisher.close()
+    assert publisher._draining is None
+
+    reopened = Outbox('test_outbox_restart', path)
+    assert reopened.depth == 1
+    [(_, routing_key, message)] = await reopened.read()
+    assert routing_key == 'key'
+    assert message.body == b'kept'
+
+
+async def test_drain_stops_when_messages_are_removed_by_other_process(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    outbox = Outbox('test_outbox_removed', path, interval=0.01)
+    await outbox.put(Message(b'lost'), 'key')
+    other = Outbox('test_outbox_removed', path)
+    [(id_, _, _)] = await other.read()
+    await other.remove([id_])
+    other.close()
+    exchange = FlakyExchange()
+    channel = FlakyChannel()
+    channel.is_closed = False
+    publisher = Publisher(
+        'test_outbox_removed',
+        'key',
+        exchange=exchange,
+        channel=channel,
+        outbox=outbox,
+    )
+
+    assert outbox.depth == 1
+    publisher.drain_outbox()
+    await asyncio.wait_for(publisher._draining, 1)
+    assert outbox.depth == 0
+    assert not exchange.published
+    await publisher.close()
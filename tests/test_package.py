@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+import pytest
+
+import mela
+
+
+@pytest.mark.parametrize('name', mela.__all__)
+def test_exported_name_is_importable(name):
+    namespace = {}
+    exec(f'from mela import {name}', namespace)  # noqa: S102
+
+    assert namespace[name] is getattr(mela, name)
+    assert name in dir(mela)
+
+
+def test_import_doesnt_load_submodules():
+    code = "import sys, mela; print('mela.app' in sys.modules, 'aio_pika' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+
+    assert result.stdout.split() == ['False', 'False']
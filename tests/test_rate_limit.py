@@ -0,0 +1,107 @@
+import asyncio
+from time import monotonic
+
+from mela.components import RateLimiter
+from mela.factories.consumer import consumer
+from mela.factories.core.connection import close_all_connections
+from mela.factories.core.rate_limit import rate_limiter
+from mela.factories.core.rate_limit import rate_limiters
+from mela.factories.publisher import publisher
+from mela.processor import Processor
+from mela.settings import RateLimitParams
+
+
+async def test_rate_limiter_allows_burst_then_waits():
+    limiter = RateLimiter(rate=20, burst=3)
+    started = monotonic()
+    for _ in range(3):
+        await limiter.acquire()
+    assert monotonic() - started < 0.04
+
+    await limiter.acquire()
+    assert monotonic() - started >= 0.04
+
+
+async def test_rate_limiter_limits_wrapped_callback():
+    limiter = RateLimiter(rate=50, burst=1)
+    calls = []
+
+    async def callback(value):
+        calls.append(value)
+
+    limited = limiter.limit(callback)
+    started = monotonic()
+    await asyncio.gather(*(limited(i) for i in range(4)))
+    assert calls == [0, 1, 2, 3]
+    assert monotonic() - started >= 0.05
+
+
+def test_named_rate_limit_is_shared():
+    shared = RateLimitParams(name='test_shared', rate=10)
+    assert rate_limiter(shared) is rate_limiter(shared)
+    inline = RateLimitParams(rate=10)
+    assert rate_limiter(inline) is not rate_limiter(inline)
+    assert rate_limiter(None) is None
+
+
+COMPONENTS = """
+rate-limits:
+  downstream:
+    rate: 50
+    burst: 1
+publishers:
+  throttled-out:
+    exchange: rate-x
+    routing_key: jobs
+    queue: rate-q
+    rate_limit: downstream
+  feeder:
+    exchange: rate-x
+    routing_key: jobs
+consumers:
+  throttled-in:
+    exchange: rate-x
+    routing_key: jobs
+    queue: rate-q
+    rate_limit: downstream
+    prefetch_count: 1
+"""
+
+
+async def test_publisher_is_throttled_by_settings(settings_factory, memory_broker):
+    settings = settings_factory(COMPONENTS)
+    instance = await publisher(settings.publishers['throttled-out'])
+
+    started = monotonic()
+    for i in range(5):
+        await instance.publish({'i': i})
+
+    assert monotonic() - started >= 4 / 50
+    assert len(memory_broker.queues['rate-q']) == 5
+    await close_all_connections()
+
+
+async def test_consumer_is_throttled_by_withholding_acks(settings_factory, memory_broker):
+    settings = settings_factory(COMPONENTS)
+    instance = await consumer(settings.consumers['throttled-in'])
+    # Both components refer the named limit, so they share one budget
+    assert instance._rate_limiter is rate_limiters['downstream']
+    handled = []
+
+    async def handler(i: int):
+        handled.append(monotonic())
+
+    instance.set_processor(Processor(handler))
+    await instance.consume()
+    feeder = await publisher(settings.publishers['feeder'])
+    for i in range(5):
+        await feeder.publish({'i': i})
+    await asyncio.sleep(0.01)
+
+    # Messages wait in the broker, not in the process
+    assert len(memory_broker.queues['rate-q']) >= 3
+    while len(handled) < 5:
+        await asyncio.sleep(0.005)
+    assert handled[-1] - handled[0] >= 4 / 50 * 0.9
+    await instance.cancel()
+    await close_all_connections()
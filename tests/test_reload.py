@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+from aio_pika import Message
+
+from mela import Mela
+from mela.factories.consumer import consumers
+from mela.factories.core.connection import close_all_connections
+from mela.metrics import registry
+from mela.reload import Reloader
+from mela.transport import connect
+
+
+CONSUMERS = """
+consumers:
+  jobs:
+    exchange: reload-x
+    routing_key: {routing_key}
+    queue: reload-q
+    prefetch_count: {prefetch}
+"""
+
+
+@pytest.fixture(autouse=True)
+def enabled_metrics():
+    # App with reloader enables metrics, restarted consumers are drained by them
+    registry.enabled = True
+    yield
+    registry.enabled = False
+
+
+async def test_consumers_are_tuned_restarted_and_stopped(
+        settings_file,
+        settings_factory,
+        memory_broker,
+):
+    app = Mela('test_reload', settings_factory(CONSUMERS.format(routing_key='jobs', prefetch=1)))
+    handled = []
+
+    @app.consumer('jobs')
+    async def jobs(job: int):
+        await asyncio.sleep(0.05)
+        handled.append(job)
+
+    try:
+        await app.start_component(app.requirements['jobs'])
+        reloader = Reloader(app, str(settings_file), interval=None, sighup=False)
+        started = consumers['jobs']
+
+        settings_factory(CONSUMERS.format(routing_key='jobs', prefetch=5))
+        assert await reloader.reload()
+        assert consumers['jobs'] is started
+        assert started._channel.prefetch_count == 5
+
+        connection = await connect(url=f'memory://{memory_broker.name}')
+        exchange = await (await connection.channel()).declare_exchange('reload-x')
+        await exchange.publish(Message(b'{"job": 1}'), 'jobs')
+        await asyncio.sleep(0.01)
+        settings_factory(CONSUMERS.format(routing_key='tasks', prefetch=5))
+        assert await reloader.reload()
+        # Message in flight is handled before the consumer is restarted
+        assert handled == [1]
+        assert consumers['jobs'] is not started
+
+        await exchange.publish(Message(b'{"job": 2}'), 'tasks')
+        await asyncio.sleep(0.1)
+        assert handled == [1, 2]
+
+        settings_factory()
+        assert await reloader.reload()
+        assert 'jobs' not in consumers
+    finally:
+        consumers.pop('jobs', None)
+        await close_all_connections()
+
+
+SERVICES = """
+consumers:
+  orders:
+    exchange: reload-services-x
+    routing_key: orders
+    queue: reload-orders-q
+publishers:
+  audit:
+    exchange: reload-services-x
+    routing_key: {routing_key}
+services:
+  billing:
+    consumer: orders
+    publisher: audit
+"""
+
+
+async def test_reload_which_changes_service_is_rejected(settings_file, settings_factory):
+    app = Mela('test_reload_services', settings_factory(SERVICES.format(routing_key='audit')))
+
+    @app.service('billing')
+    async def billing(order: int):
+        return {'order': order}
+
+    running = app.settings
+    reloader = Reloader(app, str(settings_file), interval=None, sighup=False)
+    settings_factory(SERVICES.format(routing_key='audit.v2'))
+
+    assert await reloader.reload() is False
+    assert app.settings is running
+    assert reloader.fixed_changes(running, app.load_settings()) == ['billing']
+
+
+PROFILED = """
+consumers:
+  profiled:
+    exchange: reload-profiled-x
+    routing_key: profiled
+    queue: reload-profiled-q
+"""
+
+PROFILING = """
+    profiling:
+      sample_rate: 1
+"""
+
+
+async def test_reload_toggles_profiling(settings_file, settings_factory, memory_broker):
+    app = Mela('test_reload_profiling', settings_factory(PROFILED))
+    handled = []
+
+    @app.consumer('profiled')
+    async def profiled(job: int):
+        handled.append(job)
+
+    async def handle(job: int) -> None:
+        await exchange.publish(Message(f'{{"job": {job}}}'.encode()), 'profiled')
+        await asyncio.sleep(0.01)
+
+    try:
+        await app.start_component(app.requirements['profiled'])
+        reloader = Reloader(app, str(settings_file), interval=None, sighup=False)
+        connection = await connect(url=f'memory://{memory_broker.name}')
+        exchange = await (await connection.channel()).declare_exchange('reload-profiled-x')
+        unprofiled_decode = profiled._solve_dependencies
+
+        for _ in range(2):
+            settings_factory(PROFILED + PROFILING)
+            assert await reloader.reload()
+            profiler = consumers['profiled']._profiler
+            await handle(1)
+            assert profiler.samples == 1
+            # Profiler of previous start is replaced, not wrapped
+            assert profiled._unprofiled[0] == unprofiled_decode
+
+            settings_factory(PROFILED)
+            assert await reloader.reload()
+            await handle(2)
+            assert profiler.samples == 1
+            assert profiled._solve_dependencies == unprofiled_decode
+        assert handled == [1, 2, 1, 2]
+    finally:
+        consumers.pop('profiled', None)
+        await close_all_connections()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+import pytest
+
+from mela.components import Consumer
+from mela.components import Service
+from mela.factories.core.connection import close_all_connections
+from mela.factories.publisher import publisher
+from mela.factories.service import service
+from mela.middleware import Middleware
+from mela.processor import Processor
+
+
+@pytest.fixture
+def service_factory(request, fake_publisher_factory):
+    def factory(exchange, name=None, **kwargs):
+        name = name or request.node.name
+        return Service(
+            name,
+            consumer=Consumer(name + '_consumer'),
+            publisher=fake_publisher_factory(exchange, name=name + '_publisher'),
+            **kwargs,
+        )
+    return factory
+
+
+SERVICES = """
+consumers:
+  relay-in:
+    exchange: service-x
+    routing_key: in
+    queue: service-in-q
+    prefetch_count: 8
+publishers:
+  relay-out:
+    exchange: service-x
+    routing_key: out
+    queue: service-out-q
+services:
+  relay:
+    consumer: relay-in
+    publisher: relay-out
+"""
+
+
+class SlowConfirmations(Middleware):
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.events = []
+
+    async def around_publish(self, call_next, message, routing_key):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.events.append('sent')
+        try:
+            # Confirmation round trip of a remote broker
+            await asyncio.sleep(self.delay)
+            result = await call_next(message, routing_key)
+            self.events.append('confirmed')
+            return result
+        finally:
+            self.in_flight -= 1
+
+
+async def test_service_confirmations_overlap_up_to_prefetch_count(settings_factory, memory_broker):
+    settings = settings_factory(SERVICES)
+    instance = await service(settings.services['relay'])
+    confirmations = SlowConfirmations(delay=0.05)
+    instance.use_middlewares([confirmations])
+
+    async def relay(value: int):
+        return {'value': value}
+
+    instance.set_processor(Processor(relay))
+    await instance.consume()
+    producer = await publisher(settings.publishers['relay-out'].copy(update={
+        'name': 'relay-producer',
+        'routing_key': 'in',
+        'queue': None,
+    }))
+    for value in range(32):
+        await producer.publish({'value': value})
+    while len(memory_broker.queues['service-out-q']) < 32:
+        await asyncio.sleep(0.005)
+    outputs = [
+        json.loads(memory_broker.queues['service-out-q'].pop().body)['value']
+        for _ in range(32)
+    ]
+    await instance.cancel()
+    await close_all_connections()
+
+    # Every delivery is handled in own task, so the whole prefetch window is
+    # sent before the first confirmation comes back
+    assert confirmations.events[:9] == ['sent'] * 8 + ['confirmed']
+    assert confirmations.events.count('confirmed') == 32
+    assert confirmations.max_in_flight == 8
+    assert sorted(outputs) == list(range(32))
+
+
+async def test_async_generator_service_publishes_every_output(
+        service_factory,
+        fake_exchange_factory,
+        incoming_message_factory,
+):
+    exchange = fake_exchange_factory()
+    service_ = service_factory(exchange)
+
+    async def splitter(values: list):
+        for value in values:
+            yield {'value': value}, f'key.{value}'
+
+    service_.set_processor(Processor(splitter))
+    message = incoming_message_factory(b'{"values": [1, 2, 3]}')
+    await service_.consumer._callback(message)
+
+    assert [routing_key for _, routing_key in exchange.published] == ['key.1', 'key.2', 'key.3']
+    assert message.acked is True
+
+
+async def test_generator_and_list_services_publish_every_output(
+        service_factory,
+        fake_exchange_factory,
+        incoming_message_factory,
+):
+    def generator_splitter(values: list):
+        for value in values:
+            yield {'value': value}
+
+    def list_splitter(values: list):
+        return [{'value': value} for value in values]
+
+    for splitter in (generator_splitter, list_splitter):
+        exchange = fake_exchange_factory()
+        service_ = service_factory(exchange, name=splitter.__name__)
+        service_.set_processor(Processor(splitter))
+        message = incoming_message_factory(b'{"values": [1, 2]}')
+        await service_.consumer._callback(message)
+
+        assert [body.body for body, _ in exchange.published] == [
+            b'{"value": 1}',
+            b'{"value": 2}',
+        ]
+        assert message.acked is True
+
+
+async def test_failed_generator_service_nacks_message(
+        service_factory,
+        fake_exchange_factory,
+        incoming_message_factory,
+):
+    exchange = fake_exchange_factory()
+    service_ = service_factory(exchange)
+
+    async def splitter(values: list):
+        yield {'value': values[0]}
+        raise ValueError
+
+    service_.set_processor(Processor(splitter))
+    message = incoming_message_factory(b'{"values": [1, 2]}')
+    await service_.consumer._callback(message)
+
+    assert len(exchange.published) == 1
+    assert message.nacked is True
+    assert message.acked is False
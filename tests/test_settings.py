@@ -0,0 +1,66 @@
+from mela import Mela
+from mela.components import Publisher
+from mela.factories.core.connection import close_all_connections
+from mela.settings.snapshot import load_settings
+
+
+COMPONENTS = """
+publishers:
+  audit:
+    exchange: settings-x
+    routing_key: audit
+  unused:
+    exchange: settings-x
+    routing_key: unused
+consumers:
+  orders:
+    exchange: settings-x
+    routing_key: orders
+    queue: settings-q
+services:
+  billing:
+    consumer: orders
+    publisher: audit
+"""
+
+
+def test_only_required_components_are_solved(settings_factory):
+    settings_factory(COMPONENTS)
+    settings = load_settings([('service', 'billing')])
+
+    assert list(settings.publishers) == ['audit']
+    assert list(settings.consumers) == ['orders']
+    assert settings.services['billing'].consumer is settings.consumers['orders']
+
+
+def test_snapshot_is_reused_until_settings_change(settings_factory, tmp_path):
+    settings_factory(COMPONENTS)
+    snapshots = tmp_path / 'snapshots'
+
+    compiled = load_settings([('publisher', 'audit')], str(snapshots))
+    loaded = load_settings([('publisher', 'audit')], str(snapshots))
+
+    assert loaded == compiled
+    assert len(list(snapshots.iterdir())) == 1
+    settings_factory(COMPONENTS.replace('routing_key: audit', 'routing_key: audit.v2'))
+    changed = load_settings([('publisher', 'audit')], str(snapshots))
+    assert changed.publishers['audit'].routing_key == 'audit.v2'
+    assert len(list(snapshots.iterdir())) == 2
+
+
+async def test_publisher_injected_to_handler_is_required(settings_factory):
+    settings_factory(COMPONENTS)
+    app = Mela('test_required_only', required_only=True)
+
+    @app.consumer('orders')
+    async def orders(order: int, audit: Publisher = 'audit'):
+        await audit.publish({'order': order})
+
+    app.settings = app.load_settings()
+    assert list(app.settings.publishers) == ['audit']
+    try:
+        # Publisher is not described in solved settings, if it's not required
+        await app.start_component(app.requirements['orders'])
+        assert isinstance(orders._cached_static_params['audit'], Publisher)
+    finally:
+        await close_all_connections()
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from mela import Mela
+from mela.threadsafe import LoopThread
+from mela.threadsafe import ThreadSafePublisher
+
+
+PUBLISHERS = """
+publishers:
+  events:
+    exchange: threadsafe-x
+    routing_key: events
+    queue: threadsafe-q
+"""
+
+
+def test_publishes_from_many_threads_are_batched(fake_exchange_factory, fake_publisher_factory):
+    exchange = fake_exchange_factory()
+    loop_thread = LoopThread()
+    loop_thread.start()
+
+    async def create():
+        return fake_publisher_factory(exchange)
+
+    publisher = ThreadSafePublisher(loop_thread.run(create()).result(), loop_thread.loop)
+    flushes = 0
+    flush = publisher._flush
+
+    def counted_flush():
+        nonlocal flushes
+        flushes += 1
+        flush()
+
+    publisher._flush = counted_flush
+
+    def send(thread):
+        return [publisher.publish({'n': i}, f'key-{thread}') for i in range(50)]
+
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            futures = [future for sent in executor.map(send, range(8)) for future in sent]
+        done, not_done = wait(futures, timeout=1)
+    finally:
+        loop_thread.stop(1)
+
+    assert not not_done
+    assert all(future.result() for future in done)
+    assert len(exchange.published) == 400
+    assert flushes < 400
+
+
+async def test_app_publisher_is_usable_from_thread_while_loop_runs(
+        settings_factory,
+        memory_broker,
+):
+    app = Mela('test_threadsafe', settings_factory(PUBLISHERS))
+
+    with ThreadPoolExecutor(1) as executor:
+        publisher = executor.submit(app.publisher_threadsafe, 'events').result()
+        executor.submit(lambda: publisher.publish({'a': 1}).result(1)).result()
+    await app.stop_loop_thread()
+
+    assert publisher.publisher.name == 'events_threadsafe'
+    assert len(memory_broker.queues['threadsafe-q']) == 1
@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+from mela.metrics import event_loop_blocks
+from mela.processor import Processor
+from mela.watchdog import Watchdog
+
+
+async def test_watchdog_attributes_block_to_handler():
+    async def blocking_handler(value: int):
+        time.sleep(0.3)
+        return {'value': value}
+
+    Processor(blocking_handler)
+    watchdog = Watchdog(threshold=0.1, interval=0.01)
+    watchdog.start()
+    # Let the loop lag monitor make first beat
+    await asyncio.sleep(0.05)
+    await blocking_handler(1)
+    await asyncio.sleep(0.05)
+    watchdog.stop()
+
+    handler = f'{__name__}.test_watchdog_attributes_block_to_handler.<locals>.blocking_handler'
+    assert event_loop_blocks.labels(handler).value == 1